@@ -0,0 +1,74 @@
+"""
+Egress bytes and conversion cost per negotiated TTS output format.
+
+Streams synthetic speech shaped like Murf's output (mono 16-bit WAV at MURF_WS_SAMPLE_RATE, in
+4 KiB chunks) through SegmentConverter for every format / sample rate a client can negotiate,
+and reports bytes sent per second of speech, the share of the source size and the converter's
+time per second of audio (pool hop included).
+
+    cd backend
+    python -m benchmarks.audio_formats --seconds 30
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from benchmarks.vad_gate import voiced_burst
+from core.config import AUDIO_OUT_SAMPLE_RATES, MURF_WS_SAMPLE_RATE
+from services.audio_format import (
+    CONVERTED_FORMATS,
+    FORMAT_SOURCE,
+    OutputFormat,
+    SegmentConverter,
+    wav_header,
+)
+
+CHUNK_BYTES = 4096
+
+
+def murf_like_stream(seconds: float) -> list[bytes]:
+    rng = np.random.default_rng(0)
+    samples = int(seconds * MURF_WS_SAMPLE_RATE)
+    # voiced_burst is tuned for 16 kHz time; stretch it to the source rate
+    audio = np.interp(np.arange(samples) * 16000 / MURF_WS_SAMPLE_RATE, np.arange(samples), voiced_burst(rng, samples))
+    pcm = np.clip(audio, -32768, 32767).astype("<i2").tobytes()
+    stream = wav_header(MURF_WS_SAMPLE_RATE, len(pcm)) + pcm
+    return [stream[i:i + CHUNK_BYTES] for i in range(0, len(stream), CHUNK_BYTES)]
+
+
+async def run(target: OutputFormat, chunks: list[bytes]) -> tuple[int, float]:
+    converter = SegmentConverter(target)
+    sent = 0
+    start = time.perf_counter()
+    for chunk in chunks:
+        sent += len(converter.package(await converter.convert(chunk)))
+    return sent, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=30.0)
+    args = parser.parse_args()
+
+    chunks = murf_like_stream(args.seconds)
+    source_bytes = sum(len(chunk) for chunk in chunks)
+    targets = [OutputFormat()] + [
+        OutputFormat(format, rate)
+        for format in CONVERTED_FORMATS
+        for rate in AUDIO_OUT_SAMPLE_RATES
+        if rate <= MURF_WS_SAMPLE_RATE
+    ]
+    print(f"source: {MURF_WS_SAMPLE_RATE} Hz WAV in {len(chunks)} chunks of {CHUNK_BYTES} bytes ('wav' adds a header per chunk)")
+    for target in targets:
+        sent, elapsed = asyncio.run(run(target, chunks))
+        label = FORMAT_SOURCE if not target.converted else f"{target.format} {target.sample_rate} Hz"
+        print(
+            f"{label:<16} {sent / args.seconds / 1024:8.1f} KiB per s of speech  "
+            f"{sent / source_bytes:6.1%} of source  {elapsed / args.seconds * 1000:7.3f} ms per audio s"
+        )
+
+
+if __name__ == "__main__":
+    main()
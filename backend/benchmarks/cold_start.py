@@ -0,0 +1,78 @@
+"""
+Cold start of one app process: time until it accepts connections and until /api/ready is 200.
+
+Launches `uvicorn main:app` repeatedly and polls it. With `--providers real` the real SDKs
+are imported and built with dummy keys (nothing is called, and the Murf websocket warm-up
+is skipped); `--providers fake` uses the offline stand-ins.
+
+    cd backend
+    python -m benchmarks.cold_start --runs 5 --providers real
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def one_run(providers: str) -> tuple[float, float, dict]:
+    port = free_port()
+    env = {**os.environ, "TTS_TRANSPORT": "rest"}
+    if providers == "fake":
+        env.update(LLM_PROVIDER="fake", STT_PROVIDER="fake", TTS_PROVIDER="fake")
+    else:
+        for key in ("GEMINI_API_KEY", "MURF_API_KEY", "ASSEMBLYAI_API_KEY"):
+            env.setdefault(key, "benchmark")
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stderr=subprocess.DEVNULL,
+    )
+    accepting = None
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/ready", timeout=1) as res:
+                    return accepting or time.perf_counter() - start, time.perf_counter() - start, json.load(res)
+            except urllib.error.HTTPError:
+                accepting = accepting or time.perf_counter() - start
+            except OSError:
+                pass
+            time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--providers", default="real", choices=("real", "fake"))
+    args = parser.parse_args()
+
+    accepting, ready = [], []
+    for _ in range(args.runs):
+        accept_s, ready_s, metrics = one_run(args.providers)
+        accepting.append(accept_s)
+        ready.append(ready_s)
+    print(f"accepting connections: median {statistics.median(accepting) * 1000:7.1f} ms")
+    print(f"ready (/api/ready 200): median {statistics.median(ready) * 1000:7.1f} ms")
+    print(f"last run, as reported by the app: {metrics}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+"""
+End-to-end offline load test of the voice loop on /api/ws/audio.
+
+Starts the app with AssemblyAI, Gemini and Murf replaced by local stand-ins (configurable
+latency and gaussian jitter), then replays mic audio from many concurrent clients at real-time
+pace: recorded `uploads/*.pcm` (16 kHz 16-bit mono) cut into utterances with the local VAD,
+or generated speech-like utterances when there are none. Each turn streams one utterance,
+keeps the "mic" open with silence and waits for the whole answer.
+
+The stand-in transcriber runs the real VAD and sends the final transcript `--stt-latency`
+after its end-of-turn hint, so endpointing is part of the voice-to-voice figure. Reported:
+throughput, client-side voice-to-voice percentiles (last chunk with speech sent -> first
+answer audio received), server event-loop lag, memory per session and the server's own
+per-stage latency means from /api/metrics.
+
+    cd backend
+    python -m benchmarks.e2e_load --sessions 64 --concurrency 16 --turns 3
+    python -m benchmarks.e2e_load --llm-ttft 0.6 --llm-jitter 0.2 --speed 2
+"""
+import argparse
+import asyncio
+import collections
+import glob
+import json
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from contextlib import asynccontextmanager
+
+import numpy as np
+
+from benchmarks.vad_gate import SAMPLE_RATE, voiced_burst
+from services.stt_service import VAD_END_OF_TURN, VoiceActivityDetector
+
+CHUNK_BYTES = 8192  # 256 ms, what the browser's 4096-sample ScriptProcessor sends
+CHUNK_SECONDS = CHUNK_BYTES / (2 * SAMPLE_RATE)
+SILENCE = bytes(CHUNK_BYTES)
+UTTERANCES = (
+    "Tell me something about the sea",
+    "What is the weather like on the ship today",
+    "Can you tell me a joke",
+    "Where are we sailing next",
+)
+# Stand-in settings are handed to the server process through the environment
+LATENCY_ENV = {
+    "stt_latency": "LOADTEST_STT_LATENCY",
+    "stt_jitter": "LOADTEST_STT_JITTER",
+    "llm_ttft": "LOADTEST_LLM_TTFT",
+    "llm_jitter": "LOADTEST_LLM_JITTER",
+    "tts_ttfb": "LOADTEST_TTS_TTFB",
+    "tts_jitter": "LOADTEST_TTS_JITTER",
+}
+
+
+def env_float(name: str, default: float = 0.0) -> float:
+    return float(os.environ.get(name, default))
+
+
+# --- Server side: stand-in providers and samplers, loaded by uvicorn in the app process ---
+
+class LoadTestTranscriber:
+    """
+    Stands in for AssemblyAIStreamingTranscriber: runs the real VAD on the incoming audio and
+    reports a partial right away and the final transcript after LOADTEST_STT_LATENCY at every
+    end-of-turn hint.
+    """
+    def __init__(self, on_partial_callback=None, on_final_callback=None, on_vad_callback=None):
+        self.on_partial_callback = on_partial_callback
+        self.on_final_callback = on_final_callback
+        self.on_vad_callback = on_vad_callback
+        self.vad = VoiceActivityDetector(SAMPLE_RATE)
+        self.latency = env_float("LOADTEST_STT_LATENCY")
+        self.jitter = env_float("LOADTEST_STT_JITTER")
+        self.last_speech_at: float | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def start(self):
+        pass
+
+    def stream_audio(self, audio_chunk: bytes):
+        _, events = self.vad.process(audio_chunk)
+        if self.vad.chunk_had_speech:
+            self.last_speech_at = time.perf_counter()
+        if VAD_END_OF_TURN in events:
+            task = asyncio.create_task(self._report(random.choice(UTTERANCES)))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _report(self, text: str):
+        from services.fakes import jittered
+
+        if self.on_vad_callback:
+            await self.on_vad_callback(VAD_END_OF_TURN)
+        if self.on_partial_callback:
+            await self.on_partial_callback(text)
+        await asyncio.sleep(jittered(self.latency, self.jitter))
+        if self.on_final_callback:
+            result = self.on_final_callback(text)
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def aclose(self):
+        for task in self._tasks:
+            task.cancel()
+
+
+class LoadTestSTTProvider:
+    def create_transcriber(self, **callbacks):
+        return LoadTestTranscriber(**callbacks)
+
+
+class LoadTestLLMProvider:
+    def create_model(self, model_name: str):
+        from services.fakes import FakeGenerativeModel
+
+        return FakeGenerativeModel(
+            first_token_delay=env_float("LOADTEST_LLM_TTFT"), jitter=env_float("LOADTEST_LLM_JITTER")
+        )
+
+
+class LoadTestTTSProvider:
+    transport = "rest"
+
+    def __init__(self):
+        from services.fakes import FakeMurfClient
+
+        self.client = FakeMurfClient(
+            first_chunk_delay=env_float("LOADTEST_TTS_TTFB"), jitter=env_float("LOADTEST_TTS_JITTER")
+        )
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # ru_maxrss is the peak (KiB on Linux), the best we can do without /proc
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ServerSampler:
+    """Event-loop lag (how late a short sleep wakes up) and resident memory of the app process."""
+    interval = 0.01
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> dict:
+        self.lags: collections.deque[float] = collections.deque(maxlen=200_000)
+        self.baseline_rss = self.peak_rss = rss_bytes()
+        return {"rss_bytes": self.baseline_rss}
+
+    async def run(self):
+        ticks = 0
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - before - self.interval))
+            ticks += 1
+            if ticks % 10 == 0:
+                self.peak_rss = max(self.peak_rss, rss_bytes())
+
+    def stats(self) -> dict:
+        lags = sorted(self.lags) or [0.0]
+        return {
+            "lag_p50": percentile(lags, 50),
+            "lag_p99": percentile(lags, 99),
+            "lag_max": lags[-1],
+            "baseline_rss_bytes": self.baseline_rss,
+            "peak_rss_bytes": max(self.peak_rss, rss_bytes()),
+        }
+
+
+def create_app():
+    """uvicorn factory: the real app with the stand-in providers and a sampler on its loop."""
+    from fastapi.routing import APIRoute
+
+    import main as backend
+    import services.providers as providers
+
+    for kind, provider in (("stt", "LoadTestSTTProvider"), ("llm", "LoadTestLLMProvider"), ("tts", "LoadTestTTSProvider")):
+        providers.register_provider(kind, "loadtest", f"benchmarks.e2e_load:{provider}")
+        providers.use_provider(kind, "loadtest")
+
+    sampler = ServerSampler()
+    app_lifespan = backend.app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app):
+        async with app_lifespan(app) as state:
+            task = asyncio.create_task(sampler.run())
+            try:
+                yield state
+            finally:
+                task.cancel()
+
+    backend.app.router.lifespan_context = lifespan
+    # Ahead of the static files mounted at "/"
+    backend.app.router.routes.insert(0, APIRoute("/bench/stats", sampler.stats, methods=["GET"]))
+    backend.app.router.routes.insert(0, APIRoute("/bench/reset", sampler.reset, methods=["POST"]))
+    return backend.app
+
+
+# --- Client side ---
+
+def percentile(ordered: list[float], pct: float) -> float:
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def utterance_clip(rng: np.random.Generator) -> bytes:
+    """Room noise, one 0.8-3 s speech-like burst, then 1.2 s of noise."""
+    lead, speech, tail = (int(s * SAMPLE_RATE) for s in (rng.uniform(0.2, 0.6), rng.uniform(0.8, 3.0), 1.2))
+    audio = rng.normal(0, 60, lead + speech + tail)
+    audio[lead:lead + speech] += voiced_burst(rng, speech)
+    return np.clip(audio, -32768, 32767).astype("<i2").tobytes()
+
+
+def split_utterances(pcm: bytes) -> list[tuple[list[bytes], int]]:
+    """
+    Cut a recording into turns at the VAD's end-of-turn hints, as the server would see them.
+    Returns (chunks, index of the last chunk with speech) for every turn that has speech.
+    """
+    vad = VoiceActivityDetector(SAMPLE_RATE)
+    turns, chunks, last_speech = [], [], None
+    for offset in range(0, len(pcm), CHUNK_BYTES):
+        chunk = pcm[offset:offset + CHUNK_BYTES].ljust(CHUNK_BYTES, b"\x00")
+        _, events = vad.process(chunk)
+        chunks.append(chunk)
+        if vad.chunk_had_speech:
+            last_speech = len(chunks) - 1
+        if VAD_END_OF_TURN in events:
+            if last_speech is not None:
+                turns.append((chunks, last_speech))
+            chunks, last_speech = [], None
+    if last_speech is not None:
+        turns.append((chunks, last_speech))
+    return turns
+
+
+def load_turns(pattern: str, synthetic: int) -> list[tuple[list[bytes], int]]:
+    turns = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "rb") as f:
+            pcm = f.read()
+        turns += split_utterances(pcm[:len(pcm) - len(pcm) % 2])
+    if turns:
+        print(f"Replaying {len(turns)} utterances cut from {pattern}")
+    synthetic = synthetic or (0 if turns else 16)
+    if synthetic:
+        rng = np.random.default_rng(0)
+        turns += [turn for _ in range(synthetic) for turn in split_utterances(utterance_clip(rng))]
+        print(f"Added {synthetic} synthetic utterances")
+    return turns
+
+
+async def one_turn(ws, chunks: list[bytes], last_speech: int, interval: float, settle: float, timeout: float) -> float:
+    """Stream one utterance at mic pace, then silence until the answer has finished playing in."""
+    speech_end_at = first_audio_at = last_audio_at = None
+    answered = False
+    sent = 0
+    next_send = started = time.perf_counter()
+    while True:
+        now = time.perf_counter()
+        if answered and first_audio_at and now - last_audio_at >= settle:
+            return first_audio_at - speech_end_at
+        if now - started > timeout:
+            raise TimeoutError("no answer")
+        if now >= next_send:
+            await ws.send(chunks[sent] if sent < len(chunks) else SILENCE)
+            if sent == last_speech:
+                speech_end_at = time.perf_counter()
+            sent += 1
+            next_send += interval
+            continue
+        try:
+            message = await asyncio.wait_for(ws.recv(), next_send - now)
+        except asyncio.TimeoutError:
+            continue
+        kind = "audio" if isinstance(message, bytes) else json.loads(message).get("type")
+        if kind == "audio":
+            last_audio_at = time.perf_counter()
+            if first_audio_at is None and speech_end_at is not None:
+                first_audio_at = last_audio_at
+        elif kind == "llm-response":
+            answered = True
+
+
+async def one_session(url: str, turns: list, args, latencies: list[float]) -> int:
+    import websockets
+
+    completed = 0
+    async with websockets.connect(url, max_size=None) as ws:
+        while json.loads(await ws.recv()).get("type") != "session":
+            pass
+        for chunks, last_speech in turns:
+            latencies.append(await one_turn(
+                ws, chunks, last_speech, CHUNK_SECONDS / args.speed, args.settle, args.turn_timeout
+            ))
+            completed += 1
+    return completed
+
+
+async def drive(url: str, all_turns: list, args) -> tuple[int, int, list[float], float]:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    completed_turns = completed_sessions = 0
+
+    async def run(index: int):
+        nonlocal completed_turns, completed_sessions
+        turns = [all_turns[(index * args.turns + i) % len(all_turns)] for i in range(args.turns)]
+        async with semaphore:
+            # Spread session starts over one chunk so clients do not send in lockstep
+            await asyncio.sleep(random.uniform(0, CHUNK_SECONDS / args.speed))
+            try:
+                finished = await one_session(url, turns, args, latencies)
+                completed_turns += finished
+                completed_sessions += 1
+            except Exception as e:
+                print(f"session failed: {e!r}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run(i) for i in range(args.sessions)))
+    return completed_sessions, completed_turns, latencies, time.perf_counter() - start
+
+
+def http(port: int, path: str, method: str = "GET"):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", method=method)
+    with urllib.request.urlopen(request, timeout=10) as res:
+        body = res.read().decode()
+    return json.loads(body) if path.startswith("/bench") else body
+
+
+def stage_means(metrics_text: str) -> dict[str, float]:
+    """Mean of each latency histogram from its _sum and _count lines."""
+    sums, counts = {}, {}
+    for line in metrics_text.splitlines():
+        name, _, value = line.partition(" ")
+        if name.endswith("_seconds_sum"):
+            sums[name[:-4]] = float(value)
+        elif name.endswith("_seconds_count"):
+            counts[name[:-6]] = float(value)
+    return {name: sums[name] / counts[name] for name in sums if counts.get(name)}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, args) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "TTS_MAX_WORKERS": str(max(16, args.concurrency * 2)),
+        # Every answer is the same text, so the audio cache would hide the TTS stand-in
+        "TTS_CACHE_MAX_BYTES": os.environ.get("TTS_CACHE_MAX_BYTES", "0"),
+        "METRICS_MODE": "low",
+    }
+    env.update({name: str(getattr(args, key)) for key, name in LATENCY_ENV.items()})
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "benchmarks.e2e_load:create_app", "--factory",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+        ],
+        env=env,
+    )
+
+
+def wait_ready(port: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            http(port, "/api/ready")
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--turns", type=int, default=3, help="utterances per session")
+    parser.add_argument("--files", default="uploads/*.pcm")
+    parser.add_argument("--synthetic", type=int, default=0, help="generated utterances to add")
+    parser.add_argument("--speed", type=float, default=1.0, help="audio send rate, 1.0 = real time")
+    parser.add_argument("--settle", type=float, default=0.5, help="quiet time that ends an answer")
+    parser.add_argument("--turn-timeout", type=float, default=30.0)
+    parser.add_argument("--framing", default="binary", choices=("binary", "json"))
+    parser.add_argument("--stt-latency", type=float, default=0.15, help="end-of-turn hint to final transcript")
+    parser.add_argument("--stt-jitter", type=float, default=0.05)
+    parser.add_argument("--llm-ttft", type=float, default=0.35, help="LLM time to first token")
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--tts-ttfb", type=float, default=0.15, help="TTS time to first audio byte")
+    parser.add_argument("--tts-jitter", type=float, default=0.05)
+    args = parser.parse_args()
+
+    all_turns = load_turns(args.files, args.synthetic)
+    port = free_port()
+    server = start_server(port, args)
+    try:
+        wait_ready(port)
+        url = f"ws://127.0.0.1:{port}/api/ws/audio?framing={args.framing}"
+        baseline = http(port, "/bench/reset", "POST")
+        sessions, turns, latencies, elapsed = asyncio.run(drive(url, all_turns, args))
+        server_stats = http(port, "/bench/stats")
+        stages = stage_means(http(port, "/api/metrics"))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"\n{sessions}/{args.sessions} sessions, {turns} turns in {elapsed:.1f} s "
+          f"(concurrency {args.concurrency}, {args.speed:g}x real time, {os.cpu_count()} CPU cores)")
+    print(f"throughput          {turns / elapsed:8.2f} turns/s  {sessions / elapsed:8.2f} sessions/s")
+    if latencies:
+        ordered = sorted(latencies)
+        print(
+            f"voice-to-voice      p50 {percentile(ordered, 50) * 1000:7.0f} ms  p90 {percentile(ordered, 90) * 1000:7.0f} ms  "
+            f"p99 {percentile(ordered, 99) * 1000:7.0f} ms  max {ordered[-1] * 1000:7.0f} ms  "
+            f"(mean {statistics.mean(ordered) * 1000:.0f} ms)"
+        )
+    print(
+        f"server loop lag     p50 {server_stats['lag_p50'] * 1000:7.2f} ms  p99 {server_stats['lag_p99'] * 1000:7.2f} ms  "
+        f"max {server_stats['lag_max'] * 1000:7.2f} ms"
+    )
+    growth = server_stats["peak_rss_bytes"] - baseline["rss_bytes"]
+    print(
+        f"server memory       {baseline['rss_bytes'] / 2**20:.1f} MiB idle, peak +{growth / 2**20:.1f} MiB, "
+        f"~{growth / min(args.concurrency, args.sessions) / 1024:.0f} KiB per concurrent session"
+    )
+    for name, mean in stages.items():
+        print(f"  {name:<40} mean {mean * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
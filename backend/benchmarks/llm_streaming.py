@@ -0,0 +1,84 @@
+"""
+LLM streaming latency and cancellation against the offline Gemini fake.
+
+Runs N concurrent `stream_llm_response_v2` calls, measures time-to-first-token and the
+worst event-loop stall while they stream, then cancels a second batch mid-stream (as a
+barge-in would) and reports how quickly the streams stop.
+
+    cd backend
+    python -m benchmarks.llm_streaming --streams 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import services.llm_service as llm
+from services.fakes import FakeGenerativeModel
+
+MODEL_NAME = "gemini-1.5-flash"
+
+
+async def loop_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        before = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - before - interval)
+    return worst
+
+
+async def first_token(prompt: str) -> float:
+    start = time.perf_counter()
+    ttft = None
+    async for _ in llm.stream_llm_response_v2(prompt, MODEL_NAME):
+        if ttft is None:
+            ttft = time.perf_counter() - start
+    return ttft or 0.0
+
+
+async def cancel_after_first_chunk(prompt: str) -> float:
+    got_chunk = asyncio.Event()
+
+    async def consume():
+        async for _ in llm.stream_llm_response_v2(prompt, MODEL_NAME):
+            got_chunk.set()
+
+    task = asyncio.create_task(consume())
+    await got_chunk.wait()
+    start = time.perf_counter()
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    return time.perf_counter() - start
+
+
+async def run(streams: int):
+    fake = FakeGenerativeModel()
+    llm.register_model(MODEL_NAME, fake)
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(loop_lag(stop))
+    ttft = await asyncio.gather(*(first_token(f"prompt {i}") for i in range(streams)))
+    stop.set()
+    worst_lag = await lag_task
+
+    cancel = await asyncio.gather(*(cancel_after_first_chunk(f"prompt {i}") for i in range(streams)))
+
+    print(f"streams={streams} ttft p50={statistics.median(ttft) * 1000:.1f} ms "
+          f"max={max(ttft) * 1000:.1f} ms  worst loop lag={worst_lag * 1000:.1f} ms")
+    print(f"cancel p50={statistics.median(cancel) * 1000:.2f} ms max={max(cancel) * 1000:.2f} ms  "
+          f"started={fake.started} completed={fake.completed} cancelled={fake.cancelled}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--streams", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.streams))
+
+
+if __name__ == "__main__":
+    main()
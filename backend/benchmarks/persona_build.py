@@ -0,0 +1,69 @@
+"""
+Per-turn prompt build cost as a conversation grows.
+
+Compares re-rendering the whole history every turn (the original `build_persona`) with the
+incremental, token-budgeted `PromptBuilder`.
+
+    cd backend
+    python -m benchmarks.persona_build --turns 2000
+"""
+import argparse
+import time
+
+import services.persona as persona
+
+
+def full_rebuild(history: list, persona_type: persona.PersonaType) -> str:
+    # The original implementation: render every message and rejoin on every turn
+    messages = [
+        ("User: " + msg["content"] if msg["role"] == "User" else "Aanya: " + msg["content"])
+        for msg in history
+    ]
+    chat_history_text = "\n".join(messages)
+    return (
+        f"{persona_type.value['prompt']}\n"
+        f"{"\n".join(persona_type.value['skills'])}\n"
+        f"{chat_history_text}\n"
+        f"{persona.RESPONSE_INSTRUCTION}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    persona_type = persona.PersonaType.PIRATE
+    checkpoints = {10, 100, 500, 1000, args.turns}
+    history = []
+    builder = persona.PromptBuilder(persona_type)
+    print(f"{'turn':>6} {'full rebuild':>14} {'incremental':>13} {'prompt chars':>14}")
+    for turn in range(1, args.turns + 1):
+        for role, content in (("User", f"Tell me about treasure number {turn}, please."),
+                              ("Aanya", f"Arrr, treasure {turn} be buried under the old palm tree, matey!")):
+            history.append({"role": role, "content": content})
+        if turn not in checkpoints:
+            builder.add_turn(history[-2])
+            builder.add_turn(history[-1])
+            continue
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            full_rebuild(history, persona_type)
+        full = (time.perf_counter() - start) / args.repeat
+
+        start = time.perf_counter()
+        builder.add_turn(history[-2])
+        builder.add_turn(history[-1])
+        added = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            prompt = builder.build()["prompt"]
+        incremental = added + (time.perf_counter() - start) / args.repeat
+
+        print(f"{turn:>6} {full * 1e6:>11.1f} us {incremental * 1e6:>10.1f} us {len(prompt):>14}")
+
+
+if __name__ == "__main__":
+    main()
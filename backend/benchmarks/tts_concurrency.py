@@ -0,0 +1,100 @@
+"""
+Time-to-first-audio for concurrent sessions sharing one event loop.
+
+Runs N simulated `/api/ws/audio` sessions against a local Murf stand-in and compares
+the old blocking `tts.speak()` path with the pooled `tts.speak_async()` path.
+
+    cd backend
+    python -m benchmarks.tts_concurrency --sessions 32 --segments 4
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import services.providers as providers
+import services.tts_service as tts
+
+
+class FakeMurf:
+    """Blocking Murf SDK stand-in: fixed first-byte delay, then a few audio chunks."""
+    first_byte_s = 0.15
+    chunk_s = 0.02
+    chunks = 5
+
+    def __init__(self, api_key=None):
+        self.text_to_speech = self
+
+    def stream(self, text: str, voice_id: str, **kwargs):
+        time.sleep(self.first_byte_s)
+        for _ in range(self.chunks):
+            yield b"\x00" * 4096
+            time.sleep(self.chunk_s)
+
+
+class FakeMurfProvider:
+    transport = "rest"
+
+    def __init__(self):
+        self.client = FakeMurf()
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_session(session_id: str, segments: int, use_pool: bool, start: float) -> float:
+    # `start` is shared: every session "connects" at the same instant
+    first_audio = None
+    for i in range(segments):
+        text = f"Ahoy matey, this be segment {i}."
+        if use_pool:
+            audio = await tts.speak_async(text, tts.default_voice, session_id)
+        else:
+            audio = tts.speak(text, tts.default_voice)
+        if audio and first_audio is None:
+            first_audio = time.perf_counter() - start
+        # Yield like websocket.send_json would
+        await asyncio.sleep(0)
+    tts.release_session(session_id)
+    return first_audio or 0.0
+
+
+async def run(sessions: int, segments: int, use_pool: bool) -> list[float]:
+    start = time.perf_counter()
+    return await asyncio.gather(*(
+        run_session(f"bench-{i}", segments, use_pool, start) for i in range(sessions)
+    ))
+
+
+def report(label: str, ttfa: list[float], elapsed: float):
+    print(
+        f"{label:<10} sessions={len(ttfa):<4} "
+        f"p50={statistics.median(ttfa) * 1000:8.1f} ms  "
+        f"p99={percentile(ttfa, 99) * 1000:8.1f} ms  "
+        f"total={elapsed:6.2f} s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--segments", type=int, default=3)
+    args = parser.parse_args()
+
+    providers.register_provider("tts", "benchmark", "benchmarks.tts_concurrency:FakeMurfProvider")
+    providers.use_provider("tts", "benchmark")
+    tts.UPLOADS_DIR = Path(tempfile.mkdtemp(prefix="tts-bench-"))
+
+    for label, use_pool in (("blocking", False), ("pooled", True)):
+        start = time.perf_counter()
+        ttfa = asyncio.run(run(args.sessions, args.segments, use_pool))
+        report(label, ttfa, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
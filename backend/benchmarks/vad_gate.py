@@ -0,0 +1,100 @@
+"""
+Offline run of the local VAD / silence gate over recorded 16 kHz 16-bit mono PCM.
+
+Feeds each file in 8192-byte chunks (what the browser's 4096-sample ScriptProcessor sends)
+through VoiceActivityDetector and reports how much audio would still reach AssemblyAI, the
+speech segments and end-of-turn hints found, and the VAD cost per second of audio.
+Empty recordings are skipped; `--synthetic` adds generated speech-like clips with pauses.
+
+    cd backend
+    python -m benchmarks.vad_gate
+    python -m benchmarks.vad_gate --files "uploads/*.pcm" --synthetic 5 --policy drop
+"""
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from services.stt_service import VoiceActivityDetector, VAD_END_OF_TURN, VAD_SPEECH_START
+
+SAMPLE_RATE = 16000
+CHUNK_BYTES = 8192
+
+
+def voiced_burst(rng: np.random.Generator, samples: int) -> np.ndarray:
+    """Speech-like audio: harmonics of a random pitch under a syllable-rate envelope."""
+    t = np.arange(samples) / SAMPLE_RATE
+    pitch = rng.uniform(100, 220)
+    voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 8))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(3, 5) * t) ** 2
+    return 3000 * voiced * envelope
+
+
+def synthetic_clip(seed: int, seconds: float = 30.0) -> bytes:
+    """Voiced bursts separated by pauses over room noise."""
+    rng = np.random.default_rng(seed)
+    total = int(seconds * SAMPLE_RATE)
+    audio = rng.normal(0, 60, total)
+    position = int(rng.uniform(1, 3) * SAMPLE_RATE)
+    while position < total:
+        length = min(int(rng.uniform(0.8, 4.0) * SAMPLE_RATE), total - position)
+        audio[position:position + length] += voiced_burst(rng, length)
+        position += length + int(rng.uniform(0.5, 8.0) * SAMPLE_RATE)
+    return np.clip(audio, -32768, 32767).astype("<i2").tobytes()
+
+
+def run_clip(name: str, pcm: bytes, policy: str) -> dict:
+    vad = VoiceActivityDetector(SAMPLE_RATE, silence_policy=policy)
+    forwarded = segments = hints = 0
+    start = time.perf_counter()
+    for offset in range(0, len(pcm), CHUNK_BYTES):
+        audio, events = vad.process(pcm[offset:offset + CHUNK_BYTES])
+        forwarded += len(audio)
+        segments += events.count(VAD_SPEECH_START)
+        hints += events.count(VAD_END_OF_TURN)
+    elapsed = time.perf_counter() - start
+    seconds = len(pcm) / (2 * SAMPLE_RATE)
+    print(
+        f"{name:<40} {seconds:7.1f} s  forwarded {forwarded / len(pcm):6.1%}  "
+        f"segments {segments:3d}  eot hints {hints:3d}  vad {elapsed / seconds * 1000:6.3f} ms per audio s"
+    )
+    return {"seconds": seconds, "bytes": len(pcm), "forwarded": forwarded, "elapsed": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", default="uploads/*.pcm")
+    parser.add_argument("--synthetic", type=int, default=0, help="number of generated clips to add")
+    parser.add_argument("--policy", default="thin", choices=("thin", "drop", "pass"))
+    args = parser.parse_args()
+
+    clips = []
+    skipped = 0
+    for path in sorted(glob.glob(args.files)):
+        with open(path, "rb") as f:
+            pcm = f.read()
+        pcm = pcm[:len(pcm) - len(pcm) % 2]
+        if pcm:
+            clips.append((os.path.basename(path), pcm))
+        else:
+            skipped += 1
+    if skipped:
+        print(f"Skipped {skipped} empty recordings")
+    synthetic = args.synthetic or (0 if clips else 3)
+    clips += [(f"synthetic-{i}", synthetic_clip(i)) for i in range(synthetic)]
+
+    results = [run_clip(name, pcm, args.policy) for name, pcm in clips]
+    seconds = sum(r["seconds"] for r in results)
+    total = sum(r["bytes"] for r in results)
+    forwarded = sum(r["forwarded"] for r in results)
+    elapsed = sum(r["elapsed"] for r in results)
+    print(
+        f"\n{len(results)} clips, {seconds:.1f} s of audio: {forwarded / total:.1%} of bytes forwarded "
+        f"({(total - forwarded) / 1024:.0f} KiB kept off the uplink), VAD real-time factor {elapsed / seconds:.5f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
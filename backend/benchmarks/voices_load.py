@@ -0,0 +1,102 @@
+"""
+Throughput of `/api/voices`: per-request httpx client vs shared pooled client vs voice cache.
+
+Starts a local mock of Murf's REST API, points MURF_API_BASE_URL at it and drives the
+FastAPI app in-process with many concurrent requests. The first two rows run with the
+catalogue's TTL at 0, so requests only share a fetch already in flight to the mock; "cached"
+is what the endpoint does by default.
+
+    cd backend
+    python -m benchmarks.voices_load --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import socket
+import threading
+import time
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+MOCK_PORT = free_port()
+os.environ["MURF_API_BASE_URL"] = f"http://127.0.0.1:{MOCK_PORT}/v1"
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+import main as backend
+import services.http_client as http
+import services.tts_service as tts
+
+mock_murf = FastAPI()
+VOICES = [{"voiceId": f"en-US-voice{i}", "displayName": f"Voice {i}", "locale": "en-US"} for i in range(60)]
+
+
+@mock_murf.post("/v1/speech/voices")
+async def mock_voices():
+    return VOICES
+
+
+def start_mock_server() -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(mock_murf, host="127.0.0.1", port=MOCK_PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+class FreshClient:
+    """The old behaviour: a brand-new AsyncClient (and connection) for every call."""
+    async def post(self, *args, **kwargs):
+        async with httpx.AsyncClient() as client:
+            return await client.post(*args, **kwargs)
+
+
+async def drive(total: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=backend.app)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        async def one():
+            async with semaphore:
+                res = await client.get("/api/voices")
+                res.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return time.perf_counter() - start
+
+
+async def run(total: int, concurrency: int):
+    shared_client = tts.get_http_client
+    ttl = tts.voice_catalogue.ttl
+    for label, factory, cache_ttl in (
+        ("per-request", lambda name="default": FreshClient(), 0),
+        ("pooled", shared_client, 0),
+        ("cached", shared_client, ttl),
+    ):
+        tts.get_http_client = factory
+        tts.voice_catalogue.ttl = cache_ttl
+        elapsed = await drive(total, concurrency)
+        print(f"{label:<12} {total} requests in {elapsed:6.2f} s  -> {total / elapsed:8.1f} req/s")
+    await http.close_http_clients()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    server = start_mock_server()
+    asyncio.run(run(args.requests, args.concurrency))
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Sessions per core on /api/ws/audio as the number of uvicorn workers grows.
+
+Each run starts the app with N worker processes (production mode settings: no reloader,
+SQLite session store) with AssemblyAI, Gemini and Murf replaced by local stand-ins, then
+drives mock voice sessions against it: connect, stream mic audio for a few turns, wait for
+each answer, disconnect. Reported per worker count: completed sessions/s, sessions/s per
+core in use and the scaling efficiency relative to a single worker (1.0 = linear).
+
+    cd backend
+    python -m benchmarks.worker_scaling --workers 1 2 4 --sessions 200 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+CHUNK = bytes(8192)  # 256 ms of 16 kHz PCM, what the browser sends
+REPLY = "Ahoy matey, here be a short answer for ye."
+
+
+class BenchmarkSTTProvider:
+    """Fake transcriber that ends a turn every BENCH_CHUNKS_PER_TURN audio chunks."""
+    def create_transcriber(self, **callbacks):
+        from services.fakes import FakeStreamingTranscriber
+
+        chunks_per_turn = int(os.environ.get("BENCH_CHUNKS_PER_TURN", "8"))
+        return FakeStreamingTranscriber(utterance="question number one", chunks_per_turn=chunks_per_turn, **callbacks)
+
+
+def create_app():
+    """uvicorn factory, run in every worker: the real app with offline providers."""
+    import main as backend
+    import services.llm_service as llm
+    import services.providers as providers
+    from services.fakes import FakeGenerativeModel
+
+    llm.register_model("gemini-1.5-flash", FakeGenerativeModel(REPLY, first_token_delay=0.02, chunk_delay=0.002))
+    providers.register_provider("stt", "benchmark", "benchmarks.worker_scaling:BenchmarkSTTProvider")
+    providers.use_provider("stt", "benchmark")
+    return backend.app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, db_path: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "SESSION_BACKEND": "sqlite",
+        "SESSION_DB_PATH": db_path,
+        "LLM_PROVIDER": "fake",
+        "TTS_PROVIDER": "fake",
+        "TTS_MAX_WORKERS": "64",
+        "LLM_SPECULATION": "0",
+    }
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "benchmarks.worker_scaling:create_app", "--factory",
+            "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+        ],
+        env=env,
+    )
+
+
+def wait_ready(port: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def one_session(url: str, turns: int, chunks_per_turn: int) -> bool:
+    import websockets
+
+    async with websockets.connect(url, max_size=None) as ws:
+        json.loads(await ws.recv())  # {"type": "session"}
+        for _ in range(turns):
+            for _ in range(chunks_per_turn):
+                await ws.send(CHUNK)
+            got_text = got_audio = False
+            while not (got_text and got_audio):
+                message = json.loads(await ws.recv())
+                got_text |= message.get("type") == "llm-response"
+                got_audio |= message.get("type") == "audio"
+    return True
+
+
+async def drive(url: str, sessions: int, concurrency: int, turns: int, chunks_per_turn: int) -> int:
+    semaphore = asyncio.Semaphore(concurrency)
+    completed = 0
+
+    async def run():
+        nonlocal completed
+        async with semaphore:
+            try:
+                await asyncio.wait_for(one_session(url, turns, chunks_per_turn), 60)
+                completed += 1
+            except Exception as e:
+                print(f"session failed: {e!r}")
+
+    await asyncio.gather(*(run() for _ in range(sessions)))
+    return completed
+
+
+def client_process(args: tuple) -> int:
+    return asyncio.run(drive(*args))
+
+
+def measure(workers: int, args) -> float:
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_server(workers, port, os.path.join(tmp, "sessions.db"))
+        try:
+            wait_ready(port)
+            url = f"ws://127.0.0.1:{port}/api/ws/audio"
+            per_client = (url, args.sessions // args.clients, args.concurrency // args.clients, args.turns, args.chunks_per_turn)
+            with multiprocessing.Pool(args.clients) as pool:
+                start = time.perf_counter()
+                completed = sum(pool.map(client_process, [per_client] * args.clients))
+                elapsed = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+    return completed / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--chunks-per-turn", type=int, default=8)
+    parser.add_argument("--clients", type=int, default=2, help="load generator processes")
+    args = parser.parse_args()
+    os.environ["BENCH_CHUNKS_PER_TURN"] = str(args.chunks_per_turn)
+
+    print(f"{os.cpu_count()} CPU cores on this host")
+    baseline = None
+    for workers in args.workers:
+        rate = measure(workers, args)
+        baseline = baseline or rate
+        # Workers beyond the core count cannot add throughput, so judge scaling per busy core
+        cores = min(workers, os.cpu_count() or 1)
+        efficiency = rate / (baseline * cores)
+        print(
+            f"{workers:2d} workers: {rate:8.1f} sessions/s  {rate / cores:8.1f} per core  "
+            f"scaling efficiency {efficiency:6.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Outbound scheduling toward a slow client: direct sends vs OutboundScheduler ("block" / "drop").
+
+A stand-in websocket takes a fixed cost per message plus the payload at a limited bandwidth
+(a phone on a weak link). A TTS-like producer streams 4 KiB chunks of 44.1 kHz speech in a
+burst, faster than real time, and sends a transcript-sized control message every half second.
+The scheduler's audio queue is capped at --queue-kib, small enough by default that the burst
+fills it, so "block" and "drop" actually differ. Reports wall time, writes, merged / dropped
+frames, peak queued audio and how long control messages waited to reach the client.
+
+    cd backend
+    python -m benchmarks.ws_backpressure --seconds 20 --bandwidth-kbps 400 --queue-kib 64
+"""
+import argparse
+import asyncio
+import time
+
+import services.framing as framing
+import services.outbound as outbound
+
+CHUNK_BYTES = 4096
+SOURCE_BYTES_PER_SECOND = 44100 * 2
+
+
+class SlowWebSocket:
+    def __init__(self, bandwidth: float, per_message: float):
+        self.bandwidth = bandwidth
+        self.per_message = per_message
+        self.messages = 0
+        self.control_waits: list[float] = []
+
+    async def _wire(self, size: int):
+        self.messages += 1
+        await asyncio.sleep(self.per_message + size / self.bandwidth)
+
+    async def send_json(self, data):
+        if "queued_at" in data:
+            self.control_waits.append(time.perf_counter() - data["queued_at"])
+        await self._wire(len(str(data)))
+
+    async def send_bytes(self, data: bytes):
+        await self._wire(len(data))
+
+
+class DirectSender:
+    """The old path: every send awaited on the socket by whoever produced it."""
+    def __init__(self, websocket: SlowWebSocket):
+        self.websocket = websocket
+        self.audio_sender = framing.AudioSender(websocket, framing.FRAMING_BINARY)
+        self.stats = {}
+        self._lock = asyncio.Lock()
+
+    async def send_json(self, message: dict):
+        async with self._lock:
+            await self.websocket.send_json(message)
+
+    async def send_audio(self, audio: bytes, turn_id: int = 0, partial: bool = False, mergeable: bool = True):
+        async with self._lock:
+            await self.audio_sender.send_audio(audio, turn_id, partial=partial)
+
+    async def close(self):
+        pass
+
+
+async def run(mode: str, seconds: float, bandwidth: float, per_message: float, max_audio_bytes: int) -> dict:
+    websocket = SlowWebSocket(bandwidth, per_message)
+    if mode == "direct":
+        sender = DirectSender(websocket)
+    else:
+        sender = outbound.OutboundScheduler(
+            websocket,
+            framing.AudioSender(websocket, framing.FRAMING_BINARY),
+            f"bench-{mode}",
+            policy=mode,
+            max_audio_bytes=max_audio_bytes,
+        )
+        sender.start()
+
+    chunks = int(seconds * SOURCE_BYTES_PER_SECOND / CHUNK_BYTES)
+    payload = bytes(CHUNK_BYTES)
+    started = time.perf_counter()
+
+    async def audio():
+        for _ in range(chunks):
+            await sender.send_audio(payload, turn_id=1, partial=True)
+            # Murf delivers a burst roughly 5x faster than real time
+            await asyncio.sleep(CHUNK_BYTES / SOURCE_BYTES_PER_SECOND / 5)
+
+    async def control():
+        for _ in range(int(seconds * 2)):
+            await asyncio.sleep(0.5 / 5)
+            await sender.send_json({"type": "transcript", "text": "x" * 80, "queued_at": time.perf_counter()})
+
+    await asyncio.gather(audio(), control())
+    produced = time.perf_counter() - started
+    if mode != "direct":
+        while sender.stats["queued_audio_frames"] or sender.stats["queued_control"]:
+            await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    await sender.close()
+    waits = sorted(websocket.control_waits) or [0.0]
+    return {
+        "produced": produced,
+        "elapsed": elapsed,
+        "writes": websocket.messages,
+        "stats": sender.stats,
+        "control_p50": waits[len(waits) // 2],
+        "control_max": waits[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=20.0, help="seconds of speech per run")
+    parser.add_argument("--bandwidth-kbps", type=float, default=400.0, help="client downlink, kilobytes per second")
+    parser.add_argument("--per-message-ms", type=float, default=2.0, help="fixed cost of each websocket message")
+    parser.add_argument("--queue-kib", type=float, default=64.0, help="scheduler audio queue limit (WS_AUDIO_QUEUE_BYTES)")
+    args = parser.parse_args()
+
+    for mode in ("direct", outbound.POLICY_BLOCK, outbound.POLICY_DROP):
+        result = asyncio.run(
+            run(mode, args.seconds, args.bandwidth_kbps * 1000, args.per_message_ms / 1000, int(args.queue_kib * 1024))
+        )
+        stats = result["stats"]
+        print(
+            f"{mode:<7} producer done {result['produced']:6.2f} s  all sent {result['elapsed']:6.2f} s  "
+            f"writes {result['writes']:5d}  merged {stats.get('coalesced_frames', 0):5d}  "
+            f"dropped {stats.get('dropped_frames', 0):5d}  peak queue {stats.get('max_queued_bytes', 0) / 1024:6.0f} KiB  "
+            f"control wait p50 {result['control_p50'] * 1000:7.1f} ms  max {result['control_max'] * 1000:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+CPU time and bytes on the wire per second of speech: base64 JSON vs binary audio frames.
+
+Pushes synthetic 16-bit PCM through `framing.AudioSender` in both modes, using a stand-in
+websocket that serializes exactly like Starlette's `send_json` / `send_bytes`.
+
+    cd backend
+    python -m benchmarks.ws_framing --seconds 60 --sample-rate 44100 --chunk 4096
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import services.framing as framing
+
+
+class CountingWebSocket:
+    def __init__(self):
+        self.bytes_sent = 0
+        self.messages = 0
+
+    async def send_json(self, data):
+        # Same serialization Starlette applies before putting a text frame on the wire
+        text = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+        self.bytes_sent += len(text.encode("utf-8"))
+        self.messages += 1
+
+    async def send_bytes(self, data: bytes):
+        self.bytes_sent += len(data)
+        self.messages += 1
+
+
+async def run(mode: str, seconds: int, sample_rate: int, chunk: int) -> tuple[float, CountingWebSocket]:
+    websocket = CountingWebSocket()
+    sender = framing.AudioSender(websocket, mode)
+    pcm = os.urandom(chunk)
+    total = seconds * sample_rate * 2
+    start = time.process_time()
+    sent = 0
+    while sent < total:
+        await sender.send_audio(pcm, turn_id=1, partial=True)
+        sent += chunk
+    return time.process_time() - start, websocket
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=int, default=60)
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--chunk", type=int, default=4096)
+    args = parser.parse_args()
+
+    pcm_per_second = args.sample_rate * 2
+    for mode in (framing.FRAMING_JSON, framing.FRAMING_BINARY):
+        cpu, websocket = asyncio.run(run(mode, args.seconds, args.sample_rate, args.chunk))
+        print(
+            f"{mode:<7} cpu/s of speech={cpu / args.seconds * 1000:7.3f} ms  "
+            f"wire bytes/s of speech={websocket.bytes_sent / args.seconds:10.0f}  "
+            f"overhead={websocket.bytes_sent / (pcm_per_second * args.seconds) - 1:6.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -10,13 +10,156 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 MURF_API_KEY = os.getenv("MURF_API_KEY")
 ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
 
+# Process model: "development" runs one auto-reloading server, "production" runs WEB_CONCURRENCY
+# worker processes without the reloader. 0 = one per CPU the process may use (the container's
+# CPU limit, not the host's cores), at most WEB_CONCURRENCY_MAX: every worker opens its own
+# Murf pool and TTS threads
+APP_ENV = os.getenv("APP_ENV", "development")
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0"))
+WEB_CONCURRENCY_MAX = int(os.getenv("WEB_CONCURRENCY_MAX", "4"))
 
+# Provider implementations (see services/providers.py); "fake" runs offline without API keys.
+# Keys are only checked when the real provider is first used, not at import.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+STT_PROVIDER = os.getenv("STT_PROVIDER", "assemblyai")
+TTS_PROVIDER = os.getenv("TTS_PROVIDER", "murf")
 
-# Validate required keys at import time to fail fast in dev; keep lazy for tests if needed
-_missing = [k for k, v in {
-    "GEMINI_API_KEY": GEMINI_API_KEY,
-    "MURF_API_KEY": MURF_API_KEY,
-    "ASSEMBLYAI_API_KEY": ASSEMBLYAI_API_KEY,
-}.items() if not v]
-if _missing:
-    raise RuntimeError(f"Missing required env vars: {', '.join(_missing)}")
\ No newline at end of file
+MURF_API_BASE_URL = os.getenv("MURF_API_BASE_URL", "https://api.murf.ai/v1")
+
+# Shared httpx client pool (see services/http_client.py)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") == "1"
+
+# TTS synthesis pool: total Murf worker threads, and how many of them one session may hold at once
+TTS_MAX_WORKERS = int(os.getenv("TTS_MAX_WORKERS", "8"))
+TTS_MAX_PER_SESSION = int(os.getenv("TTS_MAX_PER_SESSION", "1"))
+
+# "ws" streams segments over pooled Murf websockets, "rest" uses the SDK stream per segment
+TTS_TRANSPORT = os.getenv("TTS_TRANSPORT", "ws")
+MURF_WS_POOL_SIZE = int(os.getenv("MURF_WS_POOL_SIZE", "4"))
+# Longest wait for the next message of a segment before its pooled connection is given up on
+MURF_WS_RECEIVE_TIMEOUT = float(os.getenv("MURF_WS_RECEIVE_TIMEOUT", "10"))
+MURF_WS_SAMPLE_RATE = int(os.getenv("MURF_WS_SAMPLE_RATE", "44100"))
+
+# Batch transcription (/api/transcriptions): uploads are copied to BATCH_SPOOL_DIR in
+# BATCH_UPLOAD_CHUNK_BYTES pieces (at most BATCH_MAX_UPLOADS at a time, BATCH_MAX_UPLOAD_BYTES each).
+# BATCH_MAX_WORKERS jobs run at once on their own threads, so real-time sessions keep the default
+# executor; past BATCH_MAX_PENDING queued or running jobs new ones are refused. Results are kept
+# for BATCH_JOB_TTL seconds.
+BATCH_SPOOL_DIR = os.getenv("BATCH_SPOOL_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads", "batch"))
+BATCH_UPLOAD_CHUNK_BYTES = int(os.getenv("BATCH_UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+BATCH_MAX_UPLOAD_BYTES = int(os.getenv("BATCH_MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+BATCH_MAX_UPLOADS = int(os.getenv("BATCH_MAX_UPLOADS", "4"))
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "2"))
+BATCH_MAX_PENDING = int(os.getenv("BATCH_MAX_PENDING", "32"))
+BATCH_JOB_TTL = float(os.getenv("BATCH_JOB_TTL", "3600"))
+
+# Chat sessions: "memory" (per process) or "sqlite" (shared by every worker on the host)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads", "sessions.db"))
+SESSION_TIMEOUT = float(os.getenv("SESSION_TIMEOUT", "3600"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "100"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Conversation history kept in the LLM prompt, in estimated tokens (oldest turns are windowed out)
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "4000"))
+
+# Personas: built-ins from services/persona.py plus an optional JSON file that adds or overrides
+# them ([{"name", "voiceId", "prompt", "skills"}]); sessions pick one with ?persona=
+PERSONAS_FILE = os.getenv("PERSONAS_FILE")
+DEFAULT_PERSONA = os.getenv("DEFAULT_PERSONA", "pirate")
+
+# Murf's voice list is served from memory and refreshed in the background after this many seconds
+VOICES_CACHE_TTL = float(os.getenv("VOICES_CACHE_TTL", "3600"))
+
+# Partial transcripts at least this long cancel the bot's running turn (0 = only final transcripts)
+BARGE_IN_PARTIAL_CHARS = int(os.getenv("BARGE_IN_PARTIAL_CHARS", "12"))
+
+# Speculative LLM prefetch: start Gemini once a partial transcript has been unchanged for
+# LLM_SPECULATION_STABLE_SECONDS (and is at least LLM_SPECULATION_MIN_CHARS long)
+LLM_SPECULATION = os.getenv("LLM_SPECULATION", "0") == "1"
+LLM_SPECULATION_STABLE_SECONDS = float(os.getenv("LLM_SPECULATION_STABLE_SECONDS", "0.35"))
+LLM_SPECULATION_MIN_CHARS = int(os.getenv("LLM_SPECULATION_MIN_CHARS", "8"))
+
+# Pipeline latency histograms on /api/metrics: "off", "low" (per turn / per segment, WebSocket
+# sends timed 1 in METRICS_SEND_SAMPLE; safe for production) or "full" (every send timed)
+METRICS_MODE = os.getenv("METRICS_MODE", "low")
+METRICS_SEND_SAMPLE = int(os.getenv("METRICS_SEND_SAMPLE", "16"))
+
+# Event-loop watchdog: lag is sampled every LOOP_MONITOR_INTERVAL_MS, and a stall longer than
+# LOOP_BLOCK_THRESHOLD_MS has the loop thread's stack captured (last LOOP_BLOCK_HISTORY kept)
+LOOP_MONITOR = os.getenv("LOOP_MONITOR", "1") == "1"
+LOOP_MONITOR_INTERVAL_MS = int(os.getenv("LOOP_MONITOR_INTERVAL_MS", "50"))
+LOOP_BLOCK_THRESHOLD_MS = int(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+LOOP_BLOCK_HISTORY = int(os.getenv("LOOP_BLOCK_HISTORY", "50"))
+
+# Outbound scheduling per /api/ws/audio connection. Control messages go out before queued audio
+# (at most WS_CONTROL_QUEUE_SIZE waiting); audio waiting for a slow client is capped at
+# WS_AUDIO_QUEUE_BYTES, and then WS_SEND_POLICY applies: "block" slows the TTS down to the
+# client's pace, "drop" discards the oldest queued audio. Queued streaming chunks are merged into
+# writes of up to WS_COALESCE_BYTES. A turn buffers at most TTS_QUEUE_MAX_SEGMENTS text segments.
+WS_CONTROL_QUEUE_SIZE = int(os.getenv("WS_CONTROL_QUEUE_SIZE", "64"))
+WS_AUDIO_QUEUE_BYTES = int(os.getenv("WS_AUDIO_QUEUE_BYTES", str(512 * 1024)))
+WS_SEND_POLICY = os.getenv("WS_SEND_POLICY", "block")
+WS_COALESCE_BYTES = int(os.getenv("WS_COALESCE_BYTES", str(16 * 1024)))
+TTS_QUEUE_MAX_SEGMENTS = int(os.getenv("TTS_QUEUE_MAX_SEGMENTS", "16"))
+
+# Record each session's synthesized audio to uploads/tts_<session>_<timestamp>.audio
+TTS_RECORD_SESSIONS = os.getenv("TTS_RECORD_SESSIONS", "0") == "1"
+
+# TTS audio sent to clients: output sample rates a session may negotiate (capped at the Murf
+# source rate), the rate used when the client names none, and the threads that resample / encode
+AUDIO_OUT_SAMPLE_RATES = tuple(int(rate) for rate in os.getenv("AUDIO_OUT_SAMPLE_RATES", "16000,24000,44100").split(","))
+AUDIO_OUT_DEFAULT_RATE = int(os.getenv("AUDIO_OUT_DEFAULT_RATE", "24000"))
+AUDIO_CONVERT_WORKERS = int(os.getenv("AUDIO_CONVERT_WORKERS", "2"))
+
+# Synthesized-audio cache: in-memory LRU budget, plus an optional disk tier under uploads/tts_cache
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+TTS_CACHE_DISK = os.getenv("TTS_CACHE_DISK", "0") == "1"
+TTS_CACHE_DISK_MAX_BYTES = int(os.getenv("TTS_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# LLM -> TTS text segmentation budgets (characters) and stall flush (seconds)
+SEGMENT_MIN_CHARS = int(os.getenv("SEGMENT_MIN_CHARS", "40"))
+SEGMENT_MAX_CHARS = int(os.getenv("SEGMENT_MAX_CHARS", "300"))
+SEGMENT_FLUSH_TIMEOUT = float(os.getenv("SEGMENT_FLUSH_TIMEOUT", "0.6"))
+
+# Mic audio buffered toward AssemblyAI (default ~5 s of 16 kHz 16-bit mono), what to drop when it
+# fills ("oldest" or "newest"), and how many frames the SDK may have queued before we hold off
+STT_BUFFER_BYTES = int(os.getenv("STT_BUFFER_BYTES", "160000"))
+STT_DROP_POLICY = os.getenv("STT_DROP_POLICY", "oldest")
+STT_MAX_UPSTREAM_FRAMES = int(os.getenv("STT_MAX_UPSTREAM_FRAMES", "50"))
+# AssemblyAI rejects audio messages shorter than 50 ms, so gated audio is packed to at least this
+STT_MIN_PACKET_MS = int(os.getenv("STT_MIN_PACKET_MS", "50"))
+
+# Local voice-activity detection in front of AssemblyAI (energy + zero-crossing rate, 16 kHz PCM).
+# Speech is forwarded with pre-roll and hangover, and silence at full rate for VAD_SILENCE_TAIL_MS
+# after speech so AssemblyAI's own endpointing still works. Longer silences are "thin" (1 frame in
+# VAD_SILENCE_KEEP_EVERY), "drop" or "pass". VAD_END_OF_TURN_MS of silence raises a local hint.
+STT_VAD = os.getenv("STT_VAD", "1") == "1"
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "20"))
+VAD_ENERGY_DBFS = float(os.getenv("VAD_ENERGY_DBFS", "-45"))
+VAD_NOISE_MARGIN_DB = float(os.getenv("VAD_NOISE_MARGIN_DB", "9"))
+VAD_ZCR_MAX = float(os.getenv("VAD_ZCR_MAX", "0.35"))
+VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS", "300"))
+VAD_PREROLL_MS = int(os.getenv("VAD_PREROLL_MS", "200"))
+VAD_SILENCE_TAIL_MS = int(os.getenv("VAD_SILENCE_TAIL_MS", "2500"))
+VAD_SILENCE_POLICY = os.getenv("VAD_SILENCE_POLICY", "thin")
+VAD_SILENCE_KEEP_EVERY = int(os.getenv("VAD_SILENCE_KEEP_EVERY", "10"))
+VAD_END_OF_TURN_MS = int(os.getenv("VAD_END_OF_TURN_MS", "700"))
+# Also ask AssemblyAI to end the turn on the local hint (faster, but may cut off slow speakers)
+VAD_FORCE_ENDPOINT = os.getenv("VAD_FORCE_ENDPOINT", "0") == "1"
+
+
+def require_env(**values):
+    """Raise if any of the given settings is empty. Providers call this when they are built."""
+    missing = [name for name, value in values.items() if not value]
+    if missing:
+        raise RuntimeError(f"Missing required env vars: {', '.join(missing)}")
@@ -1,34 +1,128 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse, JSONResponse
+import time
+_import_started = time.perf_counter()
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import List, Dict
 import logging
+import os
 from pathlib import Path
 import uvicorn
 import json
 import asyncio
 import datetime
-import base64
+import math
+from contextlib import asynccontextmanager
 
 # Importing services
 import services.llm_service as llm
 import services.tts_service as tts
 import services.stt_service as stt
 import services.persona as persona
+import services.text_segmenter as segmenter
+import services.http_client as http
+import services.framing as framing
+import services.session_store as session_stores
+import services.turn_manager as turn_manager
+import services.speculation as speculation
+import services.providers as providers
+import services.metrics as metrics
+import services.loop_monitor as loop_monitor
+import services.batch_transcription as batch
+import services.audio_format as audio_format
+import services.outbound as outbound
+from core.config import TTS_RECORD_SESSIONS, APP_ENV, HOST, PORT, WEB_CONCURRENCY, WEB_CONCURRENCY_MAX, SESSION_BACKEND
 
-# Global in-memory chat history store
-# chat_history_store = {}
-chat_history_store: Dict[str, List[Dict]] = {}
+# Chat history per session, with TTL expiry and size limits (memory or SQLite backend)
+session_store = session_stores.create_session_store()
+
+def available_cpus() -> int:
+    """CPUs this process may use: its affinity mask, lowered by a cgroup v2 CPU quota (docker --cpus)."""
+    cpus = os.process_cpu_count() or 1
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
 
 def main():
     print("Hello from backend!")
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    if APP_ENV != "production":
+        uvicorn.run("main:app", host=HOST, port=PORT, reload=True)
+        return
+    # Production: N worker processes, no reloader
+    workers = WEB_CONCURRENCY or min(available_cpus(), WEB_CONCURRENCY_MAX)
+    if workers > 1 and SESSION_BACKEND == "memory":
+        # A reconnecting client can land on any worker, so sessions must live outside the process
+        logging.warning("SESSION_BACKEND=memory is per process; using sqlite so all workers share sessions")
+        os.environ["SESSION_BACKEND"] = "sqlite"
+    uvicorn.run("main:app", host=HOST, port=PORT, workers=workers, proxy_headers=True)
+
+# Cold-start timings, reported by /api/ready
+startup_metrics = {"ready": False}
+
+
+async def warm_up():
+    """Bring up the providers (SDK imports), the Murf stream pool and the TTS cache."""
+    started = time.perf_counter()
+    errors = await providers.init_providers()
+    if errors:
+        # Ready but degraded: what did build keeps serving, and the rest fails per request
+        # with its own error instead of the whole worker staying out of rotation
+        startup_metrics["provider_errors"] = errors
+        startup_metrics["degraded"] = True
+    tts_ready = "tts" not in errors
+    # Open a Murf streaming connection up front so the first answer skips the TLS handshake
+    if tts_ready and tts.get_transport() == "ws":
+        try:
+            await tts.get_stream_pool().warm_up()
+        except Exception as e:
+            logging.warning(f"Murf stream warm-up failed: {e}")
+    startup_metrics["providers_seconds"] = round(time.perf_counter() - started, 4)
+    startup_metrics["providers"] = providers.get_provider_metrics()
+    startup_metrics["ready_seconds"] = round(time.perf_counter() - _import_started, 4)
+    startup_metrics["ready"] = True
+    logging.info(f"Ready: {startup_metrics}")
+    if not tts_ready:
+        return
+    await tts.prewarm_cache([tts.FALLBACK_TEXT])
+    # So the first /api/voices after a restart is served from memory too
+    if providers.CONFIGURED["tts"] == "murf":
+        try:
+            await tts.voice_catalogue.get()
+        except Exception as e:
+            logging.warning(f"Voice catalogue warm-up failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    loop_monitor.start_loop_monitor()
+    http.init_http_clients()
+    # Providers warm up in the background, so the worker accepts connections right away;
+    # anything that needs a provider before then builds it on demand
+    warm_up_task = asyncio.create_task(warm_up())
+    startup_metrics["startup_seconds"] = round(time.perf_counter() - started, 4)
+    yield
+    warm_up_task.cancel()
+    logging.info(f"TTS cache stats: {tts.get_cache_stats()}")
+    if speculation.LLM_SPECULATION:
+        logging.info(f"LLM speculation stats: {speculation.get_speculation_stats()}")
+    await tts.close_stream_pool()
+    await http.close_http_clients()
+    await session_store.close()
+    await batch.close()
+    await providers.close_providers()
+    await loop_monitor.stop_loop_monitor()
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
+startup_metrics["import_seconds"] = round(time.perf_counter() - _import_started, 4)
 
 
 
@@ -37,15 +131,92 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 def serve_home():
     return {"message": "Hello from Backend!"}
 
+# Readiness probe: 503 until the providers are initialized, with cold-start timings
+@app.get("/api/ready")
+def readiness():
+    return JSONResponse(content=startup_metrics, status_code=200 if startup_metrics["ready"] else 503)
+
+# Pipeline latency histograms and service counters, in the Prometheus text format
+@app.get("/api/metrics")
+async def get_metrics():
+    stats = {
+        "stt": stt.get_stt_stats(),
+        "vad": stt.get_vad_stats(),
+        "segmenter": segmenter.get_segmenter_stats(),
+        "tts_cache": tts.get_cache_stats(),
+        "murf_stream": tts.get_stream_pool_stats(),
+        "pipeline": turn_manager.get_turn_stats(),
+        "speculation": speculation.get_speculation_stats(),
+        "sessions": await session_store.stats(),
+        "startup": startup_metrics,
+        "loop": loop_monitor.get_loop_stats(),
+        "batch": batch.get_batch_stats(),
+        "audio_out": audio_format.get_audio_format_stats(),
+        "voices": tts.get_voice_catalogue_stats(),
+        "outbound": outbound.get_outbound_stats(),
+    }
+    extra = loop_monitor.render_block_sites() + outbound.render_queue_metrics()
+    text = metrics.render_metrics(stats, extra=extra)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+# Event-loop stalls caught by the watchdog: worst code sites and recent stacks
+@app.get("/api/debug/loop")
+def debug_loop():
+    return loop_monitor.get_blocking_report()
+
+# Outbound queue depth, coalescing and drops of every live /api/ws/audio connection
+@app.get("/api/debug/outbound")
+def debug_outbound():
+    return {"stats": outbound.get_outbound_stats(), "sessions": outbound.get_session_stats()}
+
 # 2. Generate voice from text using Murf API and send audio link (Day 2)
+# Served from the in-memory catalogue; clients revalidate with If-None-Match and get a 304
 @app.get("/api/voices")
-async def get_voices():
+async def get_voices(request: Request):
     try:
-        res = await tts.list_voices()
-        return res.json()
+        body, etag = await tts.voice_catalogue.get()
     except Exception as e:
         logging.error(f"Error fetching voices: {e}")
         return JSONResponse(content={"error": "Unable to fetch voices."}, status_code=500)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        tts.voice_catalogue.stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Personas a session can pick with `?persona=` or a {"type": "persona"} message
+@app.get("/api/personas")
+def get_personas():
+    return {"default": persona.get_persona().name, "personas": persona.list_personas()}
+
+# Batch transcription: the upload is spooled to disk and queued; poll the job or watch it over
+# /api/ws/transcriptions/{job_id}
+@app.post("/api/transcriptions", status_code=202)
+async def create_transcription(request: Request):
+    job = await batch.submit_request(request)
+    return {**job.to_dict(), "status_url": f"/api/transcriptions/{job.id}"}
+
+@app.get("/api/transcriptions/{job_id}")
+async def get_transcription(job_id: str):
+    job = await batch.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown transcription job.")
+    return job
+
+@app.websocket("/api/ws/transcriptions/{job_id}")
+async def watch_transcription(websocket: WebSocket, job_id: str):
+    await websocket.accept()
+    try:
+        found = False
+        async for job in batch.watch_job(job_id):
+            found = True
+            await websocket.send_json({"type": "transcription", **job})
+        if not found:
+            await websocket.send_json({"type": "error", "message": "Unknown transcription job."})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
 
 
 # 3. Websocket endpoint for real-time communication (Day 15)
@@ -70,14 +241,104 @@ async def websocket_endpoint(websocket: WebSocket):
         logging.error(f"WebSocket error: {e}")
 
 
+class AudioConnection:
+    """Per-socket state shared by every turn on /api/ws/audio."""
+    def __init__(self, websocket: WebSocket, session_id: str):
+        self.websocket = websocket
+        self.session_id = session_id
+        # `?audio_stream=1` clients can play partial chunks; others get one message per segment
+        self.stream_audio = websocket.query_params.get("audio_stream") == "1"
+        # `?framing=binary` clients get raw audio frames instead of base64 JSON
+        self.audio_out = framing.AudioSender(websocket, framing.negotiate_framing(websocket))
+        # Everything sent to the client goes through here: bounded queues, control before audio
+        self.outbound = outbound.OutboundScheduler(websocket, self.audio_out, session_id)
+        self.outbound.start()
+        # `?audio_formats=pcm,mulaw&sample_rate=16000` (and `bandwidth=low`) pick the output encoding
+        self.output_format = audio_format.negotiate_output_format(websocket.query_params)
+        self.recorder = tts.SessionRecorder(session_id) if TTS_RECORD_SESSIONS else None
+        # `?persona=detective` picks the persona (DEFAULT_PERSONA otherwise); switchable mid-session
+        self.persona_error: str | None = None
+        try:
+            self.persona = persona.get_persona(websocket.query_params.get("persona"))
+        except ValueError as e:
+            self.persona_error = str(e)
+            self.persona = persona.get_persona()
+        # One bot turn at a time; the user speaking again cancels it (barge-in)
+        self.turns = turn_manager.TurnManager(on_cancelled=self.notify_turn_cancelled)
+        # Seeded from the session store on the first turn, then extended turn by turn
+        self.prompt_builder: persona.PromptBuilder | None = None
+        # Optional: start the LLM on a settled partial transcript (LLM_SPECULATION=1)
+        self.speculation = speculation.SpeculativePrefetcher(self.prepare_speculation)
+
+    async def get_prompt_builder(self) -> persona.PromptBuilder:
+        if self.prompt_builder is None:
+            self.prompt_builder = persona.PromptBuilder(self.persona)
+            self.prompt_builder.extend(await session_store.get_history(self.session_id))
+        return self.prompt_builder
+
+    async def prepare_speculation(self, text: str):
+        # Don't speculate over a bot turn that is still producing history
+        if self.turns.active:
+            return None
+        prompt_builder = await self.get_prompt_builder()
+        prompt = prompt_builder.preview({"role": "User", "content": text})["prompt"]
+        return llm.stream_llm_response_v2(prompt), prompt_builder.revision
+
+    def set_persona(self, name: str):
+        """Switch persona for the next turn; a turn already running keeps its voice and prompt."""
+        self.persona = persona.get_persona(name)
+        if self.prompt_builder is not None:
+            # Bumps the revision, so a speculative answer in the old persona is not claimed
+            self.prompt_builder.set_persona(self.persona)
+
+    async def handle_message(self, text: str):
+        """Control messages sent as text frames next to the binary mic audio."""
+        try:
+            message = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(message, dict):
+            return
+        if message.get("type") == "persona":
+            try:
+                self.set_persona(str(message.get("name") or ""))
+            except ValueError as e:
+                await self.outbound.send_json({"type": "error", "message": str(e)})
+                return
+            await self.outbound.send_json({"type": "persona", **self.persona.describe()})
+
+    async def notify_turn_cancelled(self, turn: turn_manager.Turn, reason: str):
+        # Audio of the interrupted answer that the client has not received yet is never sent
+        self.outbound.flush_turn(turn.id)
+        await self.outbound.send_json({"type": "turn-cancelled", "turn_id": turn.id, "reason": reason})
+
+    async def close(self):
+        await self.turns.cancel("disconnected", notify=False)
+        self.speculation.close()
+        await self.outbound.close()
+        tts.release_session(self.session_id)
+        if self.recorder:
+            self.recorder.close()
+
+
 # 4. Websocket endpoint for real-time communication (Day 16)
-async def llm_tts_pipeline(session_id: str, text: str, websocket: WebSocket):
-    await websocket.send_json({"type": "transcript", "user": "user", "text": text})
-    tts_queue = asyncio.Queue()
+async def llm_tts_pipeline(
+    conn: AudioConnection, text: str, turn: turn_manager.Turn, speech_end_at: float | None = None
+):
+    session_id, outbox, turn_id = conn.session_id, conn.outbound, turn.id
+    # Voice-to-voice latency is taken once, at the first audio of the answer
+    first_audio_pending = speech_end_at is not None
+    await outbox.send_json({"type": "transcript", "user": "user", "text": text})
+    # Owned by the turn, so a barge-in can drain segments that were never synthesized
+    tts_queue = turn.tts_queue
     # Append user message to chat history
-    history = chat_history_store.get(session_id, [])
-    history.append({"role": "User", "content": text})
-    persona_data = persona.build_persona(history, persona.PersonaType.PIRATE)
+    user_message = {"role": "User", "content": text}
+    prompt_builder = await conn.get_prompt_builder()
+    # Take over the speculative LLM stream if it was started for this very transcript
+    speculative = conn.speculation.claim(text, prompt_builder.revision)
+    prompt_builder.add_turn(user_message)
+    await session_store.append(session_id, user_message)
+    persona_data = prompt_builder.build()
 
     # Task to stream LLM text and push it to the TTS queue
     async def llm_worker():
@@ -85,63 +346,175 @@ async def llm_tts_pipeline(session_id: str, text: str, websocket: WebSocket):
             # Construct prompt with chat history for Gemini LLM
 
             # Query Gemini LLM with streaming (v2 for chunked response)
-            full_response = ""
-            async for chunk in llm.stream_llm_response_v2(persona_data["prompt"]):
-                if chunk:
-                    await tts_queue.put(chunk)
-                    full_response  += chunk
+            response_parts = []
+
+            async def llm_chunks():
+                if speculative is not None:
+                    # Timed from when the prefetch request went out: the replay starts with
+                    # chunks that are already buffered
+                    source, started = speculative.replay(), speculative.started_at
+                else:
+                    source, started = llm.stream_llm_response_v2(persona_data["prompt"]), time.perf_counter()
+                first_chunk_at = None
+                async for chunk in source:
+                    if chunk:
+                        if first_chunk_at is None:
+                            first_chunk_at = (speculative and speculative.first_chunk_at) or time.perf_counter()
+                            metrics.LLM_TIME_TO_FIRST_TOKEN.observe(first_chunk_at - started)
+                        response_parts.append(chunk)
+                        yield chunk
+                if first_chunk_at is not None:
+                    finished_at = (speculative and speculative.finished_at) or time.perf_counter()
+                    generating = finished_at - first_chunk_at
+                    if generating > 0:
+                        tokens = persona.estimate_tokens("".join(response_parts))
+                        metrics.LLM_TOKENS_PER_SECOND.observe(tokens / generating)
+
+            # Re-cut the raw Gemini fragments into clause/sentence segments before TTS
+            segment_stats = {}
+            async for segment in segmenter.segment_stream(llm_chunks(), stats=segment_stats):
+                await tts_queue.put(segment)
+            logging.info(
+                f"Segmented {segment_stats['source_chunks']} LLM chunks into {segment_stats['segments']} TTS segments "
+                f"(first segment after {segment_stats['first_segment_seconds'] or 0:.3f}s)"
+            )
+            full_response = "".join(response_parts)
             # After LLM response complete, store it in chat history
-            await websocket.send_json({"type": "llm-response", "user": "bot", "text": full_response})
-            history.append({"role": "Aanya", "content": full_response})
-            chat_history_store[session_id] = history
-        finally:
+            await outbox.send_json({"type": "llm-response", "user": "bot", "text": full_response})
+            bot_message = {"role": "Aanya", "content": full_response}
+            prompt_builder.add_turn(bot_message)
+            await session_store.append(session_id, bot_message)
             await tts_queue.put(None)  # Signal that LLM is done
+        finally:
+            turn.llm_done = True
+    async def send_audio(audio_bytes: bytes, partial: bool = False):
+        nonlocal first_audio_pending
+        # Streamed chunks may be merged for a slow client, except "wav" ones (a header per message)
+        mergeable = conn.output_format.format != audio_format.FORMAT_WAV
+        await outbox.send_audio(audio_bytes, turn_id, partial=partial, mergeable=mergeable)
+        if first_audio_pending:
+            first_audio_pending = False
+            metrics.VOICE_TO_VOICE_LATENCY.observe(time.perf_counter() - speech_end_at)
+
     # Task to get text from queue and synthesize audio
     async def tts_worker():
+        fallback_sent = False
         while True:
             chunk = await tts_queue.get()
             if chunk is None:
                 break
             try:
-                audio_bytes = tts.speak(chunk, persona_data["voiceId"])
-                if audio_bytes:
-                    b64_audio = base64.b64encode(audio_bytes).decode('utf-8')
-                    await websocket.send_json({"type": "audio", "b64": b64_audio})
+                requested = time.perf_counter()
+                first_byte = True
+                segment_audio = []
+                # Resamples / re-encodes to the session's negotiated format (no-op for "source")
+                converter = audio_format.SegmentConverter(conn.output_format)
+                async for audio_bytes in tts.synthesize_stream(chunk, persona_data["voiceId"], session_id, conn.recorder):
+                    if first_byte:
+                        first_byte = False
+                        metrics.TTS_TIME_TO_FIRST_BYTE.observe(time.perf_counter() - requested)
+                    audio_bytes = await converter.convert(audio_bytes)
+                    if not audio_bytes:
+                        continue
+                    if conn.stream_audio:
+                        # Forward every Murf chunk the moment it arrives
+                        await send_audio(converter.package(audio_bytes), partial=True)
+                    else:
+                        segment_audio.append(audio_bytes)
+                # Legacy clients decode each message on its own, so send whole segments
+                if segment_audio:
+                    await send_audio(converter.package(b"".join(segment_audio)))
             except Exception as e:
                 logging.error(f"TTS Error: {e}")
+                # Tell the user once per turn, using the pre-warmed phrase if we have it
+                fallback_audio = None if fallback_sent else tts.cached_fallback_audio(persona_data["voiceId"])
+                if fallback_audio:
+                    fallback_sent = True
+                    await send_audio(await audio_format.convert_audio(fallback_audio, conn.output_format))
             finally:
                 tts_queue.task_done()
-    # Start and manage tasks
-    await asyncio.gather(
-        asyncio.create_task(llm_worker()),
-        asyncio.create_task(tts_worker())
-    )
+    # Start and manage tasks. If one worker fails the other is cancelled too: an LLM worker left
+    # behind would keep its stream open and wait forever on the full tts_queue
+    workers = [asyncio.create_task(llm_worker()), asyncio.create_task(tts_worker())]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
 
 @app.websocket("/api/ws/audio")
 async def websocket_audio_endpoint(websocket: WebSocket):
     """Handles WebSocket connection for real-time transcription and voice response."""
     await websocket.accept()
     logging.info("WebSocket client connected.")
-    # Get the current asyncio event loop
-    loop = asyncio.get_event_loop()
-    session_id = "default_session"
-    # Callback function for when final transcription is received
+    # Clients may pass back a previous `?session_id=` to resume their conversation
+    session_id = session_stores.resolve_session_id(websocket.query_params.get("session_id"))
+    conn = AudioConnection(websocket, session_id)
+    await conn.outbound.send_json({"type": "session", "session_id": session_id})
+    if conn.audio_out.mode == framing.FRAMING_BINARY:
+        await conn.outbound.send_json(conn.audio_out.hello_message())
+    if conn.output_format.converted:
+        await conn.outbound.send_json({"type": "audio-format", **conn.output_format.describe()})
+    if conn.persona_error:
+        await conn.outbound.send_json({"type": "error", "message": conn.persona_error})
+    if "persona" in websocket.query_params:
+        await conn.outbound.send_json({"type": "persona", **conn.persona.describe()})
+    # Transcript callbacks run on the event loop (the transcriber hands events over from the
+    # SDK thread). Starting a turn cancels whatever the bot is still saying.
     def on_final_transcript(text: str):
-        # Use run_coroutine_threadsafe to schedule the coroutine from the callback thread
-        asyncio.run_coroutine_threadsafe(
-            llm_tts_pipeline(session_id, text, websocket), loop
-        )
-    
-    # Initialize the streaming transcriber
-    transcriber = stt.AssemblyAIStreamingTranscriber(on_final_callback=on_final_transcript)
+        # The VAD knows when the user stopped talking; without it there is no speech-end anchor
+        speech_end_at = getattr(transcriber, "last_speech_at", None)
+        if speech_end_at is not None:
+            metrics.STT_FINAL_LATENCY.observe(time.perf_counter() - speech_end_at)
+            # Measured once per spoken turn; the next final needs new speech to anchor on
+            transcriber.last_speech_at = None
+        return conn.turns.start(lambda turn: llm_tts_pipeline(conn, text, turn, speech_end_at))
+
+    # Long enough partial transcripts interrupt the bot before the user finishes
+    async def on_partial_transcript(text: str):
+        await conn.turns.on_partial(text)
+        await conn.speculation.on_partial(text)
+
+    # The local VAD notices the end of speech before AssemblyAI does
+    async def on_vad_event(event: str):
+        if event == stt.VAD_END_OF_TURN:
+            await conn.speculation.on_end_of_turn_hint()
+
+    transcriber = None
     try:
+        # Inside the try, so a provider that can't be built (e.g. a missing API key) still
+        # releases the connection's send queue, and the client is told why it is closed
+        try:
+            transcriber = await stt.create_transcriber(
+                on_partial_callback=on_partial_transcript,
+                on_final_callback=on_final_transcript,
+                on_vad_callback=on_vad_event,
+            )
+            await transcriber.start()
+        except Exception as e:
+            logging.error(f"Could not start transcription: {e}")
+            await conn.outbound.send_json({"type": "error", "message": "Speech recognition is unavailable right now."})
+            await conn.outbound.drain()
+            await websocket.close(code=1011)
+            return
         while True:
-            data = await websocket.receive_bytes()
-            transcriber.stream_audio(data)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                transcriber.stream_audio(message["bytes"])
+            elif message.get("text"):
+                await conn.handle_message(message["text"])
     except Exception as e:
         logging.info(f"WebSocket connection closed: {e}")
     finally:
-        transcriber.close()
+        if transcriber is not None:
+            try:
+                await transcriber.aclose()
+            except Exception as e:
+                logging.info(f"Transcriber close failed: {e}")
+        await conn.close()
         logging.info("Transcription resources released.")
 
 
@@ -0,0 +1,219 @@
+import asyncio
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.config import AUDIO_OUT_SAMPLE_RATES, AUDIO_OUT_DEFAULT_RATE, AUDIO_CONVERT_WORKERS, MURF_WS_SAMPLE_RATE
+
+# Per-session TTS output format. Murf is always asked for mono 16-bit WAV at MURF_WS_SAMPLE_RATE;
+# a client can negotiate something cheaper to receive on /api/ws/audio:
+#
+#   ?audio_formats=pcm,wav&sample_rate=16000     formats it can decode, in order of preference
+#   ?bandwidth=low                               prefer the smallest format / rate it supports
+#
+#   source  Murf's audio as is (default, what existing clients get)
+#   pcm     raw s16le mono at the negotiated rate
+#   wav     the same with a WAV header on every message (for decodeAudioData-style players)
+#   mulaw   G.711 mu-law, 8 bits per sample: half of PCM, decoded with a 256-entry table
+#
+# Resampling and encoding run on a small thread pool (NumPy releases the GIL), never on the loop.
+
+FORMAT_SOURCE = "source"
+FORMAT_PCM = "pcm"
+FORMAT_WAV = "wav"
+FORMAT_MULAW = "mulaw"
+CONVERTED_FORMATS = (FORMAT_PCM, FORMAT_WAV, FORMAT_MULAW)
+# Smallest on the wire first
+LOW_BANDWIDTH_PREFERENCE = (FORMAT_MULAW, FORMAT_PCM, FORMAT_WAV)
+LOW_BANDWIDTH_RATE = 16000
+
+_convert_executor = ThreadPoolExecutor(max_workers=AUDIO_CONVERT_WORKERS, thread_name_prefix="audio-convert")
+
+audio_format_stats = {
+    "segments": 0,
+    "converted_segments": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "convert_seconds": 0.0,
+}
+
+
+class OutputFormat:
+    def __init__(self, format: str = FORMAT_SOURCE, sample_rate: int = MURF_WS_SAMPLE_RATE):
+        self.format = format
+        self.sample_rate = sample_rate
+
+    @property
+    def converted(self) -> bool:
+        return self.format != FORMAT_SOURCE
+
+    def describe(self) -> dict:
+        """Sent to the client as {"type": "audio-format", ...} once negotiated."""
+        encoding = "mulaw" if self.format == FORMAT_MULAW else "s16le"
+        return {"format": self.format, "encoding": encoding, "sample_rate": self.sample_rate, "channels": 1}
+
+
+def _pick_rate(requested: int | None, ceiling: int | None = None) -> int:
+    # Never above what Murf produces: upsampling only adds bytes
+    allowed = [rate for rate in AUDIO_OUT_SAMPLE_RATES if rate <= MURF_WS_SAMPLE_RATE] or [MURF_WS_SAMPLE_RATE]
+    target = min(requested or AUDIO_OUT_DEFAULT_RATE, ceiling or MURF_WS_SAMPLE_RATE)
+    fitting = [rate for rate in allowed if rate <= target]
+    return max(fitting) if fitting else min(allowed)
+
+
+def negotiate_output_format(params) -> OutputFormat:
+    """Choose the output format from the client's query parameters (see the module comment)."""
+    offered = params.get("audio_formats") or params.get("audio_format") or ""
+    formats = [f.strip() for f in offered.split(",") if f.strip() in CONVERTED_FORMATS]
+    if not formats:
+        return OutputFormat()
+    try:
+        requested_rate = int(params.get("sample_rate", 0))
+    except ValueError:
+        requested_rate = 0
+    if params.get("bandwidth") == "low":
+        format = next(f for f in LOW_BANDWIDTH_PREFERENCE if f in formats)
+        return OutputFormat(format, _pick_rate(requested_rate, ceiling=LOW_BANDWIDTH_RATE))
+    return OutputFormat(formats[0], _pick_rate(requested_rate))
+
+
+def wav_header(sample_rate: int, data_bytes: int, bits: int = 16) -> bytes:
+    block_align = bits // 8
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_bytes, b"WAVE", b"fmt ", 16, 1, 1,
+        sample_rate, sample_rate * block_align, block_align, bits, b"data", data_bytes,
+    )
+
+
+def parse_wav_header(data: bytes) -> tuple[int, int, int, int] | None:
+    """(offset of the samples, sample rate, channels, bits) of a PCM WAV header, else None."""
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    offset, fmt = 12, None
+    while offset + 8 <= len(data):
+        chunk_id, size = struct.unpack_from("<4sI", data, offset)
+        if chunk_id == b"fmt " and offset + 24 <= len(data):
+            format_tag, channels, rate = struct.unpack_from("<HHI", data, offset + 8)
+            bits = struct.unpack_from("<H", data, offset + 22)[0]
+            fmt = (format_tag, channels, rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None or fmt[0] != 1:
+                return None
+            return offset + 8, fmt[2], fmt[1], fmt[3]
+        offset += 8 + size + (size & 1)
+    return None
+
+
+def mulaw_encode(samples: np.ndarray) -> bytes:
+    """G.711 mu-law encoding of int16 samples."""
+    values = samples.astype(np.int32)
+    sign = (values < 0).astype(np.int32) << 7
+    magnitude = np.minimum(np.abs(values), 32635) + 0x84
+    exponent = np.clip(np.floor(np.log2(magnitude)).astype(np.int32) - 7, 0, 7)
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8).tobytes()
+
+
+class StreamResampler:
+    """
+    Chunk-by-chunk downsampler: a short windowed-sinc low-pass (anti-aliasing), then linear
+    interpolation. Keeps filter history and the fractional read position between chunks, so
+    chunk boundaries are seamless.
+    """
+    def __init__(self, source_rate: int, target_rate: int, taps: int = 31):
+        self.step = source_rate / target_rate
+        cutoff = 0.45 * min(1.0, target_rate / source_rate)  # cycles per source sample
+        n = np.arange(taps) - (taps - 1) / 2
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+        self.kernel = (kernel / kernel.sum()).astype(np.float32)
+        self._history = np.zeros(taps - 1, dtype=np.float32)
+        self._last: np.ndarray | None = None
+        self._next = 0.0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        if not len(samples):
+            return np.zeros(0, dtype=np.int16)
+        extended = np.concatenate((self._history, samples.astype(np.float32)))
+        filtered = np.convolve(extended, self.kernel, mode="valid")
+        self._history = extended[len(extended) - len(self._history):]
+        sequence = filtered if self._last is None else np.concatenate((self._last, filtered))
+        end = len(sequence) - 1
+        times = np.arange(self._next, end + 1e-9, self.step)
+        out = np.interp(times, np.arange(len(sequence)), sequence)
+        # Re-base the read position on the last sample, which starts the next sequence
+        self._next = (times[-1] + self.step if len(times) else self._next) - end
+        self._last = sequence[-1:]
+        return np.clip(np.round(out), -32768, 32767).astype(np.int16)
+
+
+class SegmentConverter:
+    """
+    Converts one TTS segment's audio chunks (a WAV stream, or raw s16le at the Murf rate) into
+    the session's output format. `convert` each chunk as it arrives, then `package` what is
+    sent (adds the WAV header for "wav" clients).
+    """
+    def __init__(self, target: OutputFormat):
+        self.target = target
+        self.source_rate = MURF_WS_SAMPLE_RATE
+        self._carry = b""
+        self._resampler: StreamResampler | None = None
+        self._passthrough = not target.converted
+        audio_format_stats["segments"] += 1
+        if target.converted:
+            audio_format_stats["converted_segments"] += 1
+
+    async def convert(self, chunk: bytes) -> bytes:
+        audio_format_stats["bytes_in"] += len(chunk)
+        if self._passthrough:
+            audio_format_stats["bytes_out"] += len(chunk)
+            return chunk
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_convert_executor, self._convert, chunk)
+
+    def package(self, payload: bytes) -> bytes:
+        if self.target.format == FORMAT_WAV:
+            return wav_header(self.target.sample_rate, len(payload)) + payload
+        return payload
+
+    def _convert(self, chunk: bytes) -> bytes:
+        started = time.perf_counter()
+        header = parse_wav_header(chunk)
+        if header is not None:
+            offset, rate, channels, bits = header
+            if channels != 1 or bits != 16:
+                # Not what we ask Murf for; forward untouched rather than garble it
+                self._passthrough = True
+                audio_format_stats["bytes_out"] += len(chunk)
+                return chunk
+            chunk = chunk[offset:]
+            if rate != self.source_rate:
+                self.source_rate = rate
+                self._resampler = None
+        data = self._carry + chunk
+        usable = len(data) - len(data) % 2
+        self._carry = data[usable:]
+        samples = np.frombuffer(data, dtype="<i2", count=usable // 2)
+        if self.target.sample_rate < self.source_rate:
+            if self._resampler is None:
+                self._resampler = StreamResampler(self.source_rate, self.target.sample_rate)
+            samples = self._resampler.process(samples)
+        if self.target.format == FORMAT_MULAW:
+            out = mulaw_encode(samples)
+        else:
+            out = samples.astype("<i2").tobytes()
+        audio_format_stats["bytes_out"] += len(out)
+        audio_format_stats["convert_seconds"] += time.perf_counter() - started
+        return out
+
+
+async def convert_audio(audio: bytes, target: OutputFormat) -> bytes:
+    """Whole-segment conversion, e.g. for the cached fallback phrase."""
+    converter = SegmentConverter(target)
+    return converter.package(await converter.convert(audio))
+
+
+def get_audio_format_stats() -> dict:
+    return dict(audio_format_stats)
@@ -0,0 +1,365 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator
+
+from fastapi import HTTPException, Request, UploadFile
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from core.config import (
+    BATCH_SPOOL_DIR,
+    BATCH_UPLOAD_CHUNK_BYTES,
+    BATCH_MAX_UPLOAD_BYTES,
+    BATCH_MAX_UPLOADS,
+    BATCH_MAX_WORKERS,
+    BATCH_MAX_PENDING,
+    BATCH_JOB_TTL,
+)
+from services.providers import get_provider
+
+# Batch (file) transcription jobs behind /api/transcriptions.
+# The request body is parsed as it arrives and the audio written to BATCH_SPOOL_DIR one chunk
+# at a time, so a large file never sits in memory and the size and concurrency limits apply
+# while it is still uploading; the STT provider then reads it from disk. Jobs run on their own small thread pool,
+# bounded by BATCH_MAX_WORKERS, instead of the default executor the real-time sessions use.
+# Each job's status is also written next to its audio as <job_id>.json, so any worker process
+# on the host can answer a status poll.
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+FINISHED = (JOB_DONE, JOB_FAILED)
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+# How often other workers' jobs are polled from disk, and stale spool files swept
+STATUS_POLL_SECONDS = 0.5
+SWEEP_SECONDS = 60.0
+# Room for the multipart boundaries and part headers on top of BATCH_MAX_UPLOAD_BYTES
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+spool_dir = Path(BATCH_SPOOL_DIR)
+_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix="batch-stt")
+_uploads = asyncio.Semaphore(BATCH_MAX_UPLOADS)
+_workers = asyncio.Semaphore(BATCH_MAX_WORKERS)
+_last_sweep = 0.0
+
+batch_stats = {
+    "submitted": 0,
+    "rejected": 0,
+    "completed": 0,
+    "failed": 0,
+    "bytes_spooled": 0,
+    "uploading": 0,
+    "queued": 0,
+    "running": 0,
+}
+
+
+class TranscriptionJob:
+    def __init__(self, size: int):
+        self.id = uuid.uuid4().hex
+        self.path = spool_dir / f"{self.id}.audio"
+        self.size = size
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.text: str | None = None
+        self.error: str | None = None
+        self.task: asyncio.Task | None = None
+        self.done = asyncio.Event()
+        # Replaced on every status change, so watchers can wait for the next one
+        self.updated = asyncio.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "bytes": self.size,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "text": self.text,
+            "error": self.error,
+        }
+
+    def set_status(self, status: str):
+        self.status = status
+        if status == JOB_RUNNING:
+            self.started_at = time.time()
+        elif status in FINISHED:
+            self.finished_at = time.time()
+            self.done.set()
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+
+_jobs: dict[str, TranscriptionJob] = {}
+
+
+def _status_path(job_id: str) -> Path:
+    return spool_dir / f"{job_id}.json"
+
+
+def _write_status(job: dict):
+    path = _status_path(job["job_id"])
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(job))
+    os.replace(tmp, path)
+
+
+async def _save(job: TranscriptionJob):
+    await asyncio.to_thread(_write_status, job.to_dict())
+
+
+async def _upload_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await file.read(BATCH_UPLOAD_CHUNK_BYTES):
+        yield chunk
+
+
+async def _multipart_file_chunks(stream: AsyncIterator[bytes], boundary: bytes, field: str = "file") -> AsyncIterator[bytes]:
+    """The bytes of one file field of a multipart/form-data body, as the body arrives."""
+    data: list[bytes] = []
+    part = {"field": b"", "value": b"", "headers": {}, "wanted": False, "found": False}
+
+    def on_part_begin():
+        part["headers"] = {}
+        part["wanted"] = False
+
+    def on_header_field(buf, start, end):
+        part["field"] += buf[start:end]
+
+    def on_header_value(buf, start, end):
+        part["value"] += buf[start:end]
+
+    def on_header_end():
+        part["headers"][part["field"].lower()] = part["value"]
+        part["field"] = part["value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        part["wanted"] = not part["found"] and options.get(b"name") == field.encode()
+
+    def on_part_data(buf, start, end):
+        if part["wanted"]:
+            data.append(bytes(buf[start:end]))
+
+    def on_part_end():
+        if part["wanted"]:
+            part["found"] = True
+            part["wanted"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    try:
+        async for chunk in stream:
+            parser.write(chunk)
+            if data:
+                yield b"".join(data)
+                data.clear()
+        parser.finalize()
+    except MultipartParseError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed multipart upload: {e}")
+    if data:
+        yield b"".join(data)
+    if not part["found"]:
+        raise HTTPException(status_code=400, detail=f'No "{field}" field in the upload.')
+
+
+async def spool_upload(chunks: AsyncIterator[bytes], path: Path) -> int:
+    """Write incoming chunks to `path` as they arrive, stopping at BATCH_MAX_UPLOAD_BYTES; returns the size."""
+    size = 0
+    out = await asyncio.to_thread(open, path, "wb")
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > BATCH_MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Upload exceeds {BATCH_MAX_UPLOAD_BYTES} bytes.")
+            await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        await asyncio.to_thread(out.close)
+        path.unlink(missing_ok=True)
+        raise
+    await asyncio.to_thread(out.close)
+    return size
+
+
+async def _admit():
+    await _sweep()
+    if batch_stats["queued"] + batch_stats["running"] >= BATCH_MAX_PENDING:
+        batch_stats["rejected"] += 1
+        raise HTTPException(status_code=503, detail="Too many transcription jobs, retry later.", headers={"Retry-After": "10"})
+    if _uploads.locked():
+        batch_stats["rejected"] += 1
+        raise HTTPException(status_code=429, detail="Too many uploads in progress, retry later.", headers={"Retry-After": "5"})
+
+
+async def _queue(chunks: AsyncIterator[bytes]) -> TranscriptionJob:
+    await asyncio.to_thread(spool_dir.mkdir, parents=True, exist_ok=True)
+    job = TranscriptionJob(size=0)
+    async with _uploads:
+        batch_stats["uploading"] += 1
+        try:
+            job.size = await spool_upload(chunks, job.path)
+        finally:
+            batch_stats["uploading"] -= 1
+    if not job.size:
+        job.path.unlink(missing_ok=True)
+        raise HTTPException(status_code=400, detail="No audio data in uploaded file.")
+
+    batch_stats["submitted"] += 1
+    batch_stats["bytes_spooled"] += job.size
+    batch_stats["queued"] += 1
+    _jobs[job.id] = job
+    await _save(job)
+    job.task = asyncio.create_task(_run(job))
+    logging.info(f"Transcription job {job.id} queued ({job.size} bytes)")
+    return job
+
+
+async def submit(file: UploadFile) -> TranscriptionJob:
+    """Spool an already-received upload and queue it for transcription."""
+    if not file:
+        raise HTTPException(status_code=400, detail="No file provided for transcription.")
+    await _admit()
+    return await _queue(_upload_chunks(file))
+
+
+async def submit_request(request: Request) -> TranscriptionJob:
+    """
+    Queue the audio in an HTTP request body, read straight from the socket into the spool
+    file: a multipart form with a "file" field, or the raw audio itself. The limits are
+    checked before the body is read (Content-Length) and again while it streams in.
+    """
+    await _admit()
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > BATCH_MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+        batch_stats["rejected"] += 1
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {BATCH_MAX_UPLOAD_BYTES} bytes.")
+
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type == b"multipart/form-data":
+        boundary = options.get(b"boundary")
+        if not boundary:
+            raise HTTPException(status_code=400, detail="Multipart upload without a boundary.")
+        chunks = _multipart_file_chunks(request.stream(), boundary)
+    else:
+        chunks = request.stream()
+    return await _queue(chunks)
+
+
+def _transcribe(path: Path) -> str | None:
+    return get_provider("stt").transcribe_file(str(path))
+
+
+async def _run(job: TranscriptionJob):
+    started = False
+    try:
+        async with _workers:
+            started = True
+            batch_stats["queued"] -= 1
+            batch_stats["running"] += 1
+            job.set_status(JOB_RUNNING)
+            try:
+                await _save(job)
+                loop = asyncio.get_running_loop()
+                job.text = await loop.run_in_executor(_executor, _transcribe, job.path)
+                job.set_status(JOB_DONE)
+                batch_stats["completed"] += 1
+            finally:
+                batch_stats["running"] -= 1
+    except asyncio.CancelledError:
+        job.error = "cancelled"
+        job.set_status(JOB_FAILED)
+        raise
+    except Exception as e:
+        logging.error(f"Transcription job {job.id} failed: {e}")
+        job.error = str(e)
+        job.set_status(JOB_FAILED)
+        batch_stats["failed"] += 1
+    finally:
+        if not started:
+            batch_stats["queued"] -= 1
+        job.path.unlink(missing_ok=True)
+    await _save(job)
+    logging.info(f"Transcription job {job.id} {job.status}")
+
+
+async def get_job(job_id: str) -> dict | None:
+    """Status of a job from this process, or from the status file another worker wrote."""
+    if not _JOB_ID.fullmatch(job_id):
+        return None
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job.to_dict()
+    try:
+        return json.loads(await asyncio.to_thread(_status_path(job_id).read_text))
+    except (OSError, ValueError):
+        return None
+
+
+async def watch_job(job_id: str):
+    """Yield the job's status each time it changes, until it finishes."""
+    last = None
+    while True:
+        job = _jobs.get(job_id)
+        updated = job.updated if job else None
+        status = await get_job(job_id)
+        if status is None:
+            return
+        if status != last:
+            yield status
+            last = status
+        if status["status"] in FINISHED:
+            return
+        if updated is not None:
+            await updated.wait()
+        else:
+            await asyncio.sleep(STATUS_POLL_SECONDS)
+
+
+def _sweep_files(cutoff: float):
+    for path in spool_dir.glob("*"):
+        try:
+            if path.stat().st_mtime < cutoff and path.stem not in _jobs:
+                path.unlink()
+        except OSError:
+            pass
+
+
+async def _sweep():
+    """Forget finished jobs past BATCH_JOB_TTL and delete stale spool files (any worker's)."""
+    global _last_sweep
+    now = time.time()
+    for job_id, job in list(_jobs.items()):
+        if job.finished_at is not None and now - job.finished_at > BATCH_JOB_TTL:
+            del _jobs[job_id]
+    if now - _last_sweep > SWEEP_SECONDS and spool_dir.exists():
+        _last_sweep = now
+        await asyncio.to_thread(_sweep_files, now - BATCH_JOB_TTL)
+
+
+async def close():
+    for job in _jobs.values():
+        if job.task and not job.task.done():
+            job.task.cancel()
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_batch_stats() -> dict:
+    return dict(batch_stats)
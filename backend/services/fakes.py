@@ -0,0 +1,187 @@
+import asyncio
+import random
+import time
+
+# Offline stand-ins for the external providers, for benchmarks and local runs without API keys.
+# Select them app-wide with LLM_PROVIDER=fake STT_PROVIDER=fake TTS_PROVIDER=fake, or swap one in:
+#
+#     import services.llm_service as llm
+#     from services.fakes import FakeGenerativeModel
+#     llm.register_model("gemini-1.5-flash", FakeGenerativeModel(first_token_delay=0.4))
+
+DEFAULT_REPLY = (
+    "Ahoy matey! The seas be calm and the wind be fair today. "
+    "Ask me for a joke or a riddle, and I'll spin ye a fine yarn from the seven seas."
+)
+
+
+def jittered(delay: float, jitter: float) -> float:
+    """`delay` with gaussian jitter (standard deviation `jitter`), never negative."""
+    return max(0.0, random.gauss(delay, jitter)) if jitter else delay
+
+
+class FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    Mimics google.generativeai.GenerativeModel for streaming calls:
+        - waits `first_token_delay` seconds (± `jitter`) before the first chunk
+        - then yields `words_per_chunk` words every `chunk_delay` seconds
+    Counts started, completed and cancelled streams so tests can assert on them.
+    """
+    def __init__(
+        self,
+        reply: str = DEFAULT_REPLY,
+        first_token_delay: float = 0.3,
+        chunk_delay: float = 0.03,
+        words_per_chunk: int = 3,
+        jitter: float = 0.0,
+    ):
+        self.reply = reply
+        self.first_token_delay = first_token_delay
+        self.jitter = jitter
+        self.chunk_delay = chunk_delay
+        self.words_per_chunk = words_per_chunk
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+
+    def _chunks(self) -> list[str]:
+        words = self.reply.split(" ")
+        return [
+            " ".join(words[i:i + self.words_per_chunk]) + " "
+            for i in range(0, len(words), self.words_per_chunk)
+        ]
+
+    async def _stream(self):
+        self.started += 1
+        try:
+            await asyncio.sleep(jittered(self.first_token_delay, self.jitter))
+            for piece in self._chunks():
+                yield FakeChunk(piece)
+                await asyncio.sleep(self.chunk_delay)
+            self.completed += 1
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            raise
+
+    async def generate_content_async(self, contents, *, stream: bool = False, **kwargs):
+        if stream:
+            return self._stream()
+        await asyncio.sleep(self.first_token_delay)
+        return FakeChunk(self.reply)
+
+    def generate_content(self, contents, *, stream: bool = False, **kwargs):
+        time.sleep(self.first_token_delay)
+        if stream:
+            return iter(FakeChunk(piece) for piece in self._chunks())
+        return FakeChunk(self.reply)
+
+
+class FakeTextToSpeech:
+    """Mimics `Murf(...).text_to_speech.stream`: blocking, yields silent audio chunks."""
+    def __init__(
+        self,
+        chunk_delay: float = 0.02,
+        bytes_per_char: int = 200,
+        chunk_bytes: int = 4096,
+        first_chunk_delay: float = 0.0,
+        jitter: float = 0.0,
+    ):
+        self.chunk_delay = chunk_delay
+        self.bytes_per_char = bytes_per_char
+        self.chunk_bytes = chunk_bytes
+        self.first_chunk_delay = first_chunk_delay
+        self.jitter = jitter
+
+    def stream(self, text: str, voice_id: str, style: str = "Conversational", **kwargs):
+        if self.first_chunk_delay or self.jitter:
+            time.sleep(jittered(self.first_chunk_delay, self.jitter))
+        remaining = max(1, len(text) * self.bytes_per_char)
+        while remaining > 0:
+            time.sleep(self.chunk_delay)
+            size = min(self.chunk_bytes, remaining)
+            remaining -= size
+            yield bytes(size)
+
+
+class FakeMurfClient:
+    def __init__(self, **kwargs):
+        self.text_to_speech = FakeTextToSpeech(**kwargs)
+
+
+class FakeStreamingTranscriber:
+    """
+    Stands in for AssemblyAIStreamingTranscriber: after every `chunks_per_turn` audio chunks it
+    reports `utterance` as a partial and then as a final transcript.
+    """
+    def __init__(
+        self,
+        on_partial_callback=None,
+        on_final_callback=None,
+        on_vad_callback=None,
+        utterance: str = "Tell me something about the sea",
+        chunks_per_turn: int = 8,
+    ):
+        self.on_partial_callback = on_partial_callback
+        self.on_final_callback = on_final_callback
+        self.utterance = utterance
+        self.chunks_per_turn = chunks_per_turn
+        self.chunks = 0
+        self._tasks: set[asyncio.Task] = set()
+        # Every chunk counts as speech, like the VAD-backed attribute on the real transcriber
+        self.last_speech_at: float | None = None
+
+    async def start(self):
+        pass
+
+    def stream_audio(self, audio_chunk: bytes):
+        self.chunks += 1
+        self.last_speech_at = time.perf_counter()
+        if self.chunks % self.chunks_per_turn == 0:
+            task = asyncio.create_task(self._report(self.utterance))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _report(self, text: str):
+        for callback in (self.on_partial_callback, self.on_final_callback):
+            if callback:
+                result = callback(text)
+                if asyncio.iscoroutine(result):
+                    await result
+
+    async def aclose(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+
+
+# Provider-registry entries (see services/providers.py), selected with e.g. LLM_PROVIDER=fake
+
+class FakeLLMProvider:
+    def create_model(self, model_name: str):
+        return FakeGenerativeModel()
+
+
+class FakeSTTProvider:
+    def create_transcriber(self, **callbacks):
+        return FakeStreamingTranscriber(**callbacks)
+
+    def transcribe(self, audio_bytes: bytes) -> str:
+        return FakeStreamingTranscriber().utterance
+
+    def transcribe_file(self, path: str) -> str:
+        return FakeStreamingTranscriber().utterance
+
+
+class FakeTTSProvider:
+    transport = "rest"
+
+    def __init__(self):
+        self.client = FakeMurfClient()
@@ -0,0 +1,73 @@
+import base64
+import struct
+import time
+
+from fastapi import WebSocket
+
+from services import metrics
+
+# Day 23: Binary audio frames on /api/ws/audio.
+# Clients that connect with `?framing=binary` receive audio as raw websocket binary messages:
+#
+#   | version u8 | type u8 | turn id u16 | sequence u32 | payload ... |   (network byte order)
+#
+# Control messages (transcripts, llm-response, errors) stay JSON text frames in both modes,
+# and clients without the query parameter keep getting base64 JSON audio.
+
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct("!BBHI")
+
+FRAME_AUDIO = 1          # a chunk of audio, part of the current segment
+FRAME_AUDIO_SEGMENT = 2  # a complete, independently decodable segment
+
+FRAMING_JSON = "json"
+FRAMING_BINARY = "binary"
+
+
+def encode_frame(frame_type: int, turn_id: int, sequence: int, payload: bytes) -> bytes:
+    return FRAME_HEADER.pack(FRAME_VERSION, frame_type, turn_id & 0xFFFF, sequence & 0xFFFFFFFF) + payload
+
+
+def decode_frame(frame: bytes) -> tuple[int, int, int, bytes]:
+    version, frame_type, turn_id, sequence = FRAME_HEADER.unpack_from(frame)
+    if version != FRAME_VERSION:
+        raise ValueError(f"Unsupported frame version {version}")
+    return frame_type, turn_id, sequence, frame[FRAME_HEADER.size:]
+
+
+def negotiate_framing(websocket: WebSocket) -> str:
+    return FRAMING_BINARY if websocket.query_params.get("framing") == FRAMING_BINARY else FRAMING_JSON
+
+
+class AudioSender:
+    """Sends audio to one client in the framing mode it negotiated."""
+    def __init__(self, websocket: WebSocket, mode: str = FRAMING_JSON):
+        self.websocket = websocket
+        self.mode = mode
+        self.sequence = 0
+
+    def hello_message(self) -> dict:
+        # Confirms the negotiated mode so clients can fall back if the server is older
+        return {"type": "framing", "mode": self.mode, "version": FRAME_VERSION}
+
+    async def send_hello(self):
+        await self.websocket.send_json(self.hello_message())
+
+    async def send_audio(self, audio: bytes, turn_id: int = 0, partial: bool = False):
+        if not metrics.should_time_send():
+            await self._send_audio(audio, turn_id, partial)
+            return
+        started = time.perf_counter()
+        await self._send_audio(audio, turn_id, partial)
+        metrics.WS_SEND_SECONDS.observe(time.perf_counter() - started)
+
+    async def _send_audio(self, audio: bytes, turn_id: int, partial: bool):
+        self.sequence += 1
+        if self.mode == FRAMING_BINARY:
+            frame_type = FRAME_AUDIO if partial else FRAME_AUDIO_SEGMENT
+            await self.websocket.send_bytes(encode_frame(frame_type, turn_id, self.sequence, audio))
+            return
+        message = {"type": "audio", "b64": base64.b64encode(audio).decode("utf-8")}
+        if partial:
+            message["partial"] = True
+        await self.websocket.send_json(message)
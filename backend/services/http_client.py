@@ -0,0 +1,54 @@
+import importlib.util
+import logging
+
+import httpx
+
+from core.config import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_RETRIES,
+    HTTP2_ENABLED,
+)
+
+# Application-scoped httpx clients, created in the FastAPI lifespan and shared by every
+# service module so REST calls reuse pooled HTTP/2 connections (`h2` comes with httpx[http2]).
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+    if HTTP2_ENABLED and not http2:
+        logging.info("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        # Transport-level retries only cover connection failures, so they are safe for POSTs
+        transport=httpx.AsyncHTTPTransport(http2=http2, limits=limits, retries=HTTP_RETRIES),
+    )
+
+
+def init_http_clients():
+    if "default" not in _clients:
+        _clients["default"] = _build_client()
+
+
+def get_http_client(name: str = "default") -> httpx.AsyncClient:
+    """Shared client for `name`; created on first use when running outside the app lifespan."""
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _build_client()
+        _clients[name] = client
+    return client
+
+
+async def close_http_clients():
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
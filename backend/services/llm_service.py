@@ -1,21 +1,68 @@
 from fastapi import HTTPException
 import logging
-import google.generativeai as genai
-from google.generativeai import types
 
 from dotenv import load_dotenv
 import os
 
+from core.config import GEMINI_API_KEY, require_env
+from services.providers import ensure_provider, get_provider
+
 load_dotenv("../../.env")
 GEMENAI_API_KEY = os.getenv("GEMENAI_API_KEY")
 
-genai.configure(api_key=GEMENAI_API_KEY) # type: ignore
+# One GenerativeModel per model name, built on first use and shared by every request
+_models: dict = {}
+
+# Plain dict so building it does not need the google.generativeai import
+GENERATION_CONFIG = {
+    "candidate_count": 1,
+    "stop_sequences": [],
+    "max_output_tokens": 8192,
+    "temperature": 1.0,
+    "top_p": 0.95,
+    "top_k": 64,
+}
+
+
+class GeminiProvider:
+    """Real LLM provider. google.generativeai is imported (and configured) only when this is built."""
+    def __init__(self):
+        api_key = GEMENAI_API_KEY or GEMINI_API_KEY
+        require_env(GEMINI_API_KEY=api_key)
+        import google.generativeai as genai
+        self.genai = genai
+        genai.configure(api_key=api_key) # type: ignore
+
+    def create_model(self, model_name: str):
+        return self.genai.GenerativeModel(model_name) # type: ignore
+
+
+def get_model(model_name: str):
+    model = _models.get(model_name)
+    if model is None:
+        model = get_provider("llm").create_model(model_name)
+        _models[model_name] = model
+    return model
+
+
+def register_model(model_name: str, model):
+    """Swap the model behind `model_name`, e.g. for the offline fake in services/fakes.py."""
+    _models[model_name] = model
+
+
+def _chunk_text(chunk) -> str:
+    # `chunk.text` raises ValueError when a chunk carries no parts (e.g. a safety stop)
+    try:
+        return chunk.text or ""
+    except ValueError:
+        return ""
+
 
 def ask_gemini(prompt: str, model_name: str = "gemini-2.5-flash"):
     if not prompt:
         raise HTTPException(status_code=400, detail="No prompt provided for Ai query.")
     try:
-        model = genai.GenerativeModel(model_name) # type: ignore
+        model = get_model(model_name)
         response = model.generate_content(prompt)
         return response
     except Exception as e:
@@ -27,35 +74,28 @@ async def stream_llm_response(prompt: str, model_name: str = "gemini-2.5-flash")
     if not prompt:
         raise HTTPException(status_code=400, detail="No prompt provided for Ai query.")
     try:
-        model = genai.GenerativeModel(model_name) # type: ignore
-        response_stream = model.generate_content(prompt, stream=True)
-        if not response_stream:
-            raise HTTPException(status_code=500, detail="Gemini streaming query failed.")
         full_response = ""
-        for chunk in response_stream:
-            if chunk and chunk.text:
-                piece = chunk.text
-                full_response += piece
+        async for piece in stream_llm_response_v2(prompt, model_name):
+            full_response += piece
         print("Full LLM response:", full_response)
         return full_response
     except Exception as e:
         logging.error(f"Gemini streaming query error: {e}")
         raise  
 
-async def stream_llm_response_v2(prompt: str):
-    client = genai.GenerativeModel('gemini-1.5-flash')  # type: ignore
-    stream = client.generate_content(
+async def stream_llm_response_v2(prompt: str, model_name: str = "gemini-1.5-flash"):
+    """
+    Stream Gemini text chunks without blocking the event loop.
+    Cancelling the consuming task cancels the pending read, which aborts the underlying gRPC stream.
+    """
+    await ensure_provider("llm")
+    model = get_model(model_name)
+    stream = await model.generate_content_async(
         contents=prompt,
         stream=True,
-        generation_config=types.GenerationConfig(
-            candidate_count=1,
-            stop_sequences=[],
-            max_output_tokens=8192,
-            temperature=1.0,
-            top_p=0.95,
-            top_k=64
-        ),
+        generation_config=GENERATION_CONFIG,
     )
-    for chunk in stream:
-        if getattr(chunk, "text", None):
-            yield chunk.text
\ No newline at end of file
+    async for chunk in stream:
+        text = _chunk_text(chunk)
+        if text:
+            yield text
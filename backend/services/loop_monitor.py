@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from core.config import LOOP_MONITOR, LOOP_MONITOR_INTERVAL_MS, LOOP_BLOCK_THRESHOLD_MS, LOOP_BLOCK_HISTORY
+from services import metrics
+
+# Event-loop watchdog. A heartbeat task on the loop measures how late each of its sleeps wakes
+# up (loop lag, exported as aanya_event_loop_lag_seconds). A separate thread watches the
+# heartbeat: once the loop has not ticked for LOOP_BLOCK_THRESHOLD_MS it captures the loop
+# thread's stack *while it is still blocked*, and the stall is attributed to the innermost
+# frame of our own code (the site, e.g. "services/llm_service.py:get_llm_response") and to the
+# call it was stuck in (the leaf, e.g. "ssl.py:read"). Sync SDK calls made from async handlers
+# show up here instead of as unexplained latency.
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UNKNOWN_SITE = "unknown"
+
+loop_stats = {
+    "ticks": 0,
+    "lag_max_seconds": 0.0,
+    "blocks": 0,
+    "blocked_seconds": 0.0,
+    "max_block_seconds": 0.0,
+}
+# site -> {"count", "blocked_seconds", "max_seconds", "leaf"}
+block_sites: dict[str, dict] = {}
+recent_blocks: deque[dict] = deque(maxlen=LOOP_BLOCK_HISTORY)
+
+
+def _relative(path: str) -> str:
+    path = os.path.abspath(path)
+    if path.startswith(BACKEND_DIR + os.sep):
+        return os.path.relpath(path, BACKEND_DIR)
+    return os.path.basename(path)
+
+
+def _is_own_code(path: str) -> bool:
+    path = os.path.abspath(path)
+    return path.startswith(BACKEND_DIR + os.sep) and "site-packages" not in path
+
+
+def attribute(frame) -> tuple[str, str, list[str]]:
+    """(site, leaf, formatted stack) for a frame of the blocked loop thread."""
+    stack = traceback.extract_stack(frame)
+    leaf = stack[-1]
+    site = next((entry for entry in reversed(stack) if _is_own_code(entry.filename)), None)
+    return (
+        f"{_relative(site.filename)}:{site.name}" if site else UNKNOWN_SITE,
+        f"{_relative(leaf.filename)}:{leaf.name}",
+        traceback.format_list(stack),
+    )
+
+
+class LoopMonitor:
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._expected = time.monotonic() + interval
+        self._pending: dict | None = None
+        self._captured_for: float | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._loop_thread_id: int | None = None
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._thread:
+            await asyncio.to_thread(self._thread.join)
+
+    async def _heartbeat(self):
+        while True:
+            self._expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self._tick(max(0.0, time.monotonic() - self._expected))
+
+    def _tick(self, lag: float):
+        metrics.EVENT_LOOP_LAG.observe(lag)
+        loop_stats["ticks"] += 1
+        loop_stats["lag_max_seconds"] = max(loop_stats["lag_max_seconds"], lag)
+        with self._lock:
+            capture, self._pending = self._pending, None
+        if capture is None and lag < self.threshold:
+            return
+        if capture is None:
+            # Stalls shorter than the watchdog's polling period can end before a stack is taken
+            capture, seconds = {"site": UNKNOWN_SITE, "leaf": UNKNOWN_SITE, "stack": []}, lag
+        else:
+            # Measured from the tick the watchdog found overdue: a stall before the heartbeat
+            # first ran (e.g. sync work in the lifespan) shows no lag on the tick that follows it
+            seconds = max(lag, time.monotonic() - capture.pop("expected"))
+        self._record(capture, seconds)
+
+    def _record(self, capture: dict, seconds: float):
+        loop_stats["blocks"] += 1
+        loop_stats["blocked_seconds"] += seconds
+        loop_stats["max_block_seconds"] = max(loop_stats["max_block_seconds"], seconds)
+        site = block_sites.setdefault(
+            capture["site"], {"count": 0, "blocked_seconds": 0.0, "max_seconds": 0.0, "leaf": capture["leaf"]}
+        )
+        site["count"] += 1
+        site["blocked_seconds"] += seconds
+        if seconds >= site["max_seconds"]:
+            site["max_seconds"] = seconds
+            site["leaf"] = capture["leaf"]
+        recent_blocks.append({**capture, "seconds": round(seconds, 4), "at": time.time()})
+        logging.warning(
+            f"Event loop blocked for {seconds * 1000:.0f} ms in {capture['site']} (stuck in {capture['leaf']})"
+        )
+
+    def _watch(self):
+        # Poll several times per threshold so a stall is caught while it is still going on
+        while not self._stop.wait(self.threshold / 4):
+            expected = self._expected
+            if time.monotonic() - expected < self.threshold or self._captured_for == expected:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            site, leaf, stack = attribute(frame)
+            del frame
+            with self._lock:
+                self._pending = {"site": site, "leaf": leaf, "stack": stack, "expected": expected}
+                self._captured_for = expected
+
+
+monitor: LoopMonitor | None = None
+
+
+def start_loop_monitor():
+    """Start the watchdog on the running loop (from the app lifespan)."""
+    global monitor
+    if not LOOP_MONITOR or monitor is not None:
+        return
+    monitor = LoopMonitor(LOOP_MONITOR_INTERVAL_MS / 1000, LOOP_BLOCK_THRESHOLD_MS / 1000)
+    monitor.start()
+
+
+async def stop_loop_monitor():
+    global monitor
+    if monitor is not None:
+        await monitor.stop()
+        monitor = None
+
+
+def get_loop_stats() -> dict:
+    return dict(loop_stats)
+
+
+def get_blocking_report() -> dict:
+    """Everything the watchdog knows, worst sites first; served by /api/debug/loop."""
+    sites = sorted(block_sites.items(), key=lambda item: item[1]["blocked_seconds"], reverse=True)
+    return {
+        "enabled": monitor is not None,
+        "threshold_ms": LOOP_BLOCK_THRESHOLD_MS,
+        "stats": get_loop_stats(),
+        "sites": [{"site": name, **values} for name, values in sites],
+        "recent": list(reversed(recent_blocks)),
+    }
+
+
+def render_block_sites() -> list[str]:
+    return metrics.render_labeled(
+        "aanya_event_loop_blocked_seconds_total",
+        f"Time the event loop was blocked for more than {LOOP_BLOCK_THRESHOLD_MS} ms, by code site.",
+        "site",
+        {name: site["blocked_seconds"] for name, site in block_sites.items()},
+    ) + metrics.render_labeled(
+        "aanya_event_loop_blocks_total",
+        f"Event-loop stalls longer than {LOOP_BLOCK_THRESHOLD_MS} ms, by code site.",
+        "site",
+        {name: site["count"] for name, site in block_sites.items()},
+    )
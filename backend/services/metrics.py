@@ -0,0 +1,137 @@
+import bisect
+import math
+
+from core.config import METRICS_MODE, METRICS_SEND_SAMPLE
+
+# Pipeline latency histograms, rendered in the Prometheus text format on /api/metrics.
+# Observing is a bisect and three additions on the event loop thread, no locks or allocation.
+# Values are per worker process: with several uvicorn workers each scrape sees one of them.
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+SEND_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+RATE_BUCKETS = (5, 10, 20, 40, 80, 160, 320, 640, 1280)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        if not enabled:
+            return
+        # bisect_left finds the first bucket whose upper bound (le) is >= value
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+enabled = METRICS_MODE != "off"
+_send_counter = 0
+
+STT_FINAL_LATENCY = Histogram(
+    "aanya_stt_final_latency_seconds",
+    "End of user speech (local VAD) to the final transcript from AssemblyAI.",
+    LATENCY_BUCKETS,
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "aanya_llm_time_to_first_token_seconds",
+    "Start of the LLM stream to its first text chunk.",
+    LATENCY_BUCKETS,
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "aanya_llm_tokens_per_second",
+    "Estimated LLM output tokens per second after the first token.",
+    RATE_BUCKETS,
+)
+TTS_TIME_TO_FIRST_BYTE = Histogram(
+    "aanya_tts_time_to_first_byte_seconds",
+    "Per segment: synthesis request to the first audio chunk (cache hits included).",
+    LATENCY_BUCKETS,
+)
+WS_SEND_SECONDS = Histogram(
+    "aanya_ws_send_seconds",
+    "Time to hand one audio message to the WebSocket (sampled in low mode).",
+    SEND_BUCKETS,
+)
+VOICE_TO_VOICE_LATENCY = Histogram(
+    "aanya_voice_to_voice_latency_seconds",
+    "End of user speech (local VAD) to the first audio of the answer sent to the client.",
+    LATENCY_BUCKETS,
+)
+EVENT_LOOP_LAG = Histogram(
+    "aanya_event_loop_lag_seconds",
+    "How late the event loop woke the watchdog's heartbeat (time other callbacks held the loop).",
+    LAG_BUCKETS,
+)
+
+HISTOGRAMS = (
+    STT_FINAL_LATENCY,
+    LLM_TIME_TO_FIRST_TOKEN,
+    LLM_TOKENS_PER_SECOND,
+    TTS_TIME_TO_FIRST_BYTE,
+    WS_SEND_SECONDS,
+    VOICE_TO_VOICE_LATENCY,
+    EVENT_LOOP_LAG,
+)
+
+
+def should_time_send() -> bool:
+    """Every send in "full" mode, one in METRICS_SEND_SAMPLE in "low" mode."""
+    global _send_counter
+    if METRICS_MODE == "full":
+        return True
+    if not enabled:
+        return False
+    _send_counter += 1
+    return _send_counter % METRICS_SEND_SAMPLE == 0
+
+
+def render_stats(prefix: str, stats: dict) -> list[str]:
+    """Numeric entries of a service's stats dict as untyped samples, e.g. aanya_tts_cache_hits."""
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)) and math.isfinite(value):
+            lines.append(f"aanya_{prefix}_{key} {value}")
+    return lines
+
+
+def render_labeled(name: str, help: str, label: str, values: dict[str, float], type: str = "counter") -> list[str]:
+    """One sample per label value, e.g. aanya_event_loop_blocks_total{site="main.py:get_voices"} 3."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+    for key, value in values.items():
+        escaped = key.replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'{name}{{{label}="{escaped}"}} {value}')
+    return lines
+
+
+def render_gauge(name: str, help: str, value: float) -> list[str]:
+    return [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value}"]
+
+
+def render_metrics(stats: dict[str, dict] | None = None, extra: list[str] | None = None) -> str:
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    lines.extend(extra or ())
+    for prefix, values in (stats or {}).items():
+        lines.extend(render_stats(prefix, values))
+    return "\n".join(lines) + "\n"
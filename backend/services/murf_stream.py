@@ -0,0 +1,226 @@
+import asyncio
+import base64
+import itertools
+import json
+import logging
+import time
+from typing import AsyncIterator
+
+
+# Day 22: Warm, reusable Murf streaming connections.
+# Opening a websocket (TCP + TLS + voice config) per utterance dominated time-to-first-audio
+# for short sentences, so connections are pooled and reused across segments and sessions.
+
+
+class MurfConnectionError(Exception):
+    """Raised when no healthy Murf streaming connection could be (re)established."""
+
+
+_voice_config_cache: dict[tuple, str] = {}
+
+
+def voice_config_message(voice_id: str, style: str = "Conversational") -> str:
+    """Serialized voice_config payload, built once per (voice, style)."""
+    key = (voice_id, style)
+    message = _voice_config_cache.get(key)
+    if message is None:
+        message = json.dumps({
+            "voice_config": {
+                "voiceId": voice_id,
+                "style": style,
+                "rate": 0,
+                "pitch": 0,
+                "variation": 1
+            }
+        })
+        _voice_config_cache[key] = message
+    return message
+
+
+class MurfStreamConnection:
+    """One websocket to Murf. Used by a single context at a time."""
+    def __init__(self, url: str, ping_interval: float):
+        self.url = url
+        self.ping_interval = ping_interval
+        self.ws = None
+        self.voice_key: tuple | None = None
+        self.last_used = 0.0
+        self.lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.ws is not None and self.ws.close_code is None
+
+    async def connect(self):
+        import websockets  # deferred: only needed once a connection is opened
+        self.ws = await websockets.connect(self.url, ping_interval=self.ping_interval)
+        # Voice config is per connection, so a fresh socket needs it sent again
+        self.voice_key = None
+        self.last_used = time.monotonic()
+
+    async def is_healthy(self, timeout: float) -> bool:
+        if not self.is_open:
+            return False
+        try:
+            pong = await self.ws.ping()
+            await asyncio.wait_for(pong, timeout)
+            return True
+        except Exception:
+            return False
+
+    async def close(self):
+        if self.ws is not None:
+            try:
+                await self.ws.close()
+            except Exception:
+                pass
+        self.ws = None
+        self.voice_key = None
+
+
+class MurfStreamPool:
+    """
+    Fixed-size pool of warm Murf streaming connections:
+        - connections are opened lazily and kept alive with websocket pings
+        - voice config is only re-sent when a connection switches voice
+        - each synthesis runs in its own context id, scoped to the caller's session
+        - idle connections are health-checked before reuse and reconnected with backoff
+        - every receive has a timeout, so a context Murf never finishes can't hold a connection
+        - a reused socket found dead before any audio came back is replaced and the segment retried once
+    """
+    def __init__(
+        self,
+        url: str,
+        size: int = 4,
+        idle_check_after: float = 15.0,
+        health_timeout: float = 2.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.25,
+        ping_interval: float = 20.0,
+        receive_timeout: float = 10.0,
+    ):
+        self.url = url
+        self.idle_check_after = idle_check_after
+        self.health_timeout = health_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.receive_timeout = receive_timeout
+        self.connections = [MurfStreamConnection(url, ping_interval) for _ in range(size)]
+        self._available = asyncio.Semaphore(size)
+        self._context_seq = itertools.count(1)
+        self.stats = {
+            "connects": 0,
+            "reconnects": 0,
+            "reused": 0,
+            "voice_configs_sent": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "errors": 0,
+        }
+
+    async def _ensure_ready(self, conn: MurfStreamConnection):
+        idle = time.monotonic() - conn.last_used
+        if conn.is_open and (idle < self.idle_check_after or await conn.is_healthy(self.health_timeout)):
+            self.stats["reused"] += 1
+            return
+        reconnecting = conn.ws is not None
+        await conn.close()
+        for attempt in range(self.max_retries):
+            try:
+                await conn.connect()
+                self.stats["reconnects" if reconnecting else "connects"] += 1
+                return
+            except Exception as e:
+                delay = self.backoff_base * (2 ** attempt)
+                logging.warning(f"Murf stream connect failed ({e}); retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        raise MurfConnectionError(f"Could not connect to Murf after {self.max_retries} attempts")
+
+    async def _acquire(self, voice_key: tuple) -> MurfStreamConnection:
+        await self._available.acquire()
+        # Prefer a free connection already configured for this voice, then any free one
+        free = [conn for conn in self.connections if not conn.lock.locked()]
+        free.sort(key=lambda conn: (conn.voice_key != voice_key, not conn.is_open))
+        conn = free[0]
+        await conn.lock.acquire()
+        return conn
+
+    def _release(self, conn: MurfStreamConnection):
+        conn.last_used = time.monotonic()
+        conn.lock.release()
+        self._available.release()
+
+    async def _receive(self, conn: MurfStreamConnection) -> str | bytes:
+        try:
+            async with asyncio.timeout(self.receive_timeout):
+                return await conn.ws.recv()
+        except TimeoutError:
+            self.stats["timeouts"] += 1
+            raise MurfConnectionError(f"No message from Murf in {self.receive_timeout:g}s") from None
+
+    async def synthesize(
+        self,
+        text: str,
+        voice_id: str,
+        context_id: str,
+        style: str = "Conversational",
+    ) -> AsyncIterator[bytes]:
+        """Stream decoded audio chunks for `text` over a pooled connection."""
+        from websockets.exceptions import ConnectionClosed
+
+        voice_key = (voice_id, style)
+        for attempt in range(2):
+            conn = await self._acquire(voice_key)
+            completed = False
+            yielded = False
+            try:
+                await self._ensure_ready(conn)
+                if conn.voice_key != voice_key:
+                    await conn.ws.send(voice_config_message(voice_id, style))
+                    conn.voice_key = voice_key
+                    self.stats["voice_configs_sent"] += 1
+
+                segment_context = f"{context_id}-{next(self._context_seq)}"
+                await conn.ws.send(json.dumps({"context_id": segment_context, "text": text, "end": True}))
+                while not completed:
+                    message = await self._receive(conn)
+                    try:
+                        response = json.loads(message)
+                    except Exception as e:
+                        logging.error(f"Error parsing Murf response: {e}")
+                        continue
+                    if response.get("context_id", segment_context) != segment_context:
+                        continue
+                    if response.get("error") or response.get("status") == "error":
+                        self.stats["errors"] += 1
+                        raise MurfConnectionError(f"Murf stream error: {response.get('error') or response}")
+                    if response.get("audio"):
+                        yielded = True
+                        yield base64.b64decode(response["audio"])
+                    completed = bool(response.get("final") or response.get("status") == "done")
+                return
+            except ConnectionClosed as e:
+                # A socket that died while idle: replace it and retry, unless audio already went out
+                if yielded or attempt:
+                    raise MurfConnectionError(f"Murf stream closed before the segment finished: {e}") from e
+                self.stats["retries"] += 1
+                logging.info(f"Murf stream connection was closed ({e}); retrying on a fresh one")
+            finally:
+                if not completed:
+                    # An abandoned context would leave stray audio on the socket; start clean next time
+                    await conn.close()
+                self._release(conn)
+
+    async def warm_up(self, count: int = 1):
+        """Open `count` connections ahead of the first request."""
+        for conn in self.connections[:count]:
+            await self._available.acquire()
+            try:
+                async with conn.lock:
+                    await self._ensure_ready(conn)
+            finally:
+                self._available.release()
+
+    async def close(self):
+        for conn in self.connections:
+            await conn.close()
@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from fastapi import WebSocket
+
+from core.config import WS_CONTROL_QUEUE_SIZE, WS_AUDIO_QUEUE_BYTES, WS_SEND_POLICY, WS_COALESCE_BYTES
+from services import metrics
+from services.framing import AudioSender
+
+# Outbound side of /api/ws/audio. Every message for a client goes through its scheduler
+# instead of straight to the socket, and one writer task per connection does the sending:
+#
+#   - control messages (transcripts, llm-response, turn-cancelled, ...) go out before queued audio
+#   - audio waits in a queue bounded in bytes; once it is full, "block" makes the producer (the
+#     TTS worker, and through its bounded segment queue the LLM) wait for the client, "drop"
+#     discards the oldest queued audio so the client stays current
+#   - streaming chunks of the same turn that piled up behind a slow client are merged into
+#     one write; nothing is held back to wait for more, so a fast client sees no extra latency
+#   - a cancelled turn's queued audio is flushed rather than played after the interruption
+
+POLICY_BLOCK = "block"
+POLICY_DROP = "drop"
+
+# Process-wide totals; per-session counters live on each scheduler
+outbound_stats = {
+    "sessions": 0,
+    "writes": 0,
+    "audio_frames": 0,
+    "coalesced_frames": 0,
+    "dropped_frames": 0,
+    "dropped_bytes": 0,
+    "flushed_frames": 0,
+    "blocked_seconds": 0.0,
+    "max_queued_bytes": 0,
+}
+
+# session id -> scheduler, for the per-session metrics
+schedulers: dict[str, "OutboundScheduler"] = {}
+
+
+class OutboundClosed(ConnectionError):
+    """The client went away; nothing more can be sent on this connection."""
+
+
+class OutboundScheduler:
+    def __init__(
+        self,
+        websocket: WebSocket,
+        audio_sender: AudioSender,
+        session_id: str,
+        policy: str = WS_SEND_POLICY,
+        max_audio_bytes: int = WS_AUDIO_QUEUE_BYTES,
+        max_control: int = WS_CONTROL_QUEUE_SIZE,
+        coalesce_bytes: int = WS_COALESCE_BYTES,
+    ):
+        self.websocket = websocket
+        self.audio_sender = audio_sender
+        self.session_id = session_id
+        self.policy = POLICY_DROP if policy == POLICY_DROP else POLICY_BLOCK
+        self.max_audio_bytes = max_audio_bytes
+        self.max_control = max(1, max_control)
+        self.coalesce_bytes = coalesce_bytes
+        self._control: deque[dict] = deque()
+        # (payload, turn id, partial, mergeable)
+        self._audio: deque[tuple[bytes, int, bool, bool]] = deque()
+        self._audio_bytes = 0
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._error: Exception | None = None
+        self._task: asyncio.Task | None = None
+        self._writing = False
+        self.stats = {
+            "queued_audio_bytes": 0,
+            "queued_audio_frames": 0,
+            "queued_control": 0,
+            "max_queued_bytes": 0,
+            "writes": 0,
+            "audio_frames": 0,
+            "coalesced_frames": 0,
+            "dropped_frames": 0,
+            "dropped_bytes": 0,
+            "flushed_frames": 0,
+            "blocked_seconds": 0.0,
+        }
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+        schedulers[self.session_id] = self
+        outbound_stats["sessions"] += 1
+
+    async def close(self):
+        if schedulers.get(self.session_id) is self:
+            del schedulers[self.session_id]
+        self._fail(OutboundClosed("connection closed"))
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def drain(self, timeout: float = 2.0):
+        """Wait (up to `timeout`) until everything queued has been written, e.g. before closing."""
+        try:
+            async with asyncio.timeout(timeout):
+                while (self._control or self._audio or self._writing) and self._error is None:
+                    self._space.clear()
+                    await self._space.wait()
+        except TimeoutError:
+            logging.info(f"Outbound queue for session {self.session_id} not drained in {timeout:g}s")
+
+    async def send_json(self, message: dict):
+        """Queue a control message; only waits if the client has fallen far behind."""
+        self._check_open()
+        while len(self._control) >= self.max_control:
+            await self._wait_for_space()
+        self._control.append(message)
+        self._update_depth()
+        self._wakeup.set()
+
+    async def send_audio(self, audio: bytes, turn_id: int = 0, partial: bool = False, mergeable: bool = True):
+        """
+        Queue audio for the client. `mergeable` chunks are a byte stream (raw PCM, or a WAV
+        stream whose header came in the first chunk) and may be written together; pass False
+        when every message must stay decodable on its own.
+        """
+        self._check_open()
+        self.stats["audio_frames"] += 1
+        outbound_stats["audio_frames"] += 1
+        while self._audio and self._audio_bytes + len(audio) > self.max_audio_bytes:
+            if self.policy == POLICY_DROP:
+                dropped = self._pop_audio()
+                self._count("dropped_frames", 1)
+                self._count("dropped_bytes", len(dropped[0]))
+            else:
+                await self._wait_for_space()
+        self._audio.append((audio, turn_id, partial, mergeable))
+        self._audio_bytes += len(audio)
+        self._update_depth()
+        self._wakeup.set()
+
+    def flush_turn(self, turn_id: int) -> int:
+        """Discard the queued audio of a cancelled turn; returns how many frames were dropped."""
+        kept = deque(frame for frame in self._audio if frame[1] != turn_id)
+        flushed = len(self._audio) - len(kept)
+        if flushed:
+            self._audio = kept
+            self._audio_bytes = sum(len(frame[0]) for frame in kept)
+            self._count("flushed_frames", flushed)
+            self._update_depth()
+            self._space.set()
+        return flushed
+
+    def _check_open(self):
+        if self._error is not None:
+            raise OutboundClosed(f"Cannot send to client: {self._error}")
+
+    async def _wait_for_space(self):
+        started = time.perf_counter()
+        self._space.clear()
+        await self._space.wait()
+        self._count("blocked_seconds", time.perf_counter() - started)
+        self._check_open()
+
+    def _fail(self, error: Exception):
+        if self._error is None:
+            self._error = error
+        # Wake producers waiting for space, so they see the error instead of hanging
+        self._space.set()
+
+    def _count(self, key: str, value: float):
+        self.stats[key] += value
+        outbound_stats[key] += value
+
+    def _update_depth(self):
+        self.stats["queued_audio_bytes"] = self._audio_bytes
+        self.stats["queued_audio_frames"] = len(self._audio)
+        self.stats["queued_control"] = len(self._control)
+        if self._audio_bytes > self.stats["max_queued_bytes"]:
+            self.stats["max_queued_bytes"] = self._audio_bytes
+            outbound_stats["max_queued_bytes"] = max(outbound_stats["max_queued_bytes"], self._audio_bytes)
+
+    def _pop_audio(self) -> tuple[bytes, int, bool, bool]:
+        frame = self._audio.popleft()
+        self._audio_bytes -= len(frame[0])
+        return frame
+
+    def _next_audio(self) -> tuple[bytes, int, bool]:
+        payload, turn_id, partial, mergeable = self._pop_audio()
+        if not (partial and mergeable):
+            return payload, turn_id, partial
+        parts, size = [payload], len(payload)
+        while self._audio:
+            next_payload, next_turn, next_partial, next_mergeable = self._audio[0]
+            if not (next_partial and next_mergeable and next_turn == turn_id):
+                break
+            if size + len(next_payload) > self.coalesce_bytes:
+                break
+            self._pop_audio()
+            parts.append(next_payload)
+            size += len(next_payload)
+        if len(parts) > 1:
+            self._count("coalesced_frames", len(parts) - 1)
+            payload = b"".join(parts)
+        return payload, turn_id, partial
+
+    async def _run(self):
+        try:
+            while True:
+                if not self._control and not self._audio:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                # Control first: a transcript or turn-cancelled never waits behind seconds of audio
+                self._writing = True
+                if self._control:
+                    message = self._control.popleft()
+                    self._update_depth()
+                    self._space.set()
+                    await self.websocket.send_json(message)
+                else:
+                    payload, turn_id, partial = self._next_audio()
+                    self._update_depth()
+                    self._space.set()
+                    await self.audio_sender.send_audio(payload, turn_id, partial=partial)
+                self._writing = False
+                self._count("writes", 1)
+                # For drain(); producers waiting for space just re-check
+                self._space.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.info(f"Outbound writer for session {self.session_id} stopped: {e}")
+            self._fail(e)
+
+
+def get_outbound_stats() -> dict:
+    return {**outbound_stats, "active_sessions": len(schedulers)}
+
+
+def get_session_stats() -> dict[str, dict]:
+    """Live per-session counters, e.g. for /api/debug/outbound."""
+    return {session_id: dict(scheduler.stats) for session_id, scheduler in schedulers.items()}
+
+
+def render_queue_metrics() -> list[str]:
+    """
+    Queue depth across the live connections, for /api/metrics. Aggregates only: a series per
+    session would grow without bound; per-session detail is on /api/debug/outbound.
+    """
+    sessions = get_session_stats().values()
+    return metrics.render_gauge(
+        "aanya_ws_queued_audio_bytes",
+        "Audio bytes waiting to be written to clients, all connections.",
+        sum(stats["queued_audio_bytes"] for stats in sessions),
+    ) + metrics.render_gauge(
+        "aanya_ws_queued_control_messages",
+        "Control messages waiting to be written to clients, all connections.",
+        sum(stats["queued_control"] for stats in sessions),
+    ) + metrics.render_gauge(
+        "aanya_ws_max_session_queued_audio_bytes",
+        "Audio bytes queued for the connection furthest behind.",
+        max((stats["queued_audio_bytes"] for stats in sessions), default=0),
+    )
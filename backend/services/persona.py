@@ -1,5 +1,9 @@
+from collections import deque
 from enum import Enum
+import json
+import logging
 import services.tts_service as tts
+from core.config import PROMPT_HISTORY_TOKENS, PERSONAS_FILE, DEFAULT_PERSONA
 
 class PersonaType(Enum):
     DEFAULT = {
@@ -93,19 +97,148 @@ class PersonaType(Enum):
 
 
 
-def build_persona(history: list, persona: PersonaType  = PersonaType.DEFAULT) -> dict[str, str]:
-    messages = [
-        ("User: " + msg["content"] if msg["role"] == "User" else "Aanya: " + msg["content"])
-        for msg in history
-    ]
-    chat_history_text = "\n".join(messages)
-    final_prompt = (
-        f"{persona.value['prompt']}\n"
-        f"{"\n".join(persona.value['skills'])}\n"
-        f"{chat_history_text}\n"
-        "Please answer in a concise manner and less than 2800 characters. Keep formatting easy, no points, all in a simple paragraph for Murf Ai conversion."
-    )
-    return {
-        "prompt": final_prompt,
-        "voiceId": persona.value["voiceId"]
-    }
\ No newline at end of file
+RESPONSE_INSTRUCTION = "Please answer in a concise manner and less than 2800 characters. Keep formatting easy, no points, all in a simple paragraph for Murf Ai conversion."
+
+
+class Persona:
+    """A registered persona. Its prompt + skills prefix is rendered once, at registration."""
+    def __init__(self, name: str, voice_id: str, prompt: str, skills: list[str] | None = None):
+        self.name = name
+        self.voice_id = voice_id
+        self.prompt = prompt
+        self.skills = list(skills or [])
+        self.prefix = f"{prompt}\n{"\n".join(self.skills)}"
+
+    def describe(self) -> dict:
+        return {"name": self.name, "voiceId": self.voice_id}
+
+
+# name -> Persona: the PersonaType built-ins, then PERSONAS_FILE on top
+personas: dict[str, Persona] = {}
+
+
+def register_persona(name: str, voice_id: str, prompt: str, skills: list[str] | None = None) -> Persona:
+    persona = Persona(name.lower(), voice_id, prompt, skills)
+    personas[persona.name] = persona
+    return persona
+
+
+def load_personas(path: str):
+    """Register the personas in a JSON file (a list of {"name", "voiceId", "prompt", "skills"})."""
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    for entry in entries:
+        register_persona(entry["name"], entry.get("voiceId") or tts.default_voice, entry["prompt"], entry.get("skills"))
+    logging.info(f"Loaded {len(entries)} personas from {path}")
+
+
+def get_persona(persona: "str | PersonaType | Persona | None" = None) -> Persona:
+    """Look up a persona by name (case-insensitive) or PersonaType; None is DEFAULT_PERSONA."""
+    if isinstance(persona, Persona):
+        return persona
+    if isinstance(persona, PersonaType):
+        persona = persona.name
+    name = (persona or DEFAULT_PERSONA).lower()
+    if name not in personas:
+        raise ValueError(f"Unknown persona: {name}")
+    return personas[name]
+
+
+def list_personas() -> list[dict]:
+    return [persona.describe() for persona in personas.values()]
+
+
+def persona_prefix(persona: "PersonaType | Persona | str") -> str:
+    return get_persona(persona).prefix
+
+
+for _member in PersonaType:
+    register_persona(_member.name, _member.value["voiceId"], _member.value["prompt"], _member.value["skills"])
+if PERSONAS_FILE:
+    load_personas(PERSONAS_FILE)
+# Fail at startup rather than on the first connection
+get_persona(DEFAULT_PERSONA)
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough English average for Gemini tokenization; good enough for budgeting
+    return len(text) // 4 + 1
+
+
+def render_message(msg: dict) -> str:
+    return "User: " + msg["content"] if msg["role"] == "User" else "Aanya: " + msg["content"]
+
+
+class PromptBuilder:
+    """
+    Incremental prompt for one conversation. Turns are rendered once when added, and only
+    the most recent turns that fit `max_history_tokens` are kept, so building a prompt
+    costs the same at turn 10 and turn 10,000.
+    """
+    def __init__(self, persona: PersonaType | Persona | str = PersonaType.DEFAULT, max_history_tokens: int = PROMPT_HISTORY_TOKENS):
+        self.persona = get_persona(persona)
+        self.max_history_tokens = max_history_tokens
+        self._lines: deque[tuple[str, int]] = deque()
+        self._tokens = 0
+        self.dropped_turns = 0
+        # Bumped on every turn, so callers can tell whether a prompt they built is still current
+        self.revision = 0
+
+    def add_turn(self, msg: dict):
+        line = render_message(msg)
+        tokens = estimate_tokens(line)
+        self._lines.append((line, tokens))
+        self._tokens += tokens
+        self.revision += 1
+        # Window out the oldest turns, but always keep the newest one
+        while self._tokens > self.max_history_tokens and len(self._lines) > 1:
+            _, old_tokens = self._lines.popleft()
+            self._tokens -= old_tokens
+            self.dropped_turns += 1
+
+    def set_persona(self, persona: PersonaType | Persona | str):
+        """Switch persona mid-conversation; the history is kept, prompts built before are stale."""
+        self.persona = get_persona(persona)
+        self.revision += 1
+
+    def extend(self, history: list):
+        for msg in history:
+            self.add_turn(msg)
+
+    def preview(self, msg: dict) -> dict[str, str]:
+        """The prompt `build()` would return after `add_turn(msg)`, leaving this builder untouched."""
+        fork = PromptBuilder(self.persona, self.max_history_tokens)
+        fork._lines = deque(self._lines)
+        fork._tokens = self._tokens
+        fork.dropped_turns = self.dropped_turns
+        fork.add_turn(msg)
+        return fork.build()
+
+    def build(self) -> dict[str, str]:
+        chat_history_text = "\n".join(line for line, _ in self._lines)
+        if self.dropped_turns:
+            chat_history_text = f"(Earlier parts of this conversation were omitted.)\n{chat_history_text}"
+        final_prompt = (
+            f"{self.persona.prefix}\n"
+            f"{chat_history_text}\n"
+            f"{RESPONSE_INSTRUCTION}"
+        )
+        return {
+            "prompt": final_prompt,
+            "voiceId": self.persona.voice_id
+        }
+
+
+def build_persona(history: list, persona: PersonaType | Persona | str = PersonaType.DEFAULT) -> dict[str, str]:
+    builder = PromptBuilder(persona)
+    # Only the tail can fit the budget, so walk back from the newest message
+    start, used = len(history), 0
+    while start > 0:
+        tokens = estimate_tokens(render_message(history[start - 1]))
+        if used + tokens > builder.max_history_tokens and start < len(history):
+            break
+        used += tokens
+        start -= 1
+    builder.dropped_turns = start
+    builder.extend(history[start:])
+    return builder.build()
@@ -0,0 +1,121 @@
+import asyncio
+import importlib
+import logging
+import threading
+import time
+
+from core.config import LLM_PROVIDER, STT_PROVIDER, TTS_PROVIDER
+
+# Registry of external-service implementations. Each kind ("llm", "stt", "tts") has a real
+# provider and an offline fake; the one named in config is imported and built on first use
+# (or by `init_providers()` from the app lifespan), so importing the app stays cheap.
+#
+#     LLM_PROVIDER=fake STT_PROVIDER=fake TTS_PROVIDER=fake python main.py
+
+# kind -> provider name -> "module:attribute" of a zero-argument factory
+PROVIDERS: dict[str, dict[str, str]] = {
+    "llm": {
+        "gemini": "services.llm_service:GeminiProvider",
+        "fake": "services.fakes:FakeLLMProvider",
+    },
+    "stt": {
+        "assemblyai": "services.stt_service:AssemblyAIProvider",
+        "fake": "services.fakes:FakeSTTProvider",
+    },
+    "tts": {
+        "murf": "services.tts_service:MurfProvider",
+        "fake": "services.fakes:FakeTTSProvider",
+    },
+}
+
+CONFIGURED = {"llm": LLM_PROVIDER, "stt": STT_PROVIDER, "tts": TTS_PROVIDER}
+
+_instances: dict[str, object] = {}
+# One lock per kind, so building one provider (seconds of SDK imports) never holds up another
+_locks: dict[str, threading.Lock] = {}
+_lock = threading.Lock()
+
+# kind -> {"name", "init_seconds"} for every provider built so far
+provider_metrics: dict[str, dict] = {}
+
+
+def register_provider(kind: str, name: str, target: str):
+    """Add an implementation, e.g. register_provider("tts", "local", "mypkg.tts:LocalProvider")."""
+    PROVIDERS.setdefault(kind, {})[name] = target
+
+
+def use_provider(kind: str, name: str):
+    """Select another implementation; takes effect the next time the provider is built."""
+    if name not in PROVIDERS[kind]:
+        raise ValueError(f"Unknown {kind} provider {name!r}; known: {', '.join(PROVIDERS[kind])}")
+    with _kind_lock(kind):
+        CONFIGURED[kind] = name
+        _instances.pop(kind, None)
+
+
+def _kind_lock(kind: str) -> threading.Lock:
+    with _lock:
+        return _locks.setdefault(kind, threading.Lock())
+
+
+def get_provider(kind: str):
+    """The provider for `kind`, built on first use. Blocks while it builds; use `ensure_provider` on the loop."""
+    provider = _instances.get(kind)
+    if provider is not None:
+        return provider
+    with _kind_lock(kind):
+        provider = _instances.get(kind)
+        if provider is None:
+            name = CONFIGURED[kind]
+            try:
+                target = PROVIDERS[kind][name]
+            except KeyError:
+                raise RuntimeError(f"Unknown {kind} provider {name!r}; known: {', '.join(PROVIDERS[kind])}")
+            started = time.perf_counter()
+            module_name, attribute = target.split(":")
+            provider = getattr(importlib.import_module(module_name), attribute)()
+            elapsed = time.perf_counter() - started
+            provider_metrics[kind] = {"name": name, "init_seconds": round(elapsed, 4)}
+            logging.info(f"{kind} provider {name!r} ready in {elapsed:.3f}s")
+            _instances[kind] = provider
+    return provider
+
+
+async def ensure_provider(kind: str):
+    """`get_provider` for async code: a build (or waiting for the warm-up's) runs in a worker thread."""
+    provider = _instances.get(kind)
+    if provider is not None:
+        return provider
+    return await asyncio.to_thread(get_provider, kind)
+
+
+async def init_providers(kinds=("llm", "stt", "tts")) -> dict[str, str]:
+    """
+    Import and build the configured providers in a worker thread, off the event loop.
+    Returns the error for each kind that failed (e.g. a missing API key).
+    """
+    errors = {}
+    for kind in kinds:
+        try:
+            await ensure_provider(kind)
+        except Exception as e:
+            logging.error(f"{kind} provider failed to initialize: {e}")
+            errors[kind] = str(e)
+    return errors
+
+
+async def close_providers():
+    for kind, provider in list(_instances.items()):
+        close = getattr(provider, "close", None)
+        if close is not None:
+            try:
+                result = close()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logging.info(f"Closing {kind} provider failed: {e}")
+    _instances.clear()
+
+
+def get_provider_metrics() -> dict:
+    return {kind: dict(metrics) for kind, metrics in provider_metrics.items()}
@@ -0,0 +1,231 @@
+import asyncio
+import re
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+
+from core.config import (
+    SESSION_BACKEND,
+    SESSION_DB_PATH,
+    SESSION_TIMEOUT,
+    SESSION_MAX_SESSIONS,
+    SESSION_MAX_MESSAGES,
+    SESSION_MAX_BYTES,
+)
+
+# Chat history per session. Every store expires idle sessions after `ttl` seconds, caps the
+# number of sessions and the messages kept per session, and accounts for the bytes it holds.
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def resolve_session_id(requested: str | None) -> str:
+    """Use a well-formed client-supplied id (for reconnects), otherwise mint a new one."""
+    if requested and _SESSION_ID.match(requested):
+        return requested
+    return uuid.uuid4().hex
+
+
+def message_size(message: dict) -> int:
+    return len(message["role"]) + len(message["content"].encode("utf-8"))
+
+
+class SessionStore(ABC):
+    def __init__(self, ttl: float, max_sessions: int, max_messages: int):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+
+    @abstractmethod
+    async def get_history(self, session_id: str) -> list[dict]:
+        """Messages of a session, oldest first. Unknown or expired sessions are empty."""
+
+    @abstractmethod
+    async def append(self, session_id: str, *messages: dict):
+        """Append messages ({"role", "content"}) and refresh the session's TTL."""
+
+    @abstractmethod
+    async def delete(self, session_id: str):
+        ...
+
+    @abstractmethod
+    async def stats(self) -> dict:
+        ...
+
+    async def close(self):
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store. LRU-evicts whole sessions past `max_sessions` or `max_bytes`."""
+    def __init__(self, ttl: float, max_sessions: int, max_messages: int, max_bytes: int):
+        super().__init__(ttl, max_sessions, max_messages)
+        self.max_bytes = max_bytes
+        # session id -> (last access, messages, bytes)
+        self._sessions: OrderedDict[str, tuple[float, list[dict], int]] = OrderedDict()
+        self._bytes = 0
+        self._expired = 0
+        self._evicted = 0
+        self._last_purge = time.monotonic()
+
+    def _purge_expired(self, now: float):
+        # Sessions are kept in access order, so expired ones are at the front
+        while self._sessions:
+            session_id, (last_access, _, size) = next(iter(self._sessions.items()))
+            if now - last_access < self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            self._bytes -= size
+            self._expired += 1
+        self._last_purge = now
+
+    async def get_history(self, session_id: str) -> list[dict]:
+        now = time.monotonic()
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return []
+        last_access, messages, size = entry
+        if now - last_access >= self.ttl:
+            await self.delete(session_id)
+            self._expired += 1
+            return []
+        return list(messages)
+
+    async def append(self, session_id: str, *messages: dict):
+        now = time.monotonic()
+        if now - self._last_purge > 60:
+            self._purge_expired(now)
+        _, history, old_size = self._sessions.pop(session_id, (now, [], 0))
+        size = old_size
+        for message in messages:
+            history.append(message)
+            size += message_size(message)
+        if len(history) > self.max_messages:
+            dropped = len(history) - self.max_messages
+            size -= sum(message_size(message) for message in history[:dropped])
+            del history[:dropped]
+        self._bytes += size - old_size
+        # Re-inserting moves the session to the most-recently-used end
+        self._sessions[session_id] = (now, history, size)
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            evicted_id, (_, _, evicted_size) = self._sessions.popitem(last=False)
+            self._bytes -= evicted_size
+            self._evicted += 1
+            if evicted_id == session_id:
+                break
+
+    async def delete(self, session_id: str):
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    async def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "sessions": len(self._sessions),
+            "bytes": self._bytes,
+            "expired": self._expired,
+            "evicted": self._evicted,
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Shared store in a local SQLite file, so every uvicorn worker on the host sees the same
+    sessions. Queries run in a worker thread to keep the event loop free.
+    """
+    def __init__(self, path: Path, ttl: float, max_sessions: int, max_messages: int):
+        super().__init__(ttl, max_sessions, max_messages)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_session ON messages(session_id, seq);
+            CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions(last_access);
+        """)
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._lock = asyncio.Lock()
+        self._last_purge = 0.0
+
+    async def _run(self, fn, *args):
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    def _get_history(self, session_id: str) -> list[dict]:
+        row = self._db.execute("SELECT last_access FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return []
+        if time.time() - row[0] >= self.ttl:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            return []
+        rows = self._db.execute(
+            "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def _append(self, session_id: str, messages: tuple):
+        now = time.time()
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute(
+                "INSERT INTO sessions (id, last_access) VALUES (?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET last_access = excluded.last_access",
+                (session_id, now),
+            )
+            self._db.executemany(
+                "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+                [(session_id, m["role"], m["content"]) for m in messages],
+            )
+            self._db.execute(
+                "DELETE FROM messages WHERE session_id = ? AND seq NOT IN "
+                "(SELECT seq FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?)",
+                (session_id, session_id, self.max_messages),
+            )
+            if now - self._last_purge > 60:
+                self._db.execute("DELETE FROM sessions WHERE last_access < ?", (now - self.ttl,))
+                self._last_purge = now
+            self._db.execute(
+                "DELETE FROM sessions WHERE id NOT IN "
+                "(SELECT id FROM sessions ORDER BY last_access DESC LIMIT ?)",
+                (self.max_sessions,),
+            )
+
+    def _stats(self) -> dict:
+        sessions = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        size = self._db.execute("SELECT COALESCE(SUM(LENGTH(role) + LENGTH(CAST(content AS BLOB))), 0) FROM messages").fetchone()[0]
+        return {"backend": "sqlite", "sessions": sessions, "bytes": size}
+
+    async def get_history(self, session_id: str) -> list[dict]:
+        return await self._run(self._get_history, session_id)
+
+    async def append(self, session_id: str, *messages: dict):
+        await self._run(self._append, session_id, messages)
+
+    async def delete(self, session_id: str):
+        await self._run(self._db.execute, "DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    async def stats(self) -> dict:
+        return await self._run(self._stats)
+
+    async def close(self):
+        await self._run(self._db.close)
+
+
+def create_session_store(backend: str = SESSION_BACKEND) -> SessionStore:
+    if backend == "sqlite":
+        return SQLiteSessionStore(Path(SESSION_DB_PATH), SESSION_TIMEOUT, SESSION_MAX_SESSIONS, SESSION_MAX_MESSAGES)
+    return InMemorySessionStore(SESSION_TIMEOUT, SESSION_MAX_SESSIONS, SESSION_MAX_MESSAGES, SESSION_MAX_BYTES)
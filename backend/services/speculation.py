@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import re
+import time
+from typing import AsyncIterator, Awaitable, Callable
+
+from core.config import LLM_SPECULATION, LLM_SPECULATION_STABLE_SECONDS, LLM_SPECULATION_MIN_CHARS
+
+# Speculative LLM prefetch. Once the partial transcript stops changing, the Gemini request for it
+# starts before AssemblyAI reports end of turn. If the final transcript says the same thing, the
+# turn takes over the running stream; otherwise the speculative stream is thrown away.
+
+# Process-wide counters, to weigh the extra Gemini calls against the response time they win
+speculation_stats = {
+    "started": 0,
+    "committed": 0,
+    "discarded": 0,
+    "finals": 0,
+    "latency_saved_seconds": 0.0,
+}
+
+_NON_WORD = re.compile(r"[^\w\s']+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_transcript(text: str) -> str:
+    # Final transcripts may come back formatted (case, punctuation) while partials are not
+    return _WHITESPACE.sub(" ", _NON_WORD.sub(" ", text.lower())).strip()
+
+
+class Speculation:
+    """One speculative LLM stream, buffered so whoever claims it can replay it from the start."""
+    def __init__(self, key: str, revision: int, stream: AsyncIterator[str]):
+        self.key = key
+        self.revision = revision
+        self.chunks: list[str] = []
+        self.done = False
+        self.error: Exception | None = None
+        self.started_at = time.perf_counter()
+        self.first_chunk_at: float | None = None
+        self.finished_at: float | None = None
+        self.claimed_at: float | None = None
+        self._updated = asyncio.Event()
+        self.task = asyncio.create_task(self._consume(stream))
+
+    async def _consume(self, stream: AsyncIterator[str]):
+        try:
+            async for chunk in stream:
+                if self.first_chunk_at is None:
+                    self.first_chunk_at = time.perf_counter()
+                    self._record_saving()
+                self.chunks.append(chunk)
+                self._updated.set()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self.finished_at = time.perf_counter()
+            self._updated.set()
+
+    def _record_saving(self):
+        # The first token arrives min(head start, time to first token) sooner than it would have
+        if self.claimed_at is None or self.first_chunk_at is None:
+            return
+        saved = min(self.claimed_at - self.started_at, self.first_chunk_at - self.started_at)
+        speculation_stats["latency_saved_seconds"] += max(0.0, saved)
+
+    def claim(self):
+        self.claimed_at = time.perf_counter()
+        self._record_saving()
+
+    async def replay(self):
+        index = 0
+        try:
+            while True:
+                while index < len(self.chunks):
+                    yield self.chunks[index]
+                    index += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                self._updated.clear()
+                if index == len(self.chunks) and not self.done:
+                    await self._updated.wait()
+        finally:
+            # The turn was cancelled (barge-in) or gave up: stop the stream too
+            self.cancel()
+
+    def cancel(self):
+        if not self.task.done():
+            self.task.cancel()
+
+
+class SpeculativePrefetcher:
+    """
+    Per-connection speculation driver:
+        - on_partial(text) waits for the transcript to hold still for `stable_seconds`, then
+          calls `prepare(text)` -> (llm stream, prompt revision) or None to skip
+        - on_end_of_turn_hint() stops waiting and speculates on the latest partial right away
+        - claim(text, revision) returns the matching speculation, or None; its replay() is the
+          LLM stream from the start, and started_at / first_chunk_at / finished_at its timings
+    At most one speculative request is in flight per connection.
+    """
+    def __init__(
+        self,
+        prepare: Callable[[str], Awaitable[tuple[AsyncIterator[str], int] | None]],
+        enabled: bool = LLM_SPECULATION,
+        stable_seconds: float = LLM_SPECULATION_STABLE_SECONDS,
+        min_chars: int = LLM_SPECULATION_MIN_CHARS,
+    ):
+        self.prepare = prepare
+        self.enabled = enabled
+        self.stable_seconds = stable_seconds
+        self.min_chars = min_chars
+        self.current: Speculation | None = None
+        self._pending_key: str | None = None
+        self._pending_text: str | None = None
+        self._timer: asyncio.Task | None = None
+
+    async def on_partial(self, text: str):
+        if not self.enabled:
+            return
+        key = normalize_transcript(text)
+        if len(key) < self.min_chars or key == self._pending_key:
+            return
+        self._pending_key = key
+        self._pending_text = text
+        self._cancel_timer()
+        self._timer = asyncio.create_task(self._speculate(key, text, self.stable_seconds))
+
+    async def on_end_of_turn_hint(self):
+        """A local end-of-turn hint (VAD silence) means the partial is as settled as it gets."""
+        if not self.enabled or self._timer is None or self._timer.done():
+            return
+        self._cancel_timer()
+        self._timer = asyncio.create_task(self._speculate(self._pending_key, self._pending_text, 0))
+
+    async def _speculate(self, key: str, text: str, delay: float):
+        if delay:
+            await asyncio.sleep(delay)
+        if self.current is not None and self.current.key == key:
+            return
+        try:
+            prepared = await self.prepare(text)
+        except Exception as e:
+            logging.info(f"Skipping speculative LLM request: {e}")
+            return
+        if prepared is None:
+            return
+        stream, revision = prepared
+        self.discard()
+        self.current = Speculation(key, revision, stream)
+        speculation_stats["started"] += 1
+
+    def claim(self, text: str, revision: int) -> Speculation | None:
+        """Hand over the speculation if it was built from this transcript and history."""
+        self._cancel_timer()
+        self._pending_key = self._pending_text = None
+        if not self.enabled:
+            return None
+        speculation_stats["finals"] += 1
+        speculation = self.current
+        self.current = None
+        if speculation is None:
+            return None
+        if speculation.key != normalize_transcript(text) or speculation.revision != revision:
+            speculation.cancel()
+            speculation_stats["discarded"] += 1
+            return None
+        speculation.claim()
+        speculation_stats["committed"] += 1
+        return speculation
+
+    def discard(self):
+        if self.current is not None:
+            self.current.cancel()
+            self.current = None
+            speculation_stats["discarded"] += 1
+
+    def _cancel_timer(self):
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        self._timer = None
+
+    def close(self):
+        self._cancel_timer()
+        self.discard()
+
+
+def get_speculation_stats() -> dict:
+    started, committed = speculation_stats["started"], speculation_stats["committed"]
+    return {
+        **speculation_stats,
+        "hit_rate": committed / started if started else 0.0,
+        "avg_latency_saved_seconds": speculation_stats["latency_saved_seconds"] / committed if committed else 0.0,
+    }
@@ -1,78 +1,429 @@
+from __future__ import annotations
+
 from fastapi import HTTPException, UploadFile
 from io import BytesIO
-import assemblyai as aai
 import asyncio
+import inspect
 import logging
-from typing import Type
-from assemblyai.streaming.v3 import (
-    BeginEvent,
-    StreamingClient,
-    StreamingClientOptions,
-    StreamingError,
-    StreamingEvents,
-    StreamingParameters,
-    StreamingSessionParameters,
-    TerminationEvent,
-    TurnEvent,
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING
+import numpy as np
+from core.config import (
+    ASSEMBLYAI_API_KEY,
+    require_env,
+    STT_BUFFER_BYTES,
+    STT_DROP_POLICY,
+    STT_MAX_UPSTREAM_FRAMES,
+    STT_MIN_PACKET_MS,
+    STT_VAD,
+    VAD_FRAME_MS,
+    VAD_ENERGY_DBFS,
+    VAD_NOISE_MARGIN_DB,
+    VAD_ZCR_MAX,
+    VAD_HANGOVER_MS,
+    VAD_PREROLL_MS,
+    VAD_SILENCE_TAIL_MS,
+    VAD_SILENCE_POLICY,
+    VAD_SILENCE_KEEP_EVERY,
+    VAD_END_OF_TURN_MS,
+    VAD_FORCE_ENDPOINT,
 )
-from core.config import ASSEMBLYAI_API_KEY
+from services.providers import ensure_provider
+import services.batch_transcription as batch
+
+if TYPE_CHECKING:
+    from assemblyai.streaming.v3 import BeginEvent, StreamingClient, StreamingError, TerminationEvent, TurnEvent
+
+
+class AssemblyAIProvider:
+    """Real STT provider. The assemblyai SDK is imported (and keyed) only when this is built."""
+    def __init__(self):
+        require_env(ASSEMBLYAI_API_KEY=ASSEMBLYAI_API_KEY)
+        import assemblyai as aai
+        # Streaming SDK too, so the first connection does not pay for the import
+        from assemblyai.streaming import v3
+        aai.settings.api_key = ASSEMBLYAI_API_KEY
+        self.aai = aai
+
+    def create_transcriber(self, **callbacks) -> AssemblyAIStreamingTranscriber:
+        return AssemblyAIStreamingTranscriber(**callbacks)
+
+    def transcribe(self, audio_bytes: bytes) -> str | None:
+        transcript = self.aai.Transcriber().transcribe(BytesIO(audio_bytes))
+        return transcript.text if transcript else None
+
+    def transcribe_file(self, path: str) -> str | None:
+        # The SDK streams the file up from disk
+        transcript = self.aai.Transcriber().transcribe(path)
+        if transcript and transcript.error:
+            raise RuntimeError(transcript.error)
+        return transcript.text if transcript else None
 
 
-# Initialize AssemblyAI client with API key
-aai.settings.api_key = ASSEMBLYAI_API_KEY
+async def create_transcriber(**callbacks):
+    """Streaming transcriber from the configured STT provider (real or fake)."""
+    provider = await ensure_provider("stt")
+    return provider.create_transcriber(**callbacks)
+
 
 async def speech_to_text(file: UploadFile):
-    if not file:
-        raise HTTPException(status_code=400, detail="No file provided for transcription.")
-    audio_bytes = await file.read()
-    if not audio_bytes:
-        raise HTTPException(status_code=400, detail="No audio data in uploaded file.")
-    transcriber = aai.Transcriber()
-    try:
-        transcript = transcriber.transcribe(BytesIO(audio_bytes))
-        return (transcript.text if transcript and transcript.text else "I couldn't understand that. Please try again.")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
+    """Transcribe an upload and wait for the text, through the batch job pool (spooled to disk)."""
+    job = await batch.submit(file)
+    await job.done.wait()
+    if job.status != batch.JOB_DONE:
+        raise HTTPException(status_code=500, detail=f"Transcription failed: {job.error}")
+    return job.text or "I couldn't understand that. Please try again."
+
+
+# Process-wide STT bridge counters (audio frames in/out of the ring buffers, drops under stalls)
+stt_stats = {
+    "frames_in": 0,
+    "frames_sent": 0,
+    "dropped_frames": 0,
+    "dropped_bytes": 0,
+    "backpressure_waits": 0,
+    "duplicate_finals": 0,
+}
+
+
+class _EndpointMarker:
+    """Takes no room in the ring buffer; never equal to a frame of client audio."""
+    def __len__(self) -> int:
+        return 0
+
+    def __repr__(self) -> str:
+        return "ENDPOINT_MARKER"
+
+
+# Pushed into the ring buffer to ask the sender thread to force an AssemblyAI endpoint once
+# the audio queued ahead of it has been sent
+ENDPOINT_MARKER = _EndpointMarker()
+
+
+class AudioRingBuffer:
+    """
+    Bounded, thread-safe FIFO of audio frames between the event loop (producer) and the
+    STT sender thread (consumer). When `max_bytes` is exceeded the drop policy applies:
+        - "oldest": discard the oldest frames (keeps latency low after a stall)
+        - "newest": discard the incoming frame (keeps the start of the utterance)
+    """
+    def __init__(self, max_bytes: int, drop_policy: str = "oldest"):
+        self.max_bytes = max_bytes
+        self.drop_policy = drop_policy
+        self._frames: deque[bytes] = deque()
+        self._bytes = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def push(self, frame: bytes) -> bool:
+        with self._cond:
+            if self._closed:
+                return False
+            # Endpoint markers are never dropped: losing one would leave the turn open
+            audio = frame is not ENDPOINT_MARKER
+            if audio:
+                stt_stats["frames_in"] += 1
+            if audio and self.drop_policy == "newest" and self._bytes + len(frame) > self.max_bytes:
+                stt_stats["dropped_frames"] += 1
+                stt_stats["dropped_bytes"] += len(frame)
+                return False
+            self._frames.append(frame)
+            self._bytes += len(frame)
+            while self._bytes > self.max_bytes and self._drop_oldest_audio():
+                pass
+            self._cond.notify()
+            return True
+
+    def _drop_oldest_audio(self) -> bool:
+        # Skips markers, and never drops the frame just pushed
+        for index in range(len(self._frames) - 1):
+            if self._frames[index] is not ENDPOINT_MARKER:
+                dropped = self._frames[index]
+                del self._frames[index]
+                self._bytes -= len(dropped)
+                stt_stats["dropped_frames"] += 1
+                stt_stats["dropped_bytes"] += len(dropped)
+                return True
+        return False
+
+    def pop(self, timeout: float | None = None) -> bytes | None:
+        """Next frame; None once closed and drained (or on timeout)."""
+        with self._cond:
+            if not self._frames and not self._closed:
+                self._cond.wait(timeout)
+            if not self._frames:
+                return None
+            frame = self._frames.popleft()
+            self._bytes -= len(frame)
+            return frame
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
 
 
+VAD_SPEECH_START = "speech_start"
+VAD_SPEECH_END = "speech_end"
+VAD_END_OF_TURN = "end_of_turn"
 
+# Process-wide VAD counters (how much audio the gate kept away from AssemblyAI)
+vad_stats = {
+    "frames": 0,
+    "speech_frames": 0,
+    "bytes_in": 0,
+    "bytes_forwarded": 0,
+    "speech_segments": 0,
+    "end_of_turn_hints": 0,
+}
 
 
+class VoiceActivityDetector:
+    """
+    Energy / zero-crossing VAD and silence gate for 16-bit little-endian mono PCM.
+
+    A frame is speech when its RMS clears both VAD_ENERGY_DBFS and the adaptive noise floor
+    (+VAD_NOISE_MARGIN_DB), and its zero-crossing rate looks voiced (very loud frames pass
+    regardless). `process(chunk)` returns the audio to forward plus any VAD events:
+        - speech is forwarded together with the pre-roll before it and the hangover after it
+        - silence is forwarded at full rate for `tail_ms` after speech, then per `silence_policy`
+        - `end_of_turn` fires once after `end_of_turn_ms` of silence following speech
+    """
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = VAD_FRAME_MS,
+        energy_dbfs: float = VAD_ENERGY_DBFS,
+        noise_margin_db: float = VAD_NOISE_MARGIN_DB,
+        zcr_max: float = VAD_ZCR_MAX,
+        hangover_ms: int = VAD_HANGOVER_MS,
+        preroll_ms: int = VAD_PREROLL_MS,
+        tail_ms: int = VAD_SILENCE_TAIL_MS,
+        end_of_turn_ms: int = VAD_END_OF_TURN_MS,
+        silence_policy: str = VAD_SILENCE_POLICY,
+        silence_keep_every: int = VAD_SILENCE_KEEP_EVERY,
+    ):
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.frame_bytes = self.frame_samples * 2
+        self.min_rms = 32768 * 10 ** (energy_dbfs / 20)
+        self.noise_ratio = 10 ** (noise_margin_db / 20)
+        self.zcr_max = zcr_max
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.tail_frames = tail_ms // frame_ms
+        self.end_of_turn_frames = max(1, end_of_turn_ms // frame_ms)
+        self.silence_policy = silence_policy
+        self.silence_keep_every = max(1, silence_keep_every)
+        self.noise_rms = self.min_rms / self.noise_ratio
+        self.in_speech = False
+        self._preroll: deque[bytes] = deque(maxlen=max(0, preroll_ms // frame_ms))
+        self._remainder = b""
+        self._hangover = 0
+        # Start as if long past any speech, so leading silence is gated right away
+        self._silence_frames = self.tail_frames
+        self._end_of_turn_pending = False
+        # Whether the last processed chunk contained any speech frame
+        self.chunk_had_speech = False
+
+    def frame_features(self, frames: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """RMS and zero-crossing rate of each row of an (n, frame_samples) int16 array."""
+        samples = frames.astype(np.float32)
+        rms = np.sqrt(np.mean(samples * samples, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_samples - 1)
+        return rms, zcr
+
+    def process(self, chunk: bytes) -> tuple[bytes, list[str]]:
+        data = self._remainder + chunk
+        usable = len(data) - len(data) % self.frame_bytes
+        self._remainder = data[usable:]
+        vad_stats["bytes_in"] += len(chunk)
+        if not usable:
+            return b"", []
+
+        frames = np.frombuffer(data, dtype="<i2", count=usable // 2).reshape(-1, self.frame_samples)
+        rms, zcr = self.frame_features(frames)
+        self.chunk_had_speech = False
+        out: list[bytes] = []
+        events: list[str] = []
+        for i in range(len(frames)):
+            frame = data[i * self.frame_bytes:(i + 1) * self.frame_bytes]
+            threshold = max(self.min_rms, self.noise_rms * self.noise_ratio)
+            speech = rms[i] > threshold and (zcr[i] <= self.zcr_max or rms[i] > 4 * threshold)
+            if speech:
+                self.chunk_had_speech = True
+                vad_stats["speech_frames"] += 1
+                if not self.in_speech:
+                    self.in_speech = True
+                    vad_stats["speech_segments"] += 1
+                    events.append(VAD_SPEECH_START)
+                    out.extend(self._preroll)
+                    self._preroll.clear()
+                self._hangover = self.hangover_frames
+                self._silence_frames = 0
+                self._end_of_turn_pending = True
+                out.append(frame)
+            elif self.in_speech:
+                out.append(frame)
+                self._hangover -= 1
+                if self._hangover <= 0:
+                    self.in_speech = False
+                    self._silence_frames = self.hangover_frames
+                    events.append(VAD_SPEECH_END)
+            else:
+                # Track the background level on non-speech frames only
+                self.noise_rms = 0.95 * self.noise_rms + 0.05 * float(rms[i])
+                self._silence_frames += 1
+                if self._end_of_turn_pending and self._silence_frames >= self.end_of_turn_frames:
+                    self._end_of_turn_pending = False
+                    vad_stats["end_of_turn_hints"] += 1
+                    events.append(VAD_END_OF_TURN)
+                if self.silence_policy == "pass" or self._silence_frames <= self.tail_frames:
+                    out.append(frame)
+                elif self.silence_policy == "thin" and self._silence_frames % self.silence_keep_every == 0:
+                    out.append(frame)
+                else:
+                    self._preroll.append(frame)
+        vad_stats["frames"] += len(frames)
+        forwarded = b"".join(out)
+        vad_stats["bytes_forwarded"] += len(forwarded)
+        return forwarded, events
+
+
+def get_vad_stats() -> dict:
+    bytes_in = vad_stats["bytes_in"]
+    return {**vad_stats, "forwarded_ratio": vad_stats["bytes_forwarded"] / bytes_in if bytes_in else 1.0}
+
 
 class AssemblyAIStreamingTranscriber:
     """
     Wrapper around AAI StreamingClient that exposes:
         - on_partial_callback(text) for interim results
         - on_final_callback(text)   when end_of_turn=True
+        - on_vad_callback(event)    for local VAD events (speech_start, speech_end, end_of_turn)
+
+    Nothing here blocks the event loop: the handshake and teardown run in a thread, audio goes
+    through a bounded ring buffer drained by a dedicated sender thread, and transcript events
+    come back through an asyncio queue. Callbacks run on the event loop and may be coroutines.
+
+        transcriber = AssemblyAIStreamingTranscriber(on_final_callback=handle_final)
+        await transcriber.start()
+        transcriber.stream_audio(chunk)
+        await transcriber.aclose()
     """
     def __init__(
         self,
         sample_rate: int = 16000,
         on_partial_callback=None,
         on_final_callback=None,
+        on_vad_callback=None,
+        buffer_bytes: int = STT_BUFFER_BYTES,
+        drop_policy: str = STT_DROP_POLICY,
+        vad: VoiceActivityDetector | None = None,
+        force_endpoint: bool = VAD_FORCE_ENDPOINT,
     ):
+        self.sample_rate = sample_rate
         self.on_partial_callback = on_partial_callback
         self.on_final_callback = on_final_callback
+        self.on_vad_callback = on_vad_callback
+        self.buffer = AudioRingBuffer(buffer_bytes, drop_policy)
+        # Silence gate in front of the ring buffer (STT_VAD=0 forwards everything)
+        self.vad = vad if vad is not None else (VoiceActivityDetector(sample_rate) if STT_VAD else None)
+        self.force_endpoint = force_endpoint
+        self._min_packet_bytes = sample_rate * STT_MIN_PACKET_MS // 1000 * 2
+        self._pending = bytearray()
+        # perf_counter() when the latest chunk with speech arrived (VAD only); latency metrics
+        # measure from here, i.e. from when the user stopped talking
+        self.last_speech_at: float | None = None
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._sender: threading.Thread | None = None
+        self._dispatcher: asyncio.Task | None = None
+        # turn_order of the last turn reported as final, and whether formatted turns were asked for
+        self._final_turn_order: int | None = None
+        self._format_requested = False
 
-        self.client = StreamingClient(
-            StreamingClientOptions(
-                api_key=aai.settings.api_key,
+        from assemblyai.streaming import v3
+        self._sdk = v3
+        self.client = v3.StreamingClient(
+            v3.StreamingClientOptions(
+                api_key=ASSEMBLYAI_API_KEY,
                 api_host="streaming.assemblyai.com",
             )
         )
 
         # register events
-        self.client.on(StreamingEvents.Begin, lambda client, event: self._on_begin(event))
-        self.client.on(StreamingEvents.Turn, lambda client, event: self._on_turn(client, event))
-        self.client.on(StreamingEvents.Error, lambda client, error: self._on_error(error))
-        self.client.on(StreamingEvents.Termination, lambda client, event: self._on_termination(event))
-
-        self.client.connect(
-            StreamingParameters(
-                sample_rate=sample_rate,
+        self.client.on(v3.StreamingEvents.Begin, lambda client, event: self._on_begin(event))
+        self.client.on(v3.StreamingEvents.Turn, lambda client, event: self._on_turn(client, event))
+        self.client.on(v3.StreamingEvents.Error, lambda client, error: self._on_error(error))
+        self.client.on(v3.StreamingEvents.Termination, lambda client, event: self._on_termination(event))
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._dispatcher = asyncio.create_task(self._dispatch_events())
+        # The handshake blocks (with retries), so keep it off the loop
+        await asyncio.to_thread(
+            self.client.connect,
+            self._sdk.StreamingParameters(
+                sample_rate=self.sample_rate,
                 format_turns=False,
             )
         )
+        self._sender = threading.Thread(target=self._send_loop, name="aai-sender", daemon=True)
+        self._sender.start()
+
+    def _upstream_backlog(self) -> int:
+        # The SDK's write queue is unbounded; watch it so a stalled uplink pushes back on us
+        write_queue = getattr(self.client, "_write_queue", None)
+        return write_queue.qsize() if write_queue is not None else 0
+
+    def _send_loop(self):
+        while True:
+            frame = self.buffer.pop(timeout=0.5)
+            if frame is None:
+                if self.buffer.closed:
+                    break
+                continue
+            if frame is ENDPOINT_MARKER:
+                self.client.force_endpoint()
+                continue
+            while self._upstream_backlog() > STT_MAX_UPSTREAM_FRAMES and not self.buffer.closed:
+                stt_stats["backpressure_waits"] += 1
+                time.sleep(0.01)
+            self.client.stream(frame)
+            stt_stats["frames_sent"] += 1
+
+    def _post(self, kind: str, text: str):
+        # Called from the SDK read thread
+        if self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._events.put_nowait, (kind, text))
+        except RuntimeError:
+            pass  # loop already closed
+
+    async def _dispatch_events(self):
+        while True:
+            kind, text = await self._events.get()
+            callback = {
+                "final": self.on_final_callback,
+                "partial": self.on_partial_callback,
+                "vad": self.on_vad_callback,
+            }[kind]
+            if not callback:
+                continue
+            try:
+                result = callback(text)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logging.error(f"Transcript callback error: {e}")
 
     def _on_begin(self, event: BeginEvent):
         logging.info(f"AAI session started: {event.id}")
@@ -83,17 +434,22 @@ class AssemblyAIStreamingTranscriber:
             return
 
         if event.end_of_turn:
-            if self.on_final_callback:
-                self.on_final_callback(text)
+            # With format_turns on, AAI ends every turn twice (as spoken, then formatted). Only the
+            # first one is reported: a second final would start, and cancel, another bot turn.
+            if event.turn_order == self._final_turn_order:
+                stt_stats["duplicate_finals"] += 1
+                return
+            self._final_turn_order = event.turn_order
+            self._post("final", text)
 
-            if not event.turn_is_formatted:
+            if not event.turn_is_formatted and not self._format_requested:
+                self._format_requested = True
                 try:
-                    client.set_params(StreamingSessionParameters(format_turns=True))
+                    client.set_params(self._sdk.StreamingSessionParameters(format_turns=True))
                 except Exception as set_err:
                     print("set_params error:", set_err)
         else:
-            if self.on_partial_callback:
-                self.on_partial_callback(text)
+            self._post("partial", text)
     
     def _on_error(self, error: StreamingError):
         print("AAI error:", error)
@@ -102,8 +458,48 @@ class AssemblyAIStreamingTranscriber:
         print(f"AAI session terminated after {event.audio_duration_seconds} s")
 
     def stream_audio(self, audio_chunk: bytes):
-        self.client.stream(audio_chunk)
+        # Never blocks: the ring buffer absorbs (and if needed drops) audio during stalls
+        if not audio_chunk:
+            return
+        if self.vad is None:
+            self.buffer.push(audio_chunk)
+            return
+        audio, events = self.vad.process(audio_chunk)
+        if self.vad.chunk_had_speech:
+            self.last_speech_at = time.perf_counter()
+        self._pending += audio
+        end_of_turn = VAD_END_OF_TURN in events
+        if self._pending and end_of_turn and len(self._pending) < self._min_packet_bytes:
+            # Pad the last bit of the turn with digital silence rather than hold it back
+            self._pending += bytes(self._min_packet_bytes - len(self._pending))
+        if len(self._pending) >= self._min_packet_bytes:
+            self.buffer.push(bytes(self._pending))
+            self._pending.clear()
+        if end_of_turn and self.force_endpoint:
+            self.buffer.push(ENDPOINT_MARKER)
+        for event in events:
+            # Already on the event loop, so no thread hop needed
+            self._events.put_nowait(("vad", event))
 
     def close(self):
-        self.client.disconnect(terminate=True)
+        self._close_upstream()
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+
+    async def aclose(self):
+        await asyncio.to_thread(self._close_upstream)
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+
+    def _close_upstream(self):
+        self.buffer.close()
+        if self._sender is not None:
+            self._sender.join(timeout=2)
+        try:
+            self.client.disconnect(terminate=True)
+        except Exception as e:
+            logging.info(f"AAI disconnect failed: {e}")
+
 
+def get_stt_stats() -> dict:
+    return dict(stt_stats)
@@ -0,0 +1,143 @@
+import asyncio
+import re
+import time
+from typing import AsyncIterator
+
+from core.config import SEGMENT_MIN_CHARS, SEGMENT_MAX_CHARS, SEGMENT_FLUSH_TIMEOUT
+
+# Gemini streams arbitrary fragments; Murf sounds best (and costs least) when fed whole
+# clauses or sentences. The segmenter sits between the two and re-cuts the stream.
+_SENTENCE_END = re.compile(r"[.!?…](?:[\"')\]]*)\s")
+_CLAUSE_END = re.compile(r"[,;:—](?:[\"')\]]*)\s")
+
+# Process-wide counters, for sizing the budgets from real traffic
+segmenter_stats = {
+    "turns": 0,
+    "source_chunks": 0,
+    "segments": 0,
+    "timeout_flushes": 0,
+    "first_segment_seconds_total": 0.0,
+}
+
+
+class TextSegmenter:
+    """
+    Buffers streamed text and cuts it into speakable segments:
+        - the first segment may end at a clause boundary, so audio starts early
+        - later segments end at sentence boundaries once `min_chars` is reached
+        - nothing grows past `max_chars`; it is cut at the last clause or word break
+    """
+    def __init__(self, min_chars: int = SEGMENT_MIN_CHARS, max_chars: int = SEGMENT_MAX_CHARS):
+        self.min_chars = min_chars
+        self.max_chars = max(max_chars, min_chars)
+        self.buffer = ""
+        self.emitted = 0
+
+    def feed(self, text: str) -> list[str]:
+        self.buffer += text
+        segments = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            segment, self.buffer = self.buffer[:cut].strip(), self.buffer[cut:]
+            if segment:
+                segments.append(segment)
+                self.emitted += 1
+        return segments
+
+    def flush(self) -> str | None:
+        segment, self.buffer = self.buffer.strip(), ""
+        if not segment:
+            return None
+        self.emitted += 1
+        return segment
+
+    def _find_cut(self) -> int | None:
+        if len(self.buffer) < self.min_chars:
+            return None
+        boundaries = [_SENTENCE_END] if self.emitted else [_SENTENCE_END, _CLAUSE_END]
+        for pattern in boundaries:
+            for match in pattern.finditer(self.buffer, self.min_chars - 1):
+                if match.end() <= self.max_chars:
+                    return match.end()
+                break
+        if len(self.buffer) < self.max_chars:
+            return None
+        # Over budget with no sentence end: fall back to a clause, then a word break
+        window = self.buffer[:self.max_chars]
+        clauses = [m.end() for m in _CLAUSE_END.finditer(window)]
+        if clauses:
+            return clauses[-1]
+        space = window.rfind(" ")
+        return space + 1 if space > 0 else self.max_chars
+
+
+async def segment_stream(
+    chunks: AsyncIterator[str],
+    min_chars: int = SEGMENT_MIN_CHARS,
+    max_chars: int = SEGMENT_MAX_CHARS,
+    flush_timeout: float = SEGMENT_FLUSH_TIMEOUT,
+    stats: dict | None = None,
+) -> AsyncIterator[str]:
+    """
+    Re-cut an LLM text stream into clause/sentence segments for TTS.
+    If the source stalls for `flush_timeout` seconds, whatever is buffered is emitted.
+    Per-turn numbers are written into `stats` when given.
+    """
+    segmenter = TextSegmenter(min_chars, max_chars)
+    turn_stats = stats if stats is not None else {}
+    turn_stats.update({"source_chunks": 0, "segments": 0, "first_segment_seconds": None})
+    started = time.perf_counter()
+
+    # Pump the source into a queue so a timed-out wait never cancels the source generator
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+        finally:
+            await queue.put(done)
+
+    def emitted(segment: str) -> str:
+        turn_stats["segments"] += 1
+        if turn_stats["first_segment_seconds"] is None:
+            turn_stats["first_segment_seconds"] = time.perf_counter() - started
+        return segment
+
+    pump_task = asyncio.create_task(pump())
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(queue.get(), flush_timeout if segmenter.buffer else None)
+            except asyncio.TimeoutError:
+                segment = segmenter.flush()
+                if segment:
+                    segmenter_stats["timeout_flushes"] += 1
+                    yield emitted(segment)
+                continue
+            if chunk is done:
+                break
+            if not chunk:
+                continue
+            turn_stats["source_chunks"] += 1
+            for segment in segmenter.feed(chunk):
+                yield emitted(segment)
+        segment = segmenter.flush()
+        if segment:
+            yield emitted(segment)
+        # Surface errors raised by the source stream
+        await pump_task
+    finally:
+        if not pump_task.done():
+            pump_task.cancel()
+        segmenter_stats["turns"] += 1
+        segmenter_stats["source_chunks"] += turn_stats["source_chunks"]
+        segmenter_stats["segments"] += turn_stats["segments"]
+        segmenter_stats["first_segment_seconds_total"] += turn_stats["first_segment_seconds"] or 0.0
+
+
+def get_segmenter_stats() -> dict:
+    return dict(segmenter_stats)
@@ -0,0 +1,126 @@
+import hashlib
+import logging
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+# Content-addressed cache for synthesized audio. Personas repeat a lot of phrases
+# (greetings, catchphrases, the fallback line), so identical segments skip Murf entirely.
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def cache_key(text: str, voice_id: str, style: str, format: str) -> str:
+    raw = "\x1f".join((normalize_text(text), voice_id, style, format))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Two-tier audio cache:
+        - memory: LRU bounded by `max_bytes`
+        - disk (optional): one file per key under `disk_dir`, bounded by `disk_max_bytes`,
+          oldest files evicted first
+    Disk methods block, so async callers should run them in a thread.
+    """
+    def __init__(self, max_bytes: int, disk_dir: Path | None = None, disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max(1, max_bytes // 8)
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self.stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "disk_evictions": 0,
+            "bytes": 0,
+            "entries": 0,
+            "disk_bytes": 0,
+        }
+        if disk_dir is not None:
+            disk_dir.mkdir(parents=True, exist_ok=True)
+            self.stats["disk_bytes"] = sum(f.stat().st_size for f in disk_dir.glob("*.audio"))
+
+    def get(self, key: str) -> bytes | None:
+        audio = self._entries.get(key)
+        if audio is not None:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["memory_hits"] += 1
+        return audio
+
+    def put(self, key: str, audio: bytes):
+        if not audio or len(audio) > self.max_entry_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.stats["bytes"] -= len(previous)
+        self._entries[key] = audio
+        self.stats["bytes"] += len(audio)
+        while self.stats["bytes"] > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.stats["bytes"] -= len(evicted)
+            self.stats["evictions"] += 1
+        self.stats["entries"] = len(self._entries)
+
+    def miss(self):
+        self.stats["misses"] += 1
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.audio"
+
+    def load(self, key: str) -> bytes | None:
+        """Disk lookup. Callers promote hits into memory with `put` (on the event loop)."""
+        if self.disk_dir is None:
+            return None
+        try:
+            audio = self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+        self.stats["hits"] += 1
+        self.stats["disk_hits"] += 1
+        return audio
+
+    def store(self, key: str, audio: bytes):
+        if self.disk_dir is None or not audio:
+            return
+        path = self._path(key)
+        if path.exists():
+            return
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"TTS cache disk write failed: {e}")
+            return
+        self.stats["disk_bytes"] += len(audio)
+        if self.stats["disk_bytes"] > self.disk_max_bytes:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        files = sorted(self.disk_dir.glob("*.audio"), key=lambda f: f.stat().st_mtime)
+        for f in files:
+            if self.stats["disk_bytes"] <= self.disk_max_bytes:
+                break
+            try:
+                size = f.stat().st_size
+                f.unlink()
+            except OSError:
+                continue
+            self.stats["disk_bytes"] -= size
+            self.stats["disk_evictions"] += 1
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_rate": self.stats["hits"] / lookups if lookups else 0.0}
@@ -1,14 +1,35 @@
-import httpx
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 import logging
 import os
 import asyncio
 from pathlib import Path
-import websockets
-from murf import Murf
 import json
-from core.config import MURF_API_KEY
+import base64
+import datetime
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from core.config import (
+    require_env,
+    MURF_API_KEY,
+    MURF_API_BASE_URL,
+    TTS_MAX_WORKERS,
+    TTS_MAX_PER_SESSION,
+    TTS_TRANSPORT,
+    MURF_WS_POOL_SIZE,
+    MURF_WS_RECEIVE_TIMEOUT,
+    MURF_WS_SAMPLE_RATE,
+    TTS_CACHE_MAX_BYTES,
+    TTS_CACHE_DISK,
+    TTS_CACHE_DISK_MAX_BYTES,
+    VOICES_CACHE_TTL,
+)
+from services.http_client import get_http_client
+from services.providers import ensure_provider, get_provider
+from services.murf_stream import MurfStreamPool, MurfConnectionError
+from services.tts_cache import TTSCache, cache_key
 
 MURF_WS_URL = "wss://api.murf.ai/v1/speech/stream-input"
 
@@ -20,107 +41,381 @@ UPLOADS_DIR.mkdir(exist_ok=True)
 
 default_voice = "en-IN-alia"
 
+FALLBACK_TEXT = "I'm having trouble connecting right now."
+
 async def text_to_murf_voice(text: str, voice_id: str = "en-IN-alia", format: str = "mp3"):
-    url = "https://api.murf.ai/v1/speech/generate"
+    url = f"{MURF_API_BASE_URL}/speech/generate"
     payload = {
         "text": text,
         "voiceId": voice_id,
         "format": format
     }
-    async with httpx.AsyncClient() as client:
-        res = await client.post(
-            url,
-            headers={
-                "accept": "application/json",
-                "content-type": "application/json",
-                "api-key": MURF_API_KEY if MURF_API_KEY is not None else "",
-            },
-            json=payload
-        )
+    res = await get_http_client().post(
+        url,
+        headers={
+            "accept": "application/json",
+            "content-type": "application/json",
+            "api-key": MURF_API_KEY if MURF_API_KEY is not None else "",
+        },
+        json=payload
+    )
     return res
 
 
-async def stream_murf_voice(text: str, voice_id: str = "en-IN-alia", format: str = "mp3"):
-    async with websockets.connect(
-        f"{MURF_WS_URL}?api-key={MURF_API_KEY}&sample_rate=44100&channel_type=MONO&format=WAV"
-    ) as ws:
-        # Send voice config first (optional)
-        voice_config_msg = {
-            "voice_config": {
-                "voiceId": "en-US-amara",
-                "style": "Conversational",
-                "rate": 0,
-                "pitch": 0,
-                "variation": 1
-            }
-        }
-        print(f'Sending payload : {voice_config_msg}')
-        await ws.send(json.dumps(voice_config_msg))
+# Shared Murf streaming pool, opened lazily and closed from the app lifespan
+_stream_pool: MurfStreamPool | None = None
 
-        # Send text in one go (or chunk if you want streaming)
-        text_msg = {
-            "text": text,
-            "end" : True # This will close the context. So you can re-run and concurrency is available.
-        }
-        print(f'Sending text payload: {text_msg}')
-        await ws.send(json.dumps(text_msg))
 
-        # Receive streaming audio responses from Murf
-        async for message in ws:
-            try:
-                response = json.loads(message)
-            except Exception as e:
-                logging.error(f"Error parsing Murf response: {e}")
-                continue
+def get_stream_pool() -> MurfStreamPool:
+    global _stream_pool
+    if _stream_pool is None:
+        _stream_pool = MurfStreamPool(
+            f"{MURF_WS_URL}?api-key={MURF_API_KEY}&sample_rate={MURF_WS_SAMPLE_RATE}&channel_type=MONO&format=WAV",
+            size=MURF_WS_POOL_SIZE,
+            receive_timeout=MURF_WS_RECEIVE_TIMEOUT,
+        )
+    return _stream_pool
+
+
+def get_stream_pool_stats() -> dict:
+    # Without creating the pool: REST-only setups never open one
+    return dict(_stream_pool.stats) if _stream_pool is not None else {}
+
 
-            if "audio" in response:
-                # Here, you would typically stream this audio data to the client
-                yield response["audio"]
+async def close_stream_pool():
+    global _stream_pool
+    if _stream_pool is not None:
+        await _stream_pool.close()
+        _stream_pool = None
 
-            if response.get("status") == "done":
-                print("Streaming complete.")
-                break
 
+def session_context_id(session_id: str) -> str:
+    return f"{STATIC_CONTEXT_ID}-{session_id}"
 
-def speak(text: str, voice_id: str = default_voice, output_file: str = "stream_output.wav"):
-    client = Murf(api_key=MURF_API_KEY)
 
-    file_path = UPLOADS_DIR / output_file
+async def stream_murf_voice(text: str, voice_id: str = "en-IN-alia", format: str = "mp3", session_id: str = "default_session"):
+    # Yields base64 audio chunks over a warm pooled connection
+    async for audio_chunk in get_stream_pool().synthesize(text, voice_id, session_context_id(session_id)):
+        yield base64.b64encode(audio_chunk).decode("utf-8")
 
-    # Start with a clean file
-    open(file_path, "wb").close()
 
-    res = client.text_to_speech.stream(
+class MurfProvider:
+    """
+    Real TTS provider: the Murf SDK client for REST streaming (imported only when this is built),
+    and the pooled Murf websocket when TTS_TRANSPORT is "ws".
+    """
+    transport = TTS_TRANSPORT
+
+    def __init__(self):
+        require_env(MURF_API_KEY=MURF_API_KEY)
+        from murf import Murf
+        # The SDK client keeps its own HTTP connection pool, so build it once
+        self.client = Murf(api_key=MURF_API_KEY)
+
+
+def get_murf_client():
+    return get_provider("tts").client
+
+
+def get_transport() -> str:
+    """"ws" or "rest" for the configured TTS provider (fakes only do "rest")."""
+    return get_provider("tts").transport
+
+
+def iter_speak(text: str, voice_id: str = default_voice):
+    """Yield Murf audio chunks as they arrive (blocking; run it off the event loop)."""
+    # Same audio as the websocket transport, so per-session output conversion has one source format
+    res = get_murf_client().text_to_speech.stream(
         text=text,
         voice_id=voice_id,
-        style="Conversational"
+        style="Conversational",
+        format="WAV",
+        sample_rate=MURF_WS_SAMPLE_RATE,
+        channel_type="MONO",
     )
+    yield from res
+
+
+def speak(text: str, voice_id: str = default_voice, output_file: str | None = None):
+    # Collect chunks in a list and join once; `bytes +=` per chunk is quadratic for long answers
+    chunks = list(iter_speak(text, voice_id))
+    if output_file:
+        with open(UPLOADS_DIR / output_file, "wb") as f:
+            f.writelines(chunks)
+    return b"".join(chunks)
+
+
+class SessionRecorder:
+    """
+    Optional per-session recording of synthesized audio.
+    Each session gets its own file, written through a large buffer so chunks cost no syscall.
+    """
+    def __init__(self, session_id: str, buffer_size: int = 256 * 1024):
+        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        self.path = UPLOADS_DIR / f"tts_{session_id}_{timestamp}.audio"
+        self._file = open(self.path, "wb", buffering=buffer_size)
+
+    def write(self, audio_chunk: bytes):
+        if not self._file.closed:
+            self._file.write(audio_chunk)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+# Murf's SDK stream is blocking, so synthesis runs on a bounded pool instead of the event loop.
+# Each session may only hold TTS_MAX_PER_SESSION workers at a time, so one long answer cannot
+# starve every other socket sharing this uvicorn worker.
+_tts_executor = ThreadPoolExecutor(max_workers=TTS_MAX_WORKERS, thread_name_prefix="murf-tts")
+_session_slots: dict[str, asyncio.Semaphore] = {}
+
+
+def _session_slot(session_id: str) -> asyncio.Semaphore:
+    slot = _session_slots.get(session_id)
+    if slot is None:
+        slot = asyncio.Semaphore(TTS_MAX_PER_SESSION)
+        _session_slots[session_id] = slot
+    return slot
+
+
+async def speak_stream(text: str, voice_id: str = default_voice, session_id: str = "default_session"):
+    """
+    Async iterator over `iter_speak` chunks. The blocking SDK stream runs on the shared TTS
+    pool and hands each chunk back to the loop as soon as Murf sends it.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    stopped = threading.Event()
+
+    def produce():
+        try:
+            for audio_chunk in iter_speak(text, voice_id):
+                if stopped.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, audio_chunk)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    async with _session_slot(session_id):
+        loop.run_in_executor(_tts_executor, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Consumer went away (e.g. the socket closed): stop pulling from Murf
+            stopped.set()
+
+
+async def speak_async(text: str, voice_id: str = default_voice, session_id: str = "default_session") -> bytes:
+    """Non-blocking variant of `speak` that synthesizes on the shared TTS pool."""
+    return b"".join([audio_chunk async for audio_chunk in speak_stream(text, voice_id, session_id)])
+
+
+# Audio format labels used in cache keys, one per transport
+WS_AUDIO_FORMAT = f"wav-{MURF_WS_SAMPLE_RATE}"
+REST_AUDIO_FORMAT = f"sdk-wav-{MURF_WS_SAMPLE_RATE}"
+DEFAULT_STYLE = "Conversational"
+
+tts_cache = TTSCache(
+    TTS_CACHE_MAX_BYTES,
+    disk_dir=UPLOADS_DIR / "tts_cache" if TTS_CACHE_DISK else None,
+    disk_max_bytes=TTS_CACHE_DISK_MAX_BYTES,
+)
 
-    audio_bytes = b""
-    for audio_chunk in res:
-        audio_bytes += audio_chunk
-        with open(file_path, "ab") as f:
-            f.write(audio_chunk)
 
-    return audio_bytes
+async def cached_audio(text: str, voice_id: str, format: str) -> bytes | None:
+    key = cache_key(text, voice_id, DEFAULT_STYLE, format)
+    audio = tts_cache.get(key)
+    if audio is None and tts_cache.disk_dir is not None:
+        audio = await asyncio.to_thread(tts_cache.load, key)
+        if audio is not None:
+            tts_cache.put(key, audio)
+    if audio is None:
+        tts_cache.miss()
+    return audio
+
+
+async def remember_audio(text: str, voice_id: str, format: str, audio: bytes):
+    key = cache_key(text, voice_id, DEFAULT_STYLE, format)
+    tts_cache.put(key, audio)
+    if tts_cache.disk_dir is not None:
+        await asyncio.to_thread(tts_cache.store, key, audio)
+
+
+async def _pool_stream(text: str, voice_id: str, session_id: str):
+    async with _session_slot(session_id):
+        async for audio_chunk in get_stream_pool().synthesize(text, voice_id, session_context_id(session_id)):
+            yield audio_chunk
+
+
+async def synthesize_stream(
+    text: str,
+    voice_id: str = default_voice,
+    session_id: str = "default_session",
+    recorder: SessionRecorder | None = None,
+):
+    """
+    Stream one segment's audio chunks for a session, forwarding each chunk as soon as it arrives.
+    Served from the TTS cache when possible; otherwise uses the pooled Murf websocket when
+    the transport is "ws", and falls back to the REST stream if Murf is unreachable.
+    """
+    # Built in a worker thread if the warm-up has not got to it yet
+    await ensure_provider("tts")
+    format = WS_AUDIO_FORMAT if get_transport() == "ws" else REST_AUDIO_FORMAT
+    audio = await cached_audio(text, voice_id, format)
+    if audio is not None:
+        if recorder:
+            recorder.write(audio)
+        yield audio
+        return
+
+    chunks = []
+    source = None
+    if format == WS_AUDIO_FORMAT:
+        source = _pool_stream(text, voice_id, session_id)
+        try:
+            # Pull the first chunk before committing, so a dead pool can still fall back to REST
+            chunks.append(await anext(source))
+        except StopAsyncIteration:
+            pass
+        except MurfConnectionError as e:
+            logging.warning(f"Murf stream unavailable, falling back to REST: {e}")
+            source = None
+    if source is None:
+        format = REST_AUDIO_FORMAT
+        source = speak_stream(text, voice_id, session_id)
+
+    try:
+        if chunks:
+            if recorder:
+                recorder.write(chunks[0])
+            yield chunks[0]
+        async for audio_chunk in source:
+            chunks.append(audio_chunk)
+            if recorder:
+                recorder.write(audio_chunk)
+            yield audio_chunk
+    finally:
+        # Release the pooled connection / TTS worker promptly if the consumer stops early
+        await source.aclose()
+    if chunks:
+        await remember_audio(text, voice_id, format, b"".join(chunks))
+
+
+async def synthesize(text: str, voice_id: str = default_voice, session_id: str = "default_session") -> bytes:
+    """Whole-segment variant of `synthesize_stream`."""
+    return b"".join([audio_chunk async for audio_chunk in synthesize_stream(text, voice_id, session_id)])
+
+
+async def prewarm_cache(phrases: list[str], voice_id: str = default_voice):
+    """Synthesize fixed phrases ahead of time so their first use is a cache hit."""
+    for phrase in phrases:
+        try:
+            await synthesize(phrase, voice_id, session_id="prewarm")
+        except Exception as e:
+            logging.warning(f"TTS cache pre-warm failed for {phrase!r}: {e}")
+    release_session("prewarm")
+
+
+def cached_fallback_audio(voice_id: str = default_voice) -> bytes | None:
+    """The pre-warmed fallback phrase from memory, without touching Murf."""
+    format = WS_AUDIO_FORMAT if get_transport() == "ws" else REST_AUDIO_FORMAT
+    return tts_cache.get(cache_key(FALLBACK_TEXT, voice_id, DEFAULT_STYLE, format))
+
+
+def get_cache_stats() -> dict:
+    return tts_cache.get_stats()
+
+
+def release_session(session_id: str):
+    """Forget the fairness slot of a closed session."""
+    _session_slots.pop(session_id, None)
 
 
 async def list_voices():
-    url = "https://api.murf.ai/v1/speech/voices"
-    async with httpx.AsyncClient() as client:
-        res = await client.post(
-            url,
-            headers={
-                "accept": "application/json",
-                "api-key": MURF_API_KEY if MURF_API_KEY is not None else "",
-            }
-        )
+    url = f"{MURF_API_BASE_URL}/speech/voices"
+    res = await get_http_client().post(
+        url,
+        headers={
+            "accept": "application/json",
+            "api-key": MURF_API_KEY if MURF_API_KEY is not None else "",
+        }
+    )
     return res
 
+
+VOICES_RETRY_SECONDS = 30.0
+
+
+class VoiceCatalogue:
+    """
+    Murf's voice list kept in memory as the raw JSON body plus an ETag. After `ttl` seconds
+    the stale copy is still served while one background refresh runs; a failed refresh keeps
+    the old copy. Only the very first load (or ttl <= 0) waits on Murf, and concurrent callers
+    share that one request.
+    """
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.body: bytes | None = None
+        self.etag: str | None = None
+        self.fetched_at = 0.0
+        self._refresh: asyncio.Task | None = None
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0, "not_modified": 0}
+
+    async def _fetch(self):
+        res = await list_voices()
+        res.raise_for_status()
+        self.body = res.content
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+        self.fetched_at = time.monotonic()
+        self.stats["refreshes"] += 1
+
+    def _on_refreshed(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["refresh_errors"] += 1
+            logging.warning(f"Voice catalogue refresh failed: {task.exception()}")
+            if self.body is not None:
+                # Keep serving the old copy; don't hit Murf again on every request while it is down
+                self.fetched_at = time.monotonic() - self.ttl + min(self.ttl, VOICES_RETRY_SECONDS)
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._fetch())
+            self._refresh.add_done_callback(self._on_refreshed)
+        return self._refresh
+
+    async def get(self) -> tuple[bytes, str]:
+        """(JSON body, ETag) of the voice list."""
+        if self.body is None or self.ttl <= 0:
+            self.stats["misses"] += 1
+            # Shielded: one caller going away must not cancel the fetch the others wait on
+            await asyncio.shield(self._start_refresh())
+            return self.body, self.etag
+        self.stats["hits"] += 1
+        if time.monotonic() - self.fetched_at > self.ttl:
+            self._start_refresh()
+        return self.body, self.etag
+
+
+voice_catalogue = VoiceCatalogue(VOICES_CACHE_TTL)
+
+
+def get_voice_catalogue_stats() -> dict:
+    return {**voice_catalogue.stats, "cached": voice_catalogue.body is not None}
+
+
 async def fallback_audio_response():
-    fallback_text = "I'm having trouble connecting right now."
     try:
-        response = await text_to_murf_voice(fallback_text)
+        response = await text_to_murf_voice(FALLBACK_TEXT)
         return response.json()
     except Exception as e:
         logging.error(f"Fallback TTS error: {e}")
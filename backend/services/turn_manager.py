@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from core.config import BARGE_IN_PARTIAL_CHARS, TTS_QUEUE_MAX_SEGMENTS
+
+# Day 24: Barge-in. One conversational turn (LLM stream + TTS) runs per session at a time;
+# when the user speaks again the running turn is cancelled and its pending segments dropped.
+
+# Process-wide counters: how often users interrupt, and how much synthesis that saved
+turn_stats = {
+    "turns_started": 0,
+    "turns_completed": 0,
+    "turns_cancelled": 0,
+    "cancelled_by_partial": 0,
+    "llm_streams_aborted": 0,
+    "segments_skipped": 0,
+    "chars_skipped": 0,
+}
+
+
+class Turn:
+    """State of one bot response that a cancellation needs to reach."""
+    def __init__(self, turn_id: int):
+        self.id = turn_id
+        # Bounded, so an LLM that outruns TTS (or a slow client) waits instead of piling up text
+        self.tts_queue: asyncio.Queue = asyncio.Queue(maxsize=TTS_QUEUE_MAX_SEGMENTS)
+        self.llm_done = False
+        self.task: asyncio.Task | None = None
+
+
+class TurnManager:
+    """
+    Runs at most one turn per session:
+        - a new final transcript cancels the running turn before starting the next
+        - a partial transcript of at least `partial_threshold` characters cancels it early
+    `on_cancelled(turn, reason)` is awaited after a cancellation (e.g. to notify the client).
+    """
+    def __init__(
+        self,
+        on_cancelled: Callable[[Turn, str], Awaitable] | None = None,
+        partial_threshold: int = BARGE_IN_PARTIAL_CHARS,
+    ):
+        self.on_cancelled = on_cancelled
+        self.partial_threshold = partial_threshold
+        self.current: Turn | None = None
+        self._next_id = 1
+        self._lock = asyncio.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.current is not None and self.current.task is not None and not self.current.task.done()
+
+    async def start(self, run: Callable[[Turn], Awaitable]) -> Turn:
+        async with self._lock:
+            await self._cancel("superseded")
+            turn = Turn(self._next_id)
+            self._next_id += 1
+            turn.task = asyncio.create_task(self._run(turn, run))
+            self.current = turn
+            turn_stats["turns_started"] += 1
+            return turn
+
+    async def _run(self, turn: Turn, run: Callable[[Turn], Awaitable]):
+        try:
+            await run(turn)
+            turn_stats["turns_completed"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Turn {turn.id} failed: {e}")
+
+    async def on_partial(self, text: str):
+        if self.partial_threshold <= 0 or len(text) < self.partial_threshold or not self.active:
+            return
+        async with self._lock:
+            if await self._cancel("barge-in"):
+                turn_stats["cancelled_by_partial"] += 1
+
+    async def cancel(self, reason: str, notify: bool = True) -> bool:
+        async with self._lock:
+            return await self._cancel(reason, notify)
+
+    async def _cancel(self, reason: str, notify: bool = True) -> bool:
+        turn = self.current
+        if turn is None or turn.task is None or turn.task.done():
+            return False
+        # Count the segments that will never reach Murf, then drop them
+        while not turn.tts_queue.empty():
+            segment = turn.tts_queue.get_nowait()
+            if segment:
+                turn_stats["segments_skipped"] += 1
+                turn_stats["chars_skipped"] += len(segment)
+        if not turn.llm_done:
+            turn_stats["llm_streams_aborted"] += 1
+        turn.task.cancel()
+        try:
+            await turn.task
+        except asyncio.CancelledError:
+            pass
+        turn_stats["turns_cancelled"] += 1
+        self.current = None
+        if notify and self.on_cancelled:
+            try:
+                await self.on_cancelled(turn, reason)
+            except Exception as e:
+                logging.info(f"Could not notify turn cancellation: {e}")
+        return True
+
+
+def get_turn_stats() -> dict:
+    return dict(turn_stats)
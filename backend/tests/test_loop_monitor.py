@@ -0,0 +1,38 @@
+"""
+Regression test: a stall is recorded with how long the loop was actually blocked, including
+one that happens before the heartbeat has run for the first time (sync work in the lifespan).
+
+    cd backend
+    python -m pytest tests
+"""
+import asyncio
+import time
+
+import services.loop_monitor as loop_monitor
+
+
+def blocked_for(stall: float, settle_first: bool) -> list[float]:
+    async def run():
+        monitor = loop_monitor.LoopMonitor(interval=0.02, threshold=0.05)
+        monitor.start()
+        if settle_first:
+            await asyncio.sleep(0.1)
+        recorded = len(loop_monitor.recent_blocks)
+        time.sleep(stall)
+        await asyncio.sleep(0.2)
+        await monitor.stop()
+        return [block["seconds"] for block in list(loop_monitor.recent_blocks)[recorded:]]
+
+    return asyncio.run(run())
+
+
+def test_stall_before_first_heartbeat_is_measured():
+    blocks = blocked_for(0.3, settle_first=False)
+    assert len(blocks) == 1
+    assert 0.25 <= blocks[0] < 0.4
+
+
+def test_stall_while_running_is_measured():
+    blocks = blocked_for(0.3, settle_first=True)
+    assert len(blocks) == 1
+    assert 0.25 <= blocks[0] < 0.4
@@ -0,0 +1,61 @@
+"""
+Regression test: with STT_VAD=0 client frames go straight into the ring buffer, so an empty
+binary message must not be taken for the force-endpoint marker.
+
+    cd backend
+    python -m pytest tests
+"""
+import os
+
+os.environ.setdefault("ASSEMBLYAI_API_KEY", "test-key")
+
+import services.stt_service as stt
+
+
+class RecordingClient:
+    def __init__(self):
+        self.sent = []
+
+    def stream(self, frame):
+        self.sent.append(frame)
+
+    def force_endpoint(self):
+        self.sent.append("endpoint")
+
+
+def send_all(transcriber: stt.AssemblyAIStreamingTranscriber) -> list:
+    transcriber.client = RecordingClient()
+    transcriber.buffer.close()
+    transcriber._send_loop()
+    return transcriber.client.sent
+
+
+def test_empty_client_frame_is_not_an_endpoint():
+    transcriber = stt.AssemblyAIStreamingTranscriber()
+    transcriber.vad = None
+    transcriber.stream_audio(b"\x01\x02")
+    transcriber.stream_audio(b"")
+    transcriber.stream_audio(b"\x03\x04")
+    assert send_all(transcriber) == [b"\x01\x02", b"\x03\x04"]
+
+
+def test_endpoint_marker_follows_queued_audio():
+    transcriber = stt.AssemblyAIStreamingTranscriber()
+    transcriber.buffer.push(b"\x01\x02")
+    transcriber.buffer.push(stt.ENDPOINT_MARKER)
+    transcriber.buffer.push(b"\x03\x04")
+    assert send_all(transcriber) == [b"\x01\x02", "endpoint", b"\x03\x04"]
+
+
+def test_overflow_keeps_endpoint_marker():
+    transcriber = stt.AssemblyAIStreamingTranscriber()
+    transcriber.buffer = stt.AudioRingBuffer(max_bytes=4, drop_policy="oldest")
+    dropped = stt.stt_stats["dropped_frames"], stt.stt_stats["dropped_bytes"]
+    transcriber.buffer.push(b"\x01\x02")
+    transcriber.buffer.push(stt.ENDPOINT_MARKER)
+    for frame in (b"\x03\x04", b"\x05\x06", b"\x07\x08"):
+        transcriber.buffer.push(frame)
+    assert send_all(transcriber) == ["endpoint", b"\x05\x06", b"\x07\x08"]
+    # Only audio counts as dropped
+    assert stt.stt_stats["dropped_frames"] - dropped[0] == 2
+    assert stt.stt_stats["dropped_bytes"] - dropped[1] == 4
@@ -0,0 +1,68 @@
+"""
+Regression test: with formatted turns on, AssemblyAI ends every turn twice (as spoken, then
+formatted). Only the first final may reach the app, or it starts a second bot turn that
+cancels the first one.
+
+    cd backend
+    python -m pytest tests
+"""
+import asyncio
+import os
+
+os.environ.setdefault("ASSEMBLYAI_API_KEY", "test-key")
+
+from assemblyai.streaming.v3 import TurnEvent
+
+import services.stt_service as stt
+
+
+class RecordingClient:
+    def __init__(self):
+        self.params = []
+
+    def set_params(self, params):
+        self.params.append(params)
+
+
+def turn(order: int, text: str, end_of_turn: bool = True, formatted: bool = False) -> TurnEvent:
+    return TurnEvent(
+        type="Turn",
+        turn_order=order,
+        turn_is_formatted=formatted,
+        end_of_turn=end_of_turn,
+        transcript=text,
+        end_of_turn_confidence=0.9,
+        words=[],
+    )
+
+
+def test_formatted_repeat_of_a_turn_is_not_a_second_final():
+    async def run():
+        finals, partials = [], []
+        transcriber = stt.AssemblyAIStreamingTranscriber(
+            on_final_callback=finals.append, on_partial_callback=partials.append
+        )
+        transcriber._loop = asyncio.get_running_loop()
+        transcriber._dispatcher = asyncio.create_task(transcriber._dispatch_events())
+        client = RecordingClient()
+        duplicates = stt.stt_stats["duplicate_finals"]
+
+        for event in (
+            turn(0, "hello there", end_of_turn=False),
+            turn(0, "hello there"),
+            turn(0, "Hello there.", formatted=True),
+            turn(1, "how are you"),
+            turn(1, "How are you?", formatted=True),
+        ):
+            transcriber._on_turn(client, event)
+        for _ in range(5):
+            await asyncio.sleep(0)
+        transcriber._dispatcher.cancel()
+        return finals, partials, client, stt.stt_stats["duplicate_finals"] - duplicates
+
+    finals, partials, client, duplicates = asyncio.run(run())
+    assert finals == ["hello there", "how are you"]
+    assert partials == ["hello there"]
+    assert duplicates == 2
+    # Formatted turns are requested once per session, not after every turn
+    assert len(client.params) == 1